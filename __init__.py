@@ -4,28 +4,91 @@ An unofficial Python wrapper for the Binance exchange API
 .. moduleauthor:: Jasper Delahaije
 
 """
+import importlib
+
 from .client import Client
 
 from .exceptions import APIException
 from .exceptions import RequestException
 from .exceptions import OrderException
 from .exceptions import OrderMinAmountException
+from .exceptions import OrderMaxAmountException
+from .exceptions import OrderMinPriceException
+from .exceptions import OrderMaxPriceException
+from .exceptions import OrderPercentPriceException
 from .exceptions import OrderMinTotalException
 from .exceptions import OrderUnknownSymbolException
 from .exceptions import OrderInactiveSymbolException
 from .exceptions import WithdrawException
 
-from .helpers import date_to_milliseconds
-from .helpers import interval_to_milliseconds
-
-from .functions import get_all_symbols
-from .functions import get_best_symbols
-from .functions import get_all_asset_balance
-from .functions import updateCandle
-from .functions import updateAllCandles
-from .functions import updateEMA
-from .functions import updateAllEMA
-from .functions import updateMA
-from .functions import updateAllMA
-from .functions import get_all_intervals
-from .functions import get_pair_info
+#everything except the client is imported on first use (PEP 562), so scripts that only
+#need Client do not pay for pandas, pyarrow and TA-Lib
+_LAZY = {
+    "SymbolFilters": "filters",
+    "compile_filters": "filters",
+    "date_to_milliseconds": "helpers",
+    "interval_to_milliseconds": "helpers",
+    "get_all_symbols": "functions",
+    "get_best_symbols": "functions",
+    "get_all_asset_balance": "functions",
+    "updateCandle": "functions",
+    "updateAllCandles": "functions",
+    "checkCandles": "functions",
+    "checkAllCandles": "functions",
+    "repairCandle": "functions",
+    "appendCandles": "functions",
+    "updateEMA": "functions",
+    "updateAllEMA": "functions",
+    "updateMA": "functions",
+    "updateAllMA": "functions",
+    "get_all_intervals": "functions",
+    "get_pair_info": "functions",
+    "backtest": "backtest",
+    "backtestEvents": "backtest",
+    "loadCandles": "backtest",
+    "alignCandles": "backtest",
+    "FlatFee": "backtest",
+    "FixedSlippage": "backtest",
+    "VolumeSlippage": "backtest",
+    "SimulatedExchange": "simulator",
+    "SimulatedClient": "simulator",
+    "FastOrderSender": "fastorder",
+    "ServerClock": "clock",
+    "RetryPolicy": "retry",
+    "MetricsRegistry": "metrics",
+    "CallbackSink": "metrics",
+    "serve_prometheus": "metrics",
+    "ResponseCache": "cache",
+    "FileCache": "cache",
+    "archiveAggTrades": "archive",
+    "readAggTrades": "archive",
+    "BarBuilder": "bars",
+    "buildBars": "bars",
+    "TimeBars": "bars",
+    "TickBars": "bars",
+    "VolumeBars": "bars",
+    "DollarBars": "bars",
+    "DollarImbalanceBars": "bars",
+    "MarketDataService": "marketdata",
+    "CandleRing": "marketdata",
+    "attachCandles": "marketdata",
+    "listSeries": "marketdata",
+    "CandleScheduler": "scheduler",
+    "nextClose": "helpers",
+    "planUpdates": "planner",
+    "runPlan": "planner",
+    "syncCandles": "planner",
+    "tradingSymbols": "planner"
+}
+
+def __getattr__(name):
+    module = _LAZY.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY))
@@ -0,0 +1,311 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Archive of aggregate trades in day partitioned parquet files.
+#
+# Aggregate trade ids are dense, so the ids between the first trade and the latest one are
+# known up front and can be cut into chunks that are fetched in parallel (pages of 1000
+# with fromId). Every finished chunk is written as one parquet file per day it covers,
+#
+#   {root}/{symbol}/date=YYYY-MM-DD/{first id}-{last id}.parquet
+#
+# and only then added to catalog.json, so an interrupted run continues with the chunks
+# that are missing. A chunk that was written but not cataloged is fetched again, and as the
+# latest trade has moved on since, its files can cover more ids under other names. The files
+# of the earlier attempt that overlap the chunk are removed once the new ones are written,
+# so no trade is stored twice.
+
+AGG_COLUMNS = ["AggId", "Price", "Quantity", "FirstId", "LastId", "Time", "BuyerMaker", "BestMatch"]
+AGG_SCHEMA = pa.schema([
+    ("AggId", pa.int64()),
+    ("Price", pa.float64()),
+    ("Quantity", pa.float64()),
+    ("FirstId", pa.int64()),
+    ("LastId", pa.int64()),
+    ("Time", pa.int64()),
+    ("BuyerMaker", pa.bool_()),
+    ("BestMatch", pa.bool_())
+])
+
+PAGE_SIZE = 1000
+CHUNK_IDS = 100000
+DAY_MS = 86400000
+
+def decodeTrades(trades):
+    """aggTrades as returned by get_aggregate_trades into typed columns
+    :returns: dict -> {column: ndarray}
+    """
+    return {
+        "AggId": np.fromiter((t["a"] for t in trades), np.int64, len(trades)),
+        "Price": np.array([t["p"] for t in trades]).astype(np.float64),
+        "Quantity": np.array([t["q"] for t in trades]).astype(np.float64),
+        "FirstId": np.fromiter((t["f"] for t in trades), np.int64, len(trades)),
+        "LastId": np.fromiter((t["l"] for t in trades), np.int64, len(trades)),
+        "Time": np.fromiter((t["T"] for t in trades), np.int64, len(trades)),
+        "BuyerMaker": np.fromiter((t["m"] for t in trades), np.bool_, len(trades)),
+        "BestMatch": np.fromiter((t["M"] for t in trades), np.bool_, len(trades))
+    }
+
+class WeightLimiter:
+    """Spend at most budget request weight per minute, shared by all fetching threads"""
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.lock = threading.Lock()
+        self.allowance = float(budget)
+        self.last = time.monotonic()
+
+    def acquire(self, weight):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.allowance = min(self.budget, self.allowance + (now - self.last) * self.budget / 60)
+                self.last = now
+
+                if self.allowance >= weight:
+                    self.allowance -= weight
+                    return
+
+                wait = (weight - self.allowance) * 60 / self.budget
+
+            time.sleep(wait)
+
+class Catalog:
+    """Finished [start, stop) id ranges of one symbol, merged and stored as json"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.ranges = []
+
+        if os.path.isfile(path):
+            with open(path, "r") as f:
+                self.ranges = [tuple(r) for r in json.load(f)["ranges"]]
+
+    def add(self, start, stop):
+        with self.lock:
+            ranges = sorted(self.ranges + [(start, stop)])
+            merged = [ranges[0]]
+            for range_start, range_stop in ranges[1:]:
+                if range_start <= merged[-1][1]:
+                    merged[-1] = (merged[-1][0], max(merged[-1][1], range_stop))
+                else:
+                    merged.append((range_start, range_stop))
+            self.ranges = merged
+
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"ranges": self.ranges}, f)
+            os.replace(tmp_path, self.path)
+
+    def missing(self, start, stop):
+        #ranges of [start, stop) that are not finished yet
+        result = []
+        position = start
+
+        for range_start, range_stop in self.ranges:
+            if range_stop <= position:
+                continue
+            if range_start >= stop:
+                break
+            if range_start > position:
+                result.append((position, range_start))
+            position = max(position, range_stop)
+
+        if position < stop:
+            result.append((position, stop))
+
+        return result
+
+def fetchRange(Client, symbol, start, stop, limiter=None, weight=2):
+    """All aggTrades with start <= id < stop as columns"""
+    parts = []
+    from_id = start
+
+    while from_id < stop:
+        if limiter is not None:
+            limiter.acquire(weight)
+
+        trades = Client.get_aggregate_trades(symbol=symbol, fromId=from_id, limit=PAGE_SIZE)
+        if len(trades) == 0:
+            break
+
+        columns = decodeTrades(trades)
+        keep = columns["AggId"] < stop
+        parts.append({name: values[keep] for name, values in columns.items()})
+
+        if not keep[-1]:
+            break
+        from_id = int(columns["AggId"][-1]) + 1
+
+    if len(parts) == 0:
+        return {name: np.empty(0, dtype=AGG_SCHEMA.field(name).type.to_pandas_dtype()) for name in AGG_COLUMNS}
+
+    return {name: np.concatenate([part[name] for part in parts]) for name in AGG_COLUMNS}
+
+def _fileIds(name):
+    #first and last id of a partition file name
+    first, last = name[:-len(".parquet")].split("-")
+    return int(first), int(last)
+
+def writePartitions(directory, columns, chunk=None):
+    """Write columns as one parquet file per day
+    :params: chunk -> (start, stop) id range the columns were fetched for, files of an earlier attempt at it are removed
+    :returns: lst -> paths written
+    """
+    times = columns["Time"]
+    if len(times) == 0:
+        return []
+
+    #ids and times rise together, so every day is one contiguous slice
+    days = times // DAY_MS
+    bounds = np.flatnonzero(np.diff(days)) + 1
+    starts = np.concatenate(([0], bounds))
+    stops = np.concatenate((bounds, [len(days)]))
+    paths = []
+
+    for start, stop in zip(starts, stops):
+        day = np.datetime64(int(days[start]), "D")
+        folder = os.path.join(directory, f"date={day}")
+        os.makedirs(folder, exist_ok=True)
+
+        table = pa.table({name: columns[name][start:stop] for name in AGG_COLUMNS}, schema=AGG_SCHEMA)
+        path = os.path.join(folder, f"{columns['AggId'][start]}-{columns['AggId'][stop - 1]}.parquet")
+        tmp_path = path + ".tmp"
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, path)
+        paths.append(path)
+
+        if chunk is not None:
+            for name in os.listdir(folder):
+                if not name.endswith(".parquet") or os.path.join(folder, name) == path:
+                    continue
+                first, last = _fileIds(name)
+                if first < chunk[1] and last >= chunk[0]:
+                    os.remove(os.path.join(folder, name))
+
+    return paths
+
+def firstAggId(Client, symbol, start_ts=None):
+    #id of the first trade, or of the first trade at or after start_ts
+    if start_ts is None:
+        trades = Client.get_aggregate_trades(symbol=symbol, fromId=0, limit=1)
+        return trades[0]["a"] if trades else None
+
+    #ids are dense and their times rise, so the id is found by bisection in about 40 requests
+    first = Client.get_aggregate_trades(symbol=symbol, fromId=0, limit=1)
+    latest = Client.get_aggregate_trades(symbol=symbol, limit=1)
+    if not first or not latest or latest[-1]["T"] < start_ts:
+        return None
+
+    low, high = first[0]["a"], latest[-1]["a"]
+    while low < high:
+        middle = (low + high) // 2
+        trades = Client.get_aggregate_trades(symbol=symbol, fromId=middle, limit=1)
+        if trades[0]["T"] < start_ts:
+            low = trades[0]["a"] + 1
+        else:
+            high = middle
+
+    return low
+
+def archiveAggTrades(Client, symbol, root=None, start_ts=None, stop_id=None, workers=8, chunk_ids=CHUNK_IDS, weight_budget=1000, weight=2, verbose=True):
+    """Fetch every aggTrade of symbol into the archive, resuming from the catalog
+    :params: start_ts -> ms, archive from the first trade at or after this time, None from the first trade
+             stop_id -> archive up to this id (exclusive), None up to the latest trade
+             weight_budget -> request weight per minute spent on this archive
+             weight -> request weight of one aggTrades page
+    :returns: int -> amount of trades written
+    """
+    if root is None:
+        root = f"{Client.MAIN_PATH}/data/aggtrades"
+    directory = os.path.join(root, symbol)
+    os.makedirs(directory, exist_ok=True)
+
+    catalog = Catalog(os.path.join(directory, "catalog.json"))
+
+    start_id = firstAggId(Client, symbol, start_ts)
+    if stop_id is None:
+        latest = Client.get_aggregate_trades(symbol=symbol, limit=1)
+        stop_id = latest[-1]["a"] + 1 if latest else None
+    if start_id is None or stop_id is None:
+        return 0
+
+    #chunks lie on a fixed grid of ids, a chunk fetched again after a crash replaces the files of the first attempt
+    chunks = []
+    for missing_start, missing_stop in catalog.missing(start_id, stop_id):
+        chunk_start = missing_start
+        while chunk_start < missing_stop:
+            chunk_stop = min((chunk_start // chunk_ids + 1) * chunk_ids, missing_stop)
+            chunks.append((chunk_start, chunk_stop))
+            chunk_start = chunk_stop
+
+    limiter = WeightLimiter(weight_budget)
+    written = 0
+
+    def run(chunk):
+        columns = fetchRange(Client, symbol, chunk[0], chunk[1], limiter, weight)
+        writePartitions(directory, columns, chunk)
+        catalog.add(*chunk)
+        return len(columns["AggId"])
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(run, chunk) for chunk in chunks]
+
+        for i, future in enumerate(as_completed(futures)):
+            written += future.result()
+            if verbose:
+                print(f"{symbol}\tchunks: {i + 1}/{len(chunks)}\ttrades: {written}")
+
+    return written
+
+def readAggTrades(Client, symbol, root=None, start_ts=None, stop_ts=None, columns=None):
+    """Archived aggTrades of symbol as one Table, sorted by AggId"""
+    if root is None:
+        root = f"{Client.MAIN_PATH}/data/aggtrades"
+    directory = os.path.join(root, symbol)
+
+    paths = []
+    for folder in sorted(os.listdir(directory)):
+        if not folder.startswith("date="):
+            continue
+
+        day_ms = int(np.datetime64(folder[5:], "D").astype(np.int64)) * DAY_MS
+        if start_ts is not None and day_ms + DAY_MS <= start_ts or stop_ts is not None and day_ms >= stop_ts:
+            continue
+
+        for name in os.listdir(os.path.join(directory, folder)):
+            if name.endswith(".parquet"):
+                paths.append(os.path.join(directory, folder, name))
+
+    paths.sort(key=lambda path: int(os.path.basename(path).split("-")[0]))
+
+    if len(paths) == 0:
+        return AGG_SCHEMA.empty_table() if columns is None else AGG_SCHEMA.empty_table().select(columns)
+
+    read_columns = columns
+    if columns is not None and "Time" not in columns and (start_ts is not None or stop_ts is not None):
+        read_columns = list(columns) + ["Time"]
+
+    table = pa.concat_tables([pq.read_table(path, columns=read_columns) for path in paths])
+
+    if start_ts is not None or stop_ts is not None:
+        times = table.column("Time").to_numpy()
+        keep = np.ones(len(times), dtype=bool)
+        if start_ts is not None:
+            keep &= times >= start_ts
+        if stop_ts is not None:
+            keep &= times < stop_ts
+        table = table.filter(pa.array(keep))
+
+    if read_columns is not columns:
+        table = table.select(columns)
+
+    return table
@@ -0,0 +1,251 @@
+import pyarrow.feather as feather
+import pandas as pd
+import numpy as np
+import time
+
+# Backtesting over the local candle store.
+#
+# Positions are fractions of equity in [0, 1] (spot, long only). The position chosen at
+# the close of bar t is held until the close of bar t + 1, every change of position is
+# filled at the close of the bar it was decided on and pays fee + slippage on the
+# traded fraction. backtest() works on whole arrays and broadcasts over leading axes,
+# so signals of shape (symbols, parameter sets, bars) against prices of shape
+# (symbols, 1, bars) are evaluated in one go.
+
+class FlatFee:
+
+    def __init__(self, rate=0.001):
+        self.rate = rate
+
+    def cost(self, traded, prices, volume):
+        return traded * self.rate
+
+class FixedSlippage:
+
+    def __init__(self, rate=0.0005):
+        self.rate = rate
+
+    def cost(self, traded, prices, volume):
+        return traded * self.rate
+
+class VolumeSlippage:
+    """Slippage growing with the share of the bar volume that is traded
+    notional is the account size in quote asset, impact the cost for trading a whole bar.
+    """
+
+    def __init__(self, notional, impact=0.1):
+        self.notional = notional
+        self.impact = impact
+
+    def cost(self, traded, prices, volume):
+        quote_volume = np.maximum(prices * volume, 1e-12)
+        return traded * self.impact * np.minimum(traded * self.notional / quote_volume, 1.0)
+
+def loadCandles(Client, symbol, interval):
+    filename = f"{Client.MAIN_PATH}/data/candles/{interval}/{symbol}.feather"
+    return feather.read_feather(filename)
+
+def alignCandles(frames, column="ClosePrice"):
+    """Put several candle frames on their common OpenTimes
+    :params: frames -> dict -> {symbol: DataFrame}
+    :returns: (lst -> symbols, ndarray -> OpenTime, ndarray -> values (symbols, bars))
+    """
+    symbols = list(frames)
+    times = frames[symbols[0]]["OpenTime"].to_numpy()
+
+    for symbol in symbols[1:]:
+        times = np.intersect1d(times, frames[symbol]["OpenTime"].to_numpy())
+
+    values = np.empty((len(symbols), len(times)))
+    for i, symbol in enumerate(symbols):
+        df = frames[symbol]
+        rows = np.searchsorted(df["OpenTime"].to_numpy(), times)
+        values[i] = df[column].to_numpy()[rows]
+
+    return symbols, times, values
+
+def _costs(positions, prices, volume, fee, slippage):
+    previous = np.concatenate((np.zeros_like(positions[..., :1]), positions[..., :-1]), axis=-1)
+    traded = np.abs(positions - previous)
+
+    costs = np.zeros_like(traded)
+    for model in (fee, slippage):
+        if model is not None:
+            costs = costs + model.cost(traded, prices, volume)
+
+    return previous, traded, costs
+
+def _trades(positions, log_equity):
+    #a trade runs from the bar the position is opened up to the bar it is closed again
+    held = positions > 0
+    flat = held.reshape(-1, held.shape[-1])
+    logs = log_equity.reshape(-1, held.shape[-1])
+    bars = flat.shape[1]
+
+    before = np.concatenate((np.zeros((len(flat), 1), dtype=bool), flat[:, :-1]), axis=1)
+    entry_row, entry_bar = np.nonzero(flat & ~before)
+    exit_row, exit_bar = np.nonzero(~flat & before)
+
+    #trades still open at the end are marked to market on the last bar
+    open_rows = np.nonzero(flat[:, -1])[0]
+    exit_row = np.concatenate((exit_row, open_rows))
+    exit_bar = np.concatenate((exit_bar, np.full(len(open_rows), bars - 1)))
+    order = np.lexsort((exit_bar, exit_row))
+    exit_row, exit_bar = exit_row[order], exit_bar[order]
+
+    start = np.where(entry_bar > 0, logs[entry_row, np.maximum(entry_bar - 1, 0)], 0.0)
+    returns = np.exp(logs[exit_row, exit_bar] - start) - 1
+
+    return pd.DataFrame({
+        "set": entry_row,
+        "entry": entry_bar,
+        "exit": exit_bar,
+        "bars": exit_bar - entry_bar,
+        "return": returns
+    })
+
+def _empty(shape):
+    #result for input without bars, nothing was held or traded
+    bars = np.zeros(shape + (0,))
+    none = np.empty(0, dtype=np.int64)
+
+    return {
+        "returns": bars,
+        "equity": bars,
+        "drawdown": bars,
+        "total_return": np.zeros(shape),
+        "max_drawdown": np.zeros(shape),
+        "turnover": np.zeros(shape),
+        "trade_count": np.zeros(shape, dtype=np.int64),
+        "win_rate": np.full(shape, np.nan),
+        "avg_trade_return": np.full(shape, np.nan),
+        "avg_trade_bars": np.full(shape, np.nan),
+        "trades": pd.DataFrame({"set": none, "entry": none, "exit": none, "bars": none, "return": np.empty(0)})
+    }
+
+def _stats(positions, bar_returns, traded, trades):
+    if positions.shape[-1] == 0:
+        return _empty(positions.shape[:-1])
+
+    log_equity = np.cumsum(np.log1p(bar_returns), axis=-1)
+    equity = np.exp(log_equity)
+    drawdown = equity / np.maximum.accumulate(equity, axis=-1) - 1
+
+    if trades is None:
+        trades = _trades(positions, log_equity)
+
+    shape = positions.shape[:-1]
+    sets = int(np.prod(shape, dtype=np.int64))
+    count = np.bincount(trades["set"], minlength=sets)
+    wins = np.bincount(trades["set"], weights=trades["return"] > 0, minlength=sets)
+    total = np.bincount(trades["set"], weights=trades["return"], minlength=sets)
+    bars = np.bincount(trades["set"], weights=trades["bars"], minlength=sets)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return {
+            "returns": bar_returns,
+            "equity": equity,
+            "drawdown": drawdown,
+            "total_return": equity[..., -1] - 1,
+            "max_drawdown": drawdown.min(axis=-1),
+            "turnover": traded.sum(axis=-1),
+            "trade_count": count.reshape(shape),
+            "win_rate": (wins / count).reshape(shape),
+            "avg_trade_return": (total / count).reshape(shape),
+            "avg_trade_bars": (bars / count).reshape(shape),
+            "trades": trades
+        }
+
+def backtest(signals, prices, volume=None, fee=FlatFee(), slippage=None):
+    """Vectorized backtest
+    :params: signals -> ndarray (..., bars), target position per bar in [0, 1]
+             prices -> ndarray (..., bars), close prices broadcastable against signals
+             volume -> ndarray (..., bars), base asset volume, only needed by VolumeSlippage
+    :returns: dict -> {
+        "returns", "equity", "drawdown": ndarray (..., bars),
+        "total_return", "max_drawdown", "turnover", "trade_count", "win_rate", "avg_trade_return", "avg_trade_bars": ndarray (...),
+        "trades": DataFrame -> one row per trade, "set" is the flat index into the leading axes
+    }
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    positions = np.clip(np.asarray(signals, dtype=np.float64), 0, 1)
+    positions, prices = np.broadcast_arrays(positions, prices)
+    volume = np.ones_like(prices) if volume is None else np.broadcast_to(volume, prices.shape)
+
+    previous, traded, costs = _costs(positions, prices, volume, fee, slippage)
+
+    market = np.zeros_like(prices)
+    market[..., 1:] = prices[..., 1:] / prices[..., :-1] - 1
+
+    bar_returns = previous * market - costs
+
+    return _stats(positions, bar_returns, traded, None)
+
+def backtestEvents(strategy, candles, fee=FlatFee(), slippage=None):
+    """Bar by bar backtest for strategies that need their own state
+    :params: strategy -> callable(i, candles, state) -> target position in [0, 1]
+                state is a dict kept across bars, it holds "position" and "equity" next to anything the strategy adds
+             candles -> DataFrame of one symbol from the candle store
+    :returns: dict -> same as backtest() for a single parameter set
+    """
+    prices = candles["ClosePrice"].to_numpy(dtype=np.float64)
+    volume = candles["Volume"].to_numpy(dtype=np.float64)
+    bars = len(prices)
+
+    positions = np.zeros(bars)
+    bar_returns = np.zeros(bars)
+    traded = np.zeros(bars)
+    state = {"position": 0.0, "equity": 1.0}
+
+    for i in range(bars):
+        position = state["position"]
+        bar_return = position * (prices[i] / prices[i - 1] - 1) if i > 0 else 0.0
+
+        target = min(max(float(strategy(i, candles, state)), 0.0), 1.0)
+        change = abs(target - position)
+
+        cost = 0.0
+        for model in (fee, slippage):
+            if model is not None and change > 0:
+                cost += float(model.cost(change, prices[i], volume[i]))
+
+        bar_returns[i] = bar_return - cost
+        traded[i] = change
+        positions[i] = target
+
+        state["position"] = target
+        state["equity"] *= 1 + bar_returns[i]
+
+    return _stats(positions, bar_returns, traded, None)
+
+def benchmark(bars=100000, sets=100, seed=0):
+    #bars per second of both modes on a random walk with moving average crossover signals
+    generator = np.random.default_rng(seed)
+    prices = 100 * np.exp(np.cumsum(generator.normal(0, 0.001, bars)))
+    candles = pd.DataFrame({"ClosePrice": prices, "Volume": np.ones(bars)})
+
+    windows = np.arange(5, 5 + sets)
+    cumulative = np.concatenate(([0.0], np.cumsum(prices)))
+    signals = np.zeros((sets, bars))
+    for i, window in enumerate(windows):
+        average = np.full(bars, np.inf)
+        average[window - 1:] = (cumulative[window:] - cumulative[:-window]) / window
+        signals[i] = prices > average
+
+    start = time.perf_counter()
+    backtest(signals, prices)
+    vectorized = sets * bars / (time.perf_counter() - start)
+
+    def strategy(i, candles, state):
+        return signals[0, i]
+
+    start = time.perf_counter()
+    backtestEvents(strategy, candles)
+    events = bars / (time.perf_counter() - start)
+
+    return {"vectorized": vectorized, "events": events}
+
+if __name__ == "__main__":
+    result = benchmark()
+    print(f"vectorized: {result['vectorized']:,.0f} bars/s")
+    print(f"events: {result['events']:,.0f} bars/s")
@@ -0,0 +1,212 @@
+import numpy as np
+import pandas as pd
+
+# Bars built from aggregate trade columns (see archive.decodeTrades / readAggTrades).
+#
+# A bar definition only decides where bars end: boundaries(columns) returns the exclusive
+# stop index of every bar that is closed within the trades it gets. BarBuilder aggregates
+# the closed bars with reduceat and keeps the trades of the bar that is still open, which
+# are put in front of the next batch. Every definition sees the same batch, so several kinds
+# of bars come out of one pass over the trades.
+#
+# Threshold bars (tick, volume, dollar) start counting again after every bar, the amount
+# that overshoots the threshold is not carried to the next bar.
+
+BAR_COLUMNS = ["OpenTime", "OpenPrice", "HighPrice", "LowPrice", "ClosePrice", "CloseTime", "Volume", "NumberTrades", "BuyVolume", "SellVolume"]
+BAR_DTYPES = [np.int64, np.float64, np.float64, np.float64, np.float64, np.int64, np.float64, np.int64, np.float64, np.float64]
+TRADE_COLUMNS = ["Price", "Quantity", "Time", "BuyerMaker", "FirstId", "LastId"]
+
+def _thresholdStops(measure, threshold):
+    cumulative = np.cumsum(measure)
+    stops = []
+    base = 0.0
+
+    while True:
+        #first trade where the bar reaches the threshold, cumulative only rises
+        i = int(np.searchsorted(cumulative, base + threshold))
+        if i >= len(cumulative):
+            break
+
+        stops.append(i + 1)
+        base = cumulative[i]
+
+    return np.array(stops, dtype=np.int64)
+
+class TimeBars:
+    """Bars of ms milliseconds aligned to the epoch like klines, intervals without trades give no bar"""
+
+    def __init__(self, ms):
+        self.ms = ms
+
+    def boundaries(self, columns):
+        buckets = columns["Time"] // self.ms
+        return np.flatnonzero(np.diff(buckets)) + 1
+
+    def times(self, columns, starts, stops):
+        open_time = columns["Time"][starts] // self.ms * self.ms
+        return open_time, open_time + self.ms - 1
+
+class TickBars:
+
+    def __init__(self, trades):
+        self.trades = trades
+
+    def boundaries(self, columns):
+        #every aggTrade counts as one tick
+        return np.arange(self.trades, len(columns["Price"]) + 1, self.trades, dtype=np.int64)
+
+class VolumeBars:
+
+    def __init__(self, volume):
+        self.volume = volume
+
+    def boundaries(self, columns):
+        return _thresholdStops(columns["Quantity"], self.volume)
+
+class DollarBars:
+
+    def __init__(self, value):
+        self.value = value
+
+    def boundaries(self, columns):
+        return _thresholdStops(columns["Price"] * columns["Quantity"], self.value)
+
+class DollarImbalanceBars:
+    """Bar ends when |buy quote volume - sell quote volume| since the bar start reaches threshold"""
+
+    def __init__(self, threshold, block=4096):
+        self.threshold = threshold
+        self.block = block
+
+    def boundaries(self, columns):
+        signed = columns["Price"] * columns["Quantity"]
+        signed = np.where(columns["BuyerMaker"], -signed, signed)
+        cumulative = np.cumsum(signed)
+        n = len(cumulative)
+
+        stops = []
+        start = 0
+        base = 0.0
+
+        while start < n:
+            #the imbalance is not monotonic, scan blocks of it until the threshold is hit
+            hit = None
+            for block_start in range(start, n, self.block):
+                block = cumulative[block_start:block_start + self.block]
+                found = np.flatnonzero(np.abs(block - base) >= self.threshold)
+                if len(found) > 0:
+                    hit = block_start + int(found[0])
+                    break
+
+            if hit is None:
+                break
+
+            stops.append(hit + 1)
+            base = cumulative[hit]
+            start = hit + 1
+
+        return np.array(stops, dtype=np.int64)
+
+def aggregate(columns, stops, definition=None):
+    """Bars of columns ending at stops
+    :returns: DataFrame -> BAR_COLUMNS
+    """
+    if len(stops) == 0:
+        return pd.DataFrame({name: np.empty(0, dtype=dtype) for name, dtype in zip(BAR_COLUMNS, BAR_DTYPES)})
+
+    starts = np.concatenate(([0], stops[:-1]))
+    last = stops - 1
+
+    price = columns["Price"][:stops[-1]]
+    quantity = columns["Quantity"][:stops[-1]]
+    sell = columns["BuyerMaker"][:stops[-1]]
+
+    sell_volume = np.add.reduceat(np.where(sell, quantity, 0.0), starts)
+    volume = np.add.reduceat(quantity, starts)
+    trades = np.add.reduceat(columns["LastId"][:stops[-1]] - columns["FirstId"][:stops[-1]] + 1, starts)
+
+    if definition is not None and hasattr(definition, "times"):
+        open_time, close_time = definition.times(columns, starts, stops)
+    else:
+        open_time, close_time = columns["Time"][starts], columns["Time"][last]
+
+    return pd.DataFrame({
+        "OpenTime": open_time,
+        "OpenPrice": price[starts],
+        "HighPrice": np.maximum.reduceat(price, starts),
+        "LowPrice": np.minimum.reduceat(price, starts),
+        "ClosePrice": price[last],
+        "CloseTime": close_time,
+        "Volume": volume,
+        "NumberTrades": trades,
+        "BuyVolume": volume - sell_volume,
+        "SellVolume": sell_volume
+    })
+
+class BarBuilder:
+    """Several bar definitions over one trade stream
+    :params: definitions -> dict -> {name: TimeBars / TickBars / VolumeBars / DollarBars / DollarImbalanceBars}
+    """
+
+    def __init__(self, definitions):
+        self.definitions = dict(definitions)
+        self.pending = {name: None for name in self.definitions}
+
+    def update(self, columns):
+        """Add a batch of trades, in trade order
+        :params: columns -> dict or pyarrow Table with at least TRADE_COLUMNS
+        :returns: dict -> {name: DataFrame of the bars closed by this batch}
+        """
+        batch = {name: np.asarray(columns[name]) for name in TRADE_COLUMNS}
+        result = {}
+
+        for name, definition in self.definitions.items():
+            pending = self.pending[name]
+            if pending is not None:
+                data = {key: np.concatenate((pending[key], batch[key])) for key in TRADE_COLUMNS}
+            else:
+                data = batch
+
+            stops = definition.boundaries(data)
+            result[name] = aggregate(data, stops, definition)
+
+            #trades after the last closed bar belong to the open bar
+            tail = int(stops[-1]) if len(stops) > 0 else 0
+            self.pending[name] = {key: values[tail:] for key, values in data.items()}
+
+        return result
+
+    def flush(self):
+        """Close the open bars, e.g. at the end of an archive
+        :returns: dict -> {name: DataFrame with at most one bar}
+        """
+        result = {}
+
+        for name, definition in self.definitions.items():
+            pending = self.pending[name]
+            if pending is None or len(pending["Price"]) == 0:
+                result[name] = aggregate({}, np.empty(0, dtype=np.int64))
+            else:
+                result[name] = aggregate(pending, np.array([len(pending["Price"])]), definition)
+            self.pending[name] = None
+
+        return result
+
+def buildBars(columns, definitions, batch_rows=1 << 20):
+    """All bars of a trade table in batches, the open bar at the end included
+    :returns: dict -> {name: DataFrame}
+    """
+    builder = BarBuilder(definitions)
+    parts = {name: [] for name in definitions}
+    columns = {name: np.asarray(columns[name]) for name in TRADE_COLUMNS}
+    rows = len(columns["Price"])
+
+    for start in range(0, rows, batch_rows):
+        batch = {name: values[start:start + batch_rows] for name, values in columns.items()}
+        for name, bars in builder.update(batch).items():
+            parts[name].append(bars)
+
+    for name, bars in builder.flush().items():
+        parts[name].append(bars)
+
+    return {name: pd.concat(frames, ignore_index=True) for name, frames in parts.items()}
@@ -0,0 +1,50 @@
+# Import time budget of the client.
+#
+#   python -m binance.bench_import [budget ms] [runs]
+#
+# Every run imports Client in a fresh interpreter and measures it with -X importtime. The
+# best run is compared with the budget, and the run fails as well when one of the heavy data
+# modules got imported along with the client. Exits 1 when the budget is broken.
+import subprocess
+import sys
+
+BUDGET_MS = 150
+RUNS = 5
+HEAVY_MODULES = ["pandas", "numpy", "pyarrow", "talib", "dateparser"]
+
+CHECK = "import sys; from binance import Client; print(','.join(m for m in %r if m in sys.modules))" % (HEAVY_MODULES,)
+
+def importTime(runs=RUNS):
+    """Best cumulative import time of binance in ms and the heavy modules it loaded"""
+    best = None
+    loaded = []
+
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", CHECK], capture_output=True, text=True, check=True)
+
+        #lines look like "import time:  self [us] | cumulative | imported package"
+        for line in result.stderr.splitlines():
+            parts = [part.strip() for part in line.split("|")]
+            if len(parts) == 3 and parts[2] == "binance":
+                ms = int(parts[1]) / 1000
+                best = ms if best is None else min(best, ms)
+
+        loaded = [name for name in result.stdout.strip().split(",") if name]
+
+    return best, loaded
+
+def main(budget=BUDGET_MS, runs=RUNS):
+    ms, loaded = importTime(runs)
+    print(f"from binance import Client: {ms:.1f} ms (budget {budget} ms)")
+
+    ok = ms <= budget
+    if loaded:
+        print(f"heavy modules imported with the client: {', '.join(loaded)}")
+        ok = False
+
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    budget = float(sys.argv[1]) if len(sys.argv) > 1 else BUDGET_MS
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else RUNS
+    sys.exit(main(budget, runs))
@@ -0,0 +1,221 @@
+import numpy as np
+import json
+import os
+import struct
+
+# Single file container for a set of named numpy arrays plus json metadata.
+#
+# layout:
+#   MAGIC (4 bytes) | version (uint32) | header length (uint64) | json header | arrays
+#
+# Every array starts on an ALIGNMENT boundary so it can be viewed straight out of a
+# memory map without copying. The json header holds the metadata and for every array
+# its name, dtype, shape and offset from the start of the file.
+
+MAGIC = b"BRNF"
+VERSION = 1
+ALIGNMENT = 64
+PREFIX = struct.Struct("<4sIQ")
+
+MODEL_FILE = "model.brain"
+
+def _align(value):
+    return (value + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+def writeArrays(path, arrays, meta=None):
+    #arrays is an ordered dict name -> ndarray, the file is replaced atomically
+    arrays = {name: np.ascontiguousarray(arr) for name, arr in arrays.items()}
+    entries = []
+
+    #lay the arrays out relative to the data start first
+    relative = []
+    offset = 0
+    for name, arr in arrays.items():
+        entries.append({"name": name, "dtype": arr.dtype.str, "shape": list(arr.shape), "offset": 0})
+        relative.append(offset)
+        offset = _align(offset + arr.nbytes)
+
+    header = {"meta": meta if meta is not None else {}, "arrays": entries}
+
+    #the header length depends on the absolute offsets, grow the data start until it fits
+    data_start = 0
+    while True:
+        for entry, rel in zip(entries, relative):
+            entry["offset"] = data_start + rel
+
+        header_bytes = json.dumps(header).encode("utf-8")
+        needed = _align(PREFIX.size + len(header_bytes))
+
+        if needed <= data_start:
+            break
+        data_start = needed
+
+    temp_path = f"{path}.tmp"
+
+    with open(temp_path, "wb") as fh:
+        fh.write(PREFIX.pack(MAGIC, VERSION, len(header_bytes)))
+        fh.write(header_bytes)
+
+        for entry, arr in zip(entries, arrays.values()):
+            fh.write(b"\0" * (entry["offset"] - fh.tell()))
+            fh.write(memoryview(arr).cast("B"))
+
+        fh.flush()
+        os.fsync(fh.fileno())
+
+    os.replace(temp_path, path)
+
+def readHeader(path):
+    with open(path, "rb") as fh:
+        magic, version, length = PREFIX.unpack(fh.read(PREFIX.size))
+
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a brain file")
+        if version > VERSION:
+            raise ValueError(f"{path} has unsupported version {version}")
+
+        return json.loads(fh.read(length).decode("utf-8"))
+
+def readArrays(path, mmap_mode="r"):
+    """Read all arrays of a brain file
+    :params: mmap_mode -> "r" read only map, "c" copy on write map, None reads everything into memory
+    :returns: (dict -> {name: ndarray}, dict -> meta)
+    """
+    header = readHeader(path)
+    arrays = {}
+
+    if mmap_mode is None:
+        with open(path, "rb") as fh:
+            for entry in header["arrays"]:
+                dtype = np.dtype(entry["dtype"])
+                fh.seek(entry["offset"])
+                count = int(np.prod(entry["shape"], dtype=np.int64))
+                arrays[entry["name"]] = np.fromfile(fh, dtype=dtype, count=count).reshape(entry["shape"])
+    else:
+        #one map for the whole file, every array is a view into it
+        buffer = np.memmap(path, dtype=np.uint8, mode=mmap_mode)
+
+        for entry in header["arrays"]:
+            dtype = np.dtype(entry["dtype"])
+            nbytes = int(np.prod(entry["shape"], dtype=np.int64)) * dtype.itemsize
+            arrays[entry["name"]] = buffer[entry["offset"]:entry["offset"] + nbytes].view(dtype).reshape(entry["shape"])
+
+    return arrays, header["meta"]
+
+def writeModel(path, hidden_nodes, weights, biases, activation="tanh", generation=0, fitness=0.0):
+    arrays = {"hidden": np.asarray(hidden_nodes, dtype=np.int64)}
+
+    for i in range(len(weights)):
+        arrays[f"weights{i}"] = weights[i]
+        arrays[f"biases{i}"] = biases[i]
+
+    meta = {
+        "layers": len(weights),
+        "activation": activation,
+        "dtype": np.asarray(weights[0]).dtype.str,
+        "generation": int(generation),
+        "fitness": float(fitness)
+    }
+
+    writeArrays(path, arrays, meta)
+
+def readModel(path, mmap_mode="c"):
+    """Read a model written by writeModel
+    :returns: dict -> {
+        "hidden_nodes": ndarray,
+        "weights": lst -> [ndarray],
+        "biases": lst -> [ndarray],
+        "activation": str,
+        "dtype": str,
+        "generation": int,
+        "fitness": float
+    }
+    """
+    arrays, meta = readArrays(path, mmap_mode)
+    model = dict(meta)
+    model["hidden_nodes"] = np.asarray(arrays["hidden"], dtype=int)
+    model["weights"] = [arrays[f"weights{i}"] for i in range(meta["layers"])]
+    model["biases"] = [arrays[f"biases{i}"] for i in range(meta["layers"])]
+
+    return model
+
+def hasLegacyModel(directory):
+    return os.path.isfile(os.path.join(directory, "hidden.feather")) and os.path.isfile(os.path.join(directory, "weights0.feather"))
+
+def readLegacyModel(directory):
+    #old layout: hidden.feather + weights{i}.feather / biases{i}.feather per layer
+    import pyarrow.feather as feather
+
+    hidden_df = feather.read_feather(os.path.join(directory, "hidden.feather"))
+    hidden_nodes = np.transpose(hidden_df.to_numpy().astype(int))[0, :]
+    weights = []
+    biases = []
+
+    i = 0
+    while os.path.isfile(os.path.join(directory, f"weights{i}.feather")):
+        weights.append(feather.read_feather(os.path.join(directory, f"weights{i}.feather")).to_numpy())
+        biases.append(feather.read_feather(os.path.join(directory, f"biases{i}.feather")).to_numpy())
+        i += 1
+
+    return {
+        "hidden_nodes": hidden_nodes,
+        "weights": weights,
+        "biases": biases,
+        "activation": "tanh",
+        "dtype": weights[0].dtype.str,
+        "generation": 0,
+        "fitness": 0.0
+    }
+
+def _modelFiles(directory):
+    #(version, path) of every model in a brain directory, oldest first, MODEL_FILE is version 0
+    stem, suffix = os.path.splitext(MODEL_FILE)
+    models = []
+
+    if not os.path.isdir(directory):
+        return models
+
+    for name in os.listdir(directory):
+        if name == MODEL_FILE:
+            models.append((0, os.path.join(directory, name)))
+            continue
+
+        parts = name.split(".")
+        if len(parts) == 3 and parts[0] == stem and "." + parts[2] == suffix and parts[1].isdigit():
+            models.append((int(parts[1]), os.path.join(directory, name)))
+
+    return sorted(models)
+
+def modelPath(directory):
+    #newest model of a brain directory, None when it has none
+    models = _modelFiles(directory)
+    return models[-1][1] if models else None
+
+def nextModelPath(directory):
+    """Path for a new model, model.{n}.brain one version above the newest
+    A stored model is never overwritten: other brains may still map it, and Windows refuses
+    to replace a file that is mapped.
+    """
+    models = _modelFiles(directory)
+    version = models[-1][0] + 1 if models else 1
+    stem, suffix = os.path.splitext(MODEL_FILE)
+
+    return os.path.join(directory, f"{stem}.{version}{suffix}")
+
+def pruneModels(directory):
+    #remove every model but the newest, files that are still mapped somewhere are left for a later call
+    for _, path in _modelFiles(directory)[:-1]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def migrateModel(directory, path=None):
+    #convert a legacy feather directory into a single brain file, the old files are left untouched
+    if path is None:
+        path = os.path.join(directory, MODEL_FILE)
+
+    model = readLegacyModel(directory)
+    writeModel(path, model["hidden_nodes"], model["weights"], model["biases"], model["activation"], model["generation"], model["fitness"])
+
+    return path
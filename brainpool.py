@@ -0,0 +1,272 @@
+import numpy as np
+import threading
+import warnings
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+ALIGNMENT = 64
+
+def _align(value):
+    return (value + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+class BrainPool:
+    """Keeps the matrices of parked brains in memory up to budget_bytes.
+
+    Above the budget the least recently needed brains are spilled into a preallocated
+    memmap arena (spill_path, arena_bytes). prefetch() pulls spilled brains back in on
+    a background thread so they are resident by the time they get evaluated.
+
+    A brain is parked as its own arrays plus references to shared arrays (the parent
+    weight matrices its deltas apply to). Shared arrays are never spilled and count
+    against the budget once, however many parked brains refer to them.
+    """
+
+    def __init__(self, budget_bytes, spill_path=None, arena_bytes=0, workers=1):
+        self.budget_bytes = budget_bytes
+        self.resident = OrderedDict()       #idx -> lst of arrays, oldest first
+        self.resident_bytes = 0
+        self.spilled = {}                   #idx -> (offset, size, lst of (dtype, shape, offset))
+        self.loading = {}                   #idx -> future of a running prefetch
+        self.shared = {}                    #idx -> lst of shared arrays
+        self.shared_refs = {}               #id(array) -> [array, amount of parked brains using it]
+        self.shared_bytes = 0
+
+        self.arena = None
+        self.free_blocks = []
+        if spill_path is not None and arena_bytes > 0:
+            self.arena = np.memmap(spill_path, dtype=np.uint8, mode="w+", shape=(arena_bytes,))
+            self.free_blocks = [(0, arena_bytes)]
+
+        self.lock = threading.RLock()
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+
+        self.hits = 0
+        self.spills = 0
+        self.reloads = 0
+        self.overflows = 0
+
+    def __contains__(self, idx):
+        with self.lock:
+            return idx in self.resident or idx in self.spilled or idx in self.loading
+
+    def __len__(self):
+        with self.lock:
+            return len(self.resident) + len(self.spilled) + len(self.loading)
+
+    def put(self, idx, arrays, shared=()):
+        #arrays belong to the brain and may be spilled, shared arrays are only referenced
+        self._wait(idx)
+
+        with self.lock:
+            self._discard(idx)
+            self.resident[idx] = list(arrays)
+            self.resident_bytes += sum(arr.nbytes for arr in arrays)
+            self.shared[idx] = list(shared)
+            self._share(self.shared[idx])
+            self._evict()
+
+    def get(self, idx):
+        #return (arrays, shared arrays) of idx and mark them as most recently needed
+        self._wait(idx)
+
+        with self.lock:
+            if idx in self.resident:
+                self.hits += 1
+                self.resident.move_to_end(idx)
+                return self.resident[idx], self.shared[idx]
+
+            arrays = self._reload(idx)
+            self.resident[idx] = arrays
+            self.resident_bytes += sum(arr.nbytes for arr in arrays)
+            self._evict(keep=idx)
+
+            return arrays, self.shared[idx]
+
+    def take(self, idx):
+        #return (arrays, shared arrays) of idx and drop them from the pool
+        self._wait(idx)
+
+        with self.lock:
+            if idx in self.resident:
+                self.hits += 1
+                arrays = self.resident.pop(idx)
+                self.resident_bytes -= sum(arr.nbytes for arr in arrays)
+            else:
+                arrays = self._reload(idx)
+
+            shared = self.shared.pop(idx)
+            self._unshare(shared)
+
+            return arrays, shared
+
+    def remove(self, idx):
+        self._wait(idx)
+
+        with self.lock:
+            self._discard(idx)
+
+    def prefetch(self, idxs):
+        #asynchronously bring the next batch to be evaluated back into memory
+        with self.lock:
+            for idx in idxs:
+                if idx in self.resident:
+                    self.resident.move_to_end(idx)
+                elif idx in self.spilled and idx not in self.loading:
+                    self.loading[idx] = self.executor.submit(self._prefetch, idx)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+        with self.lock:
+            self.resident.clear()
+            self.spilled.clear()
+            self.shared.clear()
+            self.shared_refs.clear()
+            self.resident_bytes = 0
+            self.shared_bytes = 0
+            self.arena = None
+
+    def stats(self):
+        with self.lock:
+            return {
+                "resident": len(self.resident),
+                "resident_bytes": self.resident_bytes,
+                "shared_bytes": self.shared_bytes,
+                "spilled": len(self.spilled),
+                "hits": self.hits,
+                "spills": self.spills,
+                "reloads": self.reloads,
+                "overflows": self.overflows
+            }
+
+    def _wait(self, idx):
+        with self.lock:
+            future = self.loading.get(idx)
+
+        if future is not None:
+            future.result()
+
+    def _prefetch(self, idx):
+        with self.lock:
+            offset, size, entries = self.spilled[idx]
+
+        #the block stays reserved while loading, so it is safe to copy without holding the lock
+        arrays = self._read(offset, entries)
+
+        with self.lock:
+            del self.spilled[idx]
+            self._free(offset, size)
+            self.reloads += 1
+            self.resident[idx] = arrays
+            self.resident_bytes += sum(arr.nbytes for arr in arrays)
+            del self.loading[idx]
+            self._evict(keep=idx)
+
+    def _share(self, arrays):
+        for arr in arrays:
+            ref = self.shared_refs.get(id(arr))
+            if ref is None:
+                self.shared_refs[id(arr)] = [arr, 1]
+                self.shared_bytes += arr.nbytes
+            else:
+                ref[1] += 1
+
+    def _unshare(self, arrays):
+        for arr in arrays:
+            ref = self.shared_refs[id(arr)]
+            ref[1] -= 1
+            if ref[1] == 0:
+                del self.shared_refs[id(arr)]
+                self.shared_bytes -= arr.nbytes
+
+    def _discard(self, idx):
+        if idx in self.resident:
+            self.resident_bytes -= sum(arr.nbytes for arr in self.resident.pop(idx))
+        elif idx in self.spilled:
+            offset, size, _ = self.spilled.pop(idx)
+            self._free(offset, size)
+
+        if idx in self.shared:
+            self._unshare(self.shared.pop(idx))
+
+    def _reload(self, idx):
+        if idx not in self.spilled:
+            raise KeyError(idx)
+
+        offset, size, entries = self.spilled.pop(idx)
+        arrays = self._read(offset, entries)
+        self._free(offset, size)
+        self.reloads += 1
+
+        return arrays
+
+    def _read(self, offset, entries):
+        arrays = []
+
+        for dtype, shape, rel in entries:
+            nbytes = int(np.prod(shape, dtype=np.int64)) * dtype.itemsize
+            start = offset + rel
+            arrays.append(np.array(self.arena[start:start + nbytes]).view(dtype).reshape(shape))
+
+        return arrays
+
+    def _evict(self, keep=None):
+        while self.resident_bytes + self.shared_bytes > self.budget_bytes:
+            idx = next((key for key in self.resident if key != keep), None)
+
+            if idx is None:
+                break
+
+            arrays = self.resident[idx]
+            entries = []
+            size = 0
+            for arr in arrays:
+                entries.append((arr.dtype, arr.shape, size))
+                size = _align(size + arr.nbytes)
+
+            offset = self._allocate(size)
+
+            if offset is None:
+                #arena full or missing, stay over budget rather than lose the brain
+                self.overflows += 1
+                warnings.warn(f"BrainPool over budget: no arena space for {size} bytes")
+                break
+
+            for arr, (_, _, rel) in zip(arrays, entries):
+                start = offset + rel
+                self.arena[start:start + arr.nbytes] = np.ascontiguousarray(arr).reshape(-1).view(np.uint8)
+
+            del self.resident[idx]
+            self.resident_bytes -= sum(arr.nbytes for arr in arrays)
+            self.spilled[idx] = (offset, size, entries)
+            self.spills += 1
+
+    def _allocate(self, size):
+        #first fit over the sorted free list
+        size = max(size, ALIGNMENT)
+
+        for i, (offset, length) in enumerate(self.free_blocks):
+            if length >= size:
+                if length == size:
+                    del self.free_blocks[i]
+                else:
+                    self.free_blocks[i] = (offset + size, length - size)
+                return offset
+
+        return None
+
+    def _free(self, offset, size):
+        size = max(size, ALIGNMENT)
+        blocks = self.free_blocks
+        i = 0
+        while i < len(blocks) and blocks[i][0] < offset:
+            i += 1
+        blocks.insert(i, (offset, size))
+
+        #merge with the neighbours
+        if i + 1 < len(blocks) and blocks[i][0] + blocks[i][1] == blocks[i + 1][0]:
+            blocks[i] = (blocks[i][0], blocks[i][1] + blocks[i + 1][1])
+            del blocks[i + 1]
+        if i > 0 and blocks[i - 1][0] + blocks[i - 1][1] == blocks[i][0]:
+            blocks[i - 1] = (blocks[i - 1][0], blocks[i - 1][1] + blocks[i][1])
+            del blocks[i]
@@ -0,0 +1,197 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    #no cross process locking on Windows, processes may fetch the same key at once there
+    fcntl = None
+
+# Cache for unsigned GET responses of Client.
+#
+# Every path has its own time to live, paths without one are never cached. Concurrent
+# requests for the same key share one call (single flight): the first thread fetches and
+# the others wait for its result. With a FileCache backend processes share results through
+# a directory, and a lock file per key makes one process fetch while the others wait.
+#
+# Cached results are shared between callers and must not be modified.
+
+DEFAULT_TTLS = {
+    "exchangeInfo": 60.0,
+    "ticker/price": 1.0,
+    "ticker/bookTicker": 1.0,
+    "ticker/24hr": 2.0,
+    "avgPrice": 1.0,
+    "depth": 0.5
+}
+
+def cache_key(path, params):
+    if not params:
+        return path
+
+    return path + "?" + "&".join(f"{key}={value}" for key, value in sorted(params.items()) if value is not None)
+
+class _Flight:
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+class FileCache:
+    """Results as json files in directory, shared by every process using the same directory"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key, suffix):
+        return os.path.join(self.directory, hashlib.sha1(key.encode("utf-8")).hexdigest() + suffix)
+
+    def get(self, key):
+        #(value, expires) or None when missing or expired
+        try:
+            with open(self._path(key, ".json"), "r") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if entry["expires"] <= time.time():
+            return None
+
+        return entry["value"], entry["expires"]
+
+    def set(self, key, value, expires):
+        path = self._path(key, ".json")
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+        with open(tmp_path, "w") as f:
+            json.dump({"expires": expires, "value": value}, f)
+        os.replace(tmp_path, path)
+
+    @contextmanager
+    def lock(self, key):
+        if fcntl is None:
+            yield
+            return
+
+        with open(self._path(key, ".lock"), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+class ResponseCache:
+    """TTL cache with request coalescing for unsigned GETs
+    :params: ttls -> dict -> {path: seconds}, paths not in it are not cached
+             max_entries -> entries kept in memory, least recently used are evicted first
+             backend -> FileCache to share results across processes
+    """
+
+    def __init__(self, ttls=None, max_entries=1024, backend=None):
+        self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        self.max_entries = max_entries
+        self.backend = backend
+
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()        #key -> (value, expires)
+        self.flights = {}                   #key -> _Flight
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.backend_hits = 0
+        self.evictions = 0
+
+    def get(self, path, params, fetch):
+        """Cached result of path with params, fetch() is called on a miss"""
+        ttl = self.ttls.get(path)
+        if not ttl:
+            return fetch()
+
+        key = cache_key(path, params)
+        owner = False
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[1] > time.time():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+            flight = self.flights.get(key)
+            if flight is not None:
+                self.coalesced += 1
+            else:
+                self.misses += 1
+                flight = self.flights[key] = _Flight()
+                owner = True
+
+        if not owner:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        value = expires = None
+        try:
+            value, expires = self._fetch(key, ttl, fetch)
+            flight.value = value
+        except BaseException as e:
+            #ctrl-c included, the waiters get the error instead of a value that was never fetched
+            flight.error = e
+            raise
+        finally:
+            with self.lock:
+                if flight.error is None and expires is not None:
+                    self.entries[key] = (flight.value, expires)
+                    self.entries.move_to_end(key)
+                    while len(self.entries) > self.max_entries:
+                        self.entries.popitem(last=False)
+                        self.evictions += 1
+                del self.flights[key]
+            flight.done.set()
+
+        return value
+
+    def _fetch(self, key, ttl, fetch):
+        if self.backend is None:
+            return fetch(), time.time() + ttl
+
+        entry = self.backend.get(key)
+        if entry is not None:
+            self.backend_hits += 1
+            return entry
+
+        with self.backend.lock(key):
+            #another process might have fetched it while this one waited for the lock
+            entry = self.backend.get(key)
+            if entry is not None:
+                self.backend_hits += 1
+                return entry
+
+            value = fetch()
+            expires = time.time() + ttl
+            self.backend.set(key, value, expires)
+
+        return value, expires
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "backend_hits": self.backend_hits,
+            "evictions": self.evictions,
+            "entries": len(self.entries)
+        }
@@ -0,0 +1,71 @@
+import numpy as np
+import random
+import brainfile
+from trader import Trader
+
+# Checkpoints of a training run, stored as a brain file (see brainfile.py).
+#
+# The json header holds the run state, every trader's counters and brain layout, and
+# the python / numpy random states. All matrices go into the array section once, even
+# when several traders share them (copy on write clones), so a checkpoint stays close
+# to the size of the distinct weights. Writing is atomic: the previous checkpoint is
+# only replaced once the new one is complete on disk.
+
+def saveCheckpoint(path, state, **groups):
+    """Write a checkpoint
+    :params: state -> dict, json serializable run state
+             groups -> named lists of traders, a trader may appear in several groups
+    """
+    arrays = {}
+    names = {}
+
+    def ref(arr):
+        key = id(arr)
+        if key not in names:
+            names[key] = f"a{len(names)}"
+            arrays[names[key]] = arr
+        return names[key]
+
+    traders = []
+    index = {}
+    layout = {}
+
+    for group, members in groups.items():
+        layout[group] = []
+        for trader in members:
+            if id(trader) not in index:
+                index[id(trader)] = len(traders)
+                traders.append(trader.getState(ref))
+            layout[group].append(index[id(trader)])
+
+    py_version, py_state, py_gauss = random.getstate()
+    np_name, np_keys, np_pos, np_has_gauss, np_gauss = np.random.get_state()
+    arrays["np_random"] = np_keys
+
+    meta = {
+        "state": state,
+        "traders": traders,
+        "groups": layout,
+        "random": [py_version, list(py_state), py_gauss],
+        "np_random": [np_name, np_pos, np_has_gauss, np_gauss]
+    }
+
+    brainfile.writeArrays(path, arrays, meta)
+
+def loadCheckpoint(path):
+    """Read a checkpoint and restore the python and numpy random states
+    :returns: (dict -> state, dict -> {group: lst -> [Trader]})
+    """
+    #read into memory, the file gets replaced by the next checkpoint
+    arrays, meta = brainfile.readArrays(path, mmap_mode=None)
+
+    traders = [Trader.fromState(state, arrays) for state in meta["traders"]]
+    groups = {group: [traders[i] for i in members] for group, members in meta["groups"].items()}
+
+    py_version, py_state, py_gauss = meta["random"]
+    random.setstate((py_version, tuple(py_state), py_gauss))
+
+    np_name, np_pos, np_has_gauss, np_gauss = meta["np_random"]
+    np.random.set_state((np_name, arrays["np_random"], np_pos, np_has_gauss, np_gauss))
+
+    return meta["state"], groups
@@ -4,12 +4,19 @@ import hashlib
 import time
 import os
 import sys
-import numpy as np
+import threading
 
 from operator import itemgetter
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 
 import binance.helpers as bhelp
 from binance.exceptions import APIException, RequestException, WithdrawException
+from binance.filters import compile_filters, normalize_order
+from binance.clock import ServerClock
+from binance.retry import RetryPolicy
+from binance.metrics import request_event
 
 class Client(object):
     """
@@ -111,7 +118,10 @@ class Client(object):
 
     MAIN_PATH = ""
 
-    def __init__(self, api_key=None, api_secret=None, requests_params=None, tld="com", test=False):
+    #seconds the average price used by PERCENT_PRICE and market order MIN_NOTIONAL checks is reused
+    AVG_PRICE_AGE = 5.0
+
+    def __init__(self, api_key=None, api_secret=None, requests_params=None, tld="com", test=False, validate_orders=True, sync_time=False, retries=5, metrics=None, cache=None, pool_maxsize=10):
         if not test:
             self.API_URL = self.API_URL.format(tld)
         else:
@@ -124,12 +134,36 @@ class Client(object):
 
         self.API_KEY = api_key
         self.API_SECRET = api_secret
+        self.pool_maxsize = pool_maxsize
         self.session = self._init_session()
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._mapping = threading.local()       #set in threads running a map call
         self._requests_params = requests_params
-        self.response = None
+
+        #symbol filters of exchangeInfo, loaded on the first order when validate_orders is set
+        self.validate_orders = validate_orders
+        self.symbol_filters = None
+        self._reloaded_symbols = set()     #unknown symbols the filters were reloaded for once
+
+        #server time estimate for signed requests, local time is used when not set
+        self.clock = None
+
+        #retries of failed requests, set to None to raise on the first failure
+        self.retry_policy = RetryPolicy(max_retries=retries) if retries else None
+
+        #sink for request metrics, see binance.metrics
+        self.metrics = metrics
+
+        #opt in cache for unsigned GETs, see binance.cache
+        self.cache = cache
 
         #To init DNS and SSL certificates
         self.ping()
+
+        if sync_time:
+            self.clock = ServerClock(self)
+            self.clock.start()
     
     def _init_session(self):
 
@@ -140,7 +174,16 @@ class Client(object):
             "X-MBX-APIKEY": self.API_KEY
         })
 
+        self._mount(session, self.pool_maxsize)
+
         return session
+
+    def _mount(self, session, size):
+        #one pool per host, size connections are kept open for threads sharing this client
+        hosts = {urlsplit(url).hostname for url in (self.API_URL, self.WITHDRAW_API_URL, self.MARGIN_API_URL, self.WEBSITE_URL, self.FUTURES_URL)}
+        adapter = HTTPAdapter(pool_connections=len(hosts), pool_maxsize=size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
     
     def _create_api_uri(self, path, signed=True, version=PUBLIC_API_VERSION):
         if signed:
@@ -199,38 +242,76 @@ class Client(object):
         if self._requests_params:
             kwargs.update(self._requests_params)
 
-        #create key
-        data = kwargs.get("data", None)
+        data = kwargs.pop("data", None)
         if data and isinstance(data, dict):
-            kwargs["data"] = data
-
             #find any requests params passed and apply them
-            if "requests_params" in kwargs["data"]:
+            if "requests_params" in data:
                 #merge requests params into kwargs
-                kwargs.update(kwargs["data"]["requests_params"])
-                del(kwargs["data"]["requests_params"])
-        
+                kwargs.update(data["requests_params"])
+                del(data["requests_params"])
+
+        attempts = [0]
+
+        def send():
+            #signed params are built again for every attempt, each one needs a fresh timestamp
+            request_kwargs = self._request_kwargs(method, signed, force_params, data, kwargs)
+
+            if self.metrics is None:
+                return self._handle_response(getattr(self.session, method)(uri, **request_kwargs))
+
+            attempts[0] += 1
+            return self._request_measured(method, uri, request_kwargs, attempts[0] - 1)
+
+        if self.retry_policy is None:
+            return send()
+
+        return self.retry_policy.call(self, method, uri, data, send)
+
+    def _request_measured(self, method, uri, request_kwargs, attempt):
+        response = None
+        start = time.perf_counter()
+        received = None
+
+        try:
+            response = getattr(self.session, method)(uri, **request_kwargs)
+            received = time.perf_counter()
+            return self._handle_response(response)
+        finally:
+            end = time.perf_counter()
+            self.metrics(request_event(method, uri, response, attempt, start, received or end, end))
+
+    def _request_kwargs(self, method, signed, force_params, data, kwargs):
+        kwargs = dict(kwargs)
+
+        if data is not None:
+            data = dict(data)
+        elif signed:
+            data = {}
+
         if signed:
             #generate signature
-            kwargs["data"]["timestamp"] = int(time.time() * 1000)
-            kwargs["data"]["signature"] = self._generate_signature(kwargs["data"])
-        
-        #sort get and post params to match signature order
-        if data:
-            #sort post params
-            kwargs["data"] = self._order_params(kwargs["data"])
+            if self.clock is not None:
+                data["timestamp"] = self.clock.timestamp()
+                if data.get("recvWindow") is None:
+                    data["recvWindow"] = self.clock.recv_window()
+            else:
+                data["timestamp"] = int(time.time() * 1000)
+            data["signature"] = self._generate_signature(data)
+
+        if not data:
+            if data is not None:
+                kwargs["data"] = data
+            return kwargs
 
-            #remove any arguments with values of None
-            null_args = [i for i, (key, value) in enumerate(kwargs["data"]) if value is None]
-            for i in reversed(null_args): #remove in reversed order to not have shifting indexes
-                del(kwargs["data"][i])
+        #sort get and post params to match signature order and remove any arguments with values of None
+        params = [(key, value) for key, value in self._order_params(data) if value is not None]
 
-        if data and (method == "get" or force_params):
-            kwargs["params"] = "&".join("{}={}".format(elem[0], elem[1]) for elem in kwargs["data"])
-            del(kwargs["data"])
+        if method == "get" or force_params:
+            kwargs["params"] = "&".join("{}={}".format(elem[0], elem[1]) for elem in params)
+        else:
+            kwargs["data"] = params
 
-        self.response = getattr(self.session, method)(uri, **kwargs)
-        return self._handle_response()
+        return kwargs
 
     def _request_api(self, method, path, signed=False, version=PUBLIC_API_VERSION, **kwargs):
         uri = self._create_api_uri(path, signed, version)
@@ -257,15 +338,18 @@ class Client(object):
 
         return self._request(method, uri, signed, True, **kwargs)
 
-    def _handle_response(self):
-        if not str(self.response.status_code).startswith("2"):
-            raise APIException(self.response)
+    def _handle_response(self, response):
+        if not str(response.status_code).startswith("2"):
+            raise APIException(response)
         try:
-            return self.response.json()
+            return response.json()
         except ValueError:
-            raise RequestException(f"Invalid Response: {self.response.text}")
+            raise RequestException(f"Invalid Response: {response.text}")
 
     def _get(self, path, signed=False, version=PUBLIC_API_VERSION, **kwargs):
+        if self.cache is not None and not signed:
+            return self.cache.get(f"{version}/{path}" if version != self.PUBLIC_API_VERSION else path, kwargs.get("data"), lambda: self._request_api("get", path, signed, version, **kwargs))
+
         return self._request_api("get", path, signed, version, **kwargs)
 
     def _post(self, path, signed=False, version=PUBLIC_API_VERSION, **kwargs):
@@ -277,6 +361,75 @@ class Client(object):
     def _delete(self, path, signed=False, version=PUBLIC_API_VERSION, **kwargs):
         return self._request_api("delete", path, signed, version, **kwargs)
 
+    def load_symbol_filters(self):
+        """(Re)load the symbol filters used to check orders before they are sent
+        :returns: dict -> {symbol: SymbolFilters}
+        """
+        self.symbol_filters = compile_filters(self.get_exchange_info())
+        return self.symbol_filters
+
+    def _validate_order(self, params):
+        if not self.validate_orders:
+            return params
+
+        symbol = params.get("symbol")
+        if self.symbol_filters is None:
+            self.load_symbol_filters()
+        elif symbol not in self.symbol_filters and symbol not in self._reloaded_symbols:
+            #unknown symbols might be listed after the filters were loaded, reloaded once per symbol
+            self._reloaded_symbols.add(symbol)
+            self.load_symbol_filters()
+
+        filters = self.symbol_filters.get(symbol)
+        if filters is not None and filters.status == "TRADING" and filters.needs_price(params, self.AVG_PRICE_AGE):
+            filters.update_price(self.get_avg_price(symbol=symbol)["price"])
+
+        return normalize_order(self.symbol_filters, params)
+
+    def map(self, method, params_list, workers=None):
+        """Call a client method for every params dict on a thread pool
+        The Client is safe to share between threads, all calls go over the same session.
+        :params: method -> str or bound method, e.g. "get_candles" or client.get_candles
+                 params_list -> lst of dict -> keyword arguments of each call
+                 workers -> size of the pool, defaults to pool_maxsize so every thread has a connection
+                    a map called from a mapped call runs on a pool of its own
+        :returns: lst -> results in the order of params_list, the first exception is raised
+        """
+        if isinstance(method, str):
+            method = getattr(self, method)
+
+        def call(params):
+            self._mapping.active = True
+            return method(**params)
+
+        nested = getattr(self._mapping, "active", False)
+
+        if workers is not None or nested:
+            #a map called from a mapped call waiting on the shared pool could take every thread of it and deadlock
+            workers = self.pool_maxsize if workers is None else workers
+            with self._executor_lock:
+                if workers > self.pool_maxsize:
+                    #more threads than connections would open and drop a connection per call
+                    self.pool_maxsize = workers
+                    self._mount(self.session, workers)
+
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                return list(executor.map(call, params_list))
+
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.pool_maxsize)
+
+        return list(self._executor.map(call, params_list))
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        if self.clock is not None:
+            self.clock.stop()
+        self.session.close()
+
     def get_exchange_info(self):
         """Current exchange trading rules and symbol information
         :params: None
@@ -423,7 +576,7 @@ class Client(object):
                     #start time + an hour in milliseconds
                     end_ts = start_ts + (60 * 60 * 1000)
 
-                    params = {"symbol":symbol, "StartTime":start_ts, "endTime":end_ts}
+                    params = {"symbol":symbol, "startTime":start_ts, "endTime":end_ts}
 
                     trades = self.get_aggregate_trades(**params)
 
@@ -444,7 +597,7 @@ class Client(object):
         while True:
             trades = self.get_aggregate_trades(**params)
 
-            if len(trades) == 1:
+            if len(trades) <= 1:
                 return
             
             trades.pop(0)
@@ -547,6 +700,8 @@ class Client(object):
         return output_data
     
     def get_historical_candles_generator(self, symbol, start_str, interval=KLINE_INTERVAL_15MINUTE, end_str=None):
+        #numpy is only needed here, importing it with the client would slow down every short script
+        import numpy as np
 
         limit = 1000
 
@@ -731,6 +886,7 @@ class Client(object):
             }]
         }
         """
+        params = self._validate_order(params)
         return self._post("order", True, data=params)
 
     def order_limit(self, timeInForce=TIME_IN_FORCE_GTC, **params):
@@ -777,6 +933,7 @@ class Client(object):
         return self.order_market(**params)
     
     def create_oco_order(self, **params):
+        params = self._validate_order(params)
         return self._post("order/oco", True, data=params)
     
     def order_oco_buy(self, **params):
@@ -822,6 +979,7 @@ class Client(object):
 
         :returns: dict -> {}
         """
+        params = self._validate_order(params)
         return self._post("order/test", True, data=params)
 
     def get_order(self, **params):
@@ -0,0 +1,140 @@
+import statistics
+import threading
+import time
+from collections import deque
+
+# Offset between the local clock and the Binance server clock.
+#
+# Every sample is one get_server_time call: with t0 and t1 the local send and receive times,
+# the server time is assumed to be taken halfway, so offset = server - (t0 + t1) / 2 with an
+# error of at most rtt / 2. Like NTP a sync takes a few samples and keeps the one with the
+# lowest round trip, its offset is the least affected by queueing on the way.
+
+class ServerClock:
+    """Server time estimate for signed requests
+    :params: client -> Client used for get_server_time
+             samples -> get_server_time calls per sync
+             refresh -> seconds between syncs of the background thread
+             margin -> ms of slack added to the recvWindow
+             min_recv_window, max_recv_window -> bounds of the adaptive recvWindow (Binance max is 60000)
+    """
+
+    def __init__(self, client, samples=5, refresh=60, margin=250, min_recv_window=1000, max_recv_window=60000, history=120):
+        self.client = client
+        self.samples = samples
+        self.refresh = refresh
+        self.margin = margin
+        self.min_recv_window = min_recv_window
+        self.max_recv_window = max_recv_window
+
+        #offset and rtt are replaced as one tuple so readers never see half a sync
+        self.state = (0.0, 0.0, 0.0)     #offset ms, rtt ms, jitter ms
+        self.synced = False
+        self.syncs = 0
+        self.failures = 0
+        self.last_sync = None
+        self.history = deque(maxlen=history)    #(local time s, offset ms, rtt ms)
+
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sample(self):
+        """One get_server_time round trip
+        :returns: (float -> offset ms, float -> rtt ms)
+        """
+        start = time.perf_counter()
+        t0 = time.time() * 1000
+        server = self.client.get_server_time()["serverTime"]
+        rtt = (time.perf_counter() - start) * 1000
+
+        #local receive time from the monotonic clock, time.time can step in between
+        return server - (t0 + rtt / 2), rtt
+
+    def sync(self, samples=None):
+        samples = self.samples if samples is None else samples
+        results = [self.sample() for _ in range(samples)]
+
+        offsets = [offset for offset, _ in results]
+        best_offset, best_rtt = min(results, key=lambda result: result[1])
+
+        #spread of the offsets says how far a single estimate can be off
+        jitter = statistics.pstdev(offsets) if samples > 1 else best_rtt / 2
+
+        self.state = (best_offset, best_rtt, jitter)
+        self.synced = True
+        self.syncs += 1
+        self.last_sync = time.time()
+        self.history.append((self.last_sync, self.state[0], self.state[1]))
+
+        return self.state[0]
+
+    def timestamp(self):
+        return int(time.time() * 1000 + self.state[0])
+
+    def recv_window(self):
+        """recvWindow that covers the uncertainty of the offset and the trip to the server
+        With a good sync this is well below the default 5000, so stale requests are refused.
+        """
+        if not self.synced:
+            return 5000
+
+        _, rtt, jitter = self.state
+        window = self.margin + 2 * rtt + 4 * jitter + abs(self.drift()) / 3600 * self.refresh
+
+        return int(min(self.max_recv_window, max(self.min_recv_window, window)))
+
+    def drift(self):
+        """Drift of the local clock against the server in ms per hour, from the sync history"""
+        if len(self.history) < 3:
+            return 0.0
+
+        history = list(self.history)
+        hours = [(sync_time - history[0][0]) / 3600 for sync_time, _, _ in history]
+        #over less than a refresh period the slope is only sampling noise
+        if hours[-1] * 3600 < self.refresh:
+            return 0.0
+
+        #least squares slope of offset over time
+        mean_hours = sum(hours) / len(hours)
+        mean_offset = sum(offset for _, offset, _ in history) / len(history)
+        covariance = sum((h - mean_hours) * (offset - mean_offset) for h, (_, offset, _) in zip(hours, history))
+        variance = sum((h - mean_hours) ** 2 for h in hours)
+
+        return covariance / variance
+
+    def metrics(self):
+        offset, rtt, jitter = self.state
+
+        return {
+            "offset": offset,
+            "rtt": rtt,
+            "jitter": jitter,
+            "drift": self.drift(),
+            "recv_window": self.recv_window(),
+            "syncs": self.syncs,
+            "failures": self.failures,
+            "last_sync": self.last_sync
+        }
+
+    def start(self):
+        """Sync now and keep syncing every refresh seconds in a daemon thread"""
+        self.sync()
+
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.refresh):
+            try:
+                self.sync()
+            except Exception:
+                #keep the last estimate, the next refresh tries again
+                self.failures += 1
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
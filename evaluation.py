@@ -0,0 +1,60 @@
+import numpy as np
+
+INPUTROWS = 50
+CHUNK_ROWS = 65536
+CHECK_EVERY = 120
+
+def iterInputs(matrix, start, stop, window=INPUTROWS, chunk_rows=CHUNK_ROWS):
+    """Yield (p, inputs) for every timestep p in [start, stop - window)
+
+    inputs are the rows p + window down to p + 1 without column 0 (CloseTime), flattened.
+    matrix can be a memmap of any length: only chunk_rows + window rows are copied into
+    memory at a time, so peak memory depends on the chunk size and not on the history.
+    """
+    last = min(stop, len(matrix)) - window
+
+    for chunk_start in range(start, last, chunk_rows):
+        chunk_stop = min(chunk_start + chunk_rows, last)
+
+        #the chunk overlaps the next one by window rows so windows crossing the boundary stay whole
+        block = np.array(matrix[chunk_start:chunk_stop + window, 1:])
+
+        for q in range(chunk_stop - chunk_start):
+            yield chunk_start + q, block[q + window:q:-1].reshape(-1)
+
+        del block
+
+def evaluateTraders(traders, matrix, start=0, stop=None, window=INPUTROWS, chunk_rows=CHUNK_ROWS, verbose=True):
+    """Let every trader think over the timesteps in [start, stop) of matrix
+    A trader dies when its profit drops below 0 or it did not trade in the last CHECK_EVERY steps.
+    The traders keep their state (position, counters) on the objects, across chunk boundaries.
+    :returns: (lst -> [Trader] still alive, lst -> [Trader] died in order of dying)
+    """
+    if stop is None:
+        stop = len(matrix)
+
+    traders = list(traders)
+    died_traders = []
+
+    if len(traders) == 0:
+        return traders, died_traders
+
+    for p, inputs in iterInputs(matrix, start, stop, window, chunk_rows):
+        for k in reversed(range(len(traders))):
+            traders[k].think(inputs)
+
+            if traders[k].profit < 0 or (traders[k].counter % CHECK_EVERY == 0 and (traders[k].lastCounter == traders[k].tradesCounter)):
+                traders[k].profit = 0
+                died_traders.append(traders.pop(k))
+                continue
+
+            if verbose and traders[k].counter % CHECK_EVERY == 0:
+                print(f"id: {traders[k].idx}\tcounter: {traders[k].counter}\tfit: {traders[k].fitness:.4f}\tprof: {traders[k].profit:.4f}\ttrades: {traders[k].tradesCounter}\tpt: {traders[k].tradesProfit}")
+
+            if traders[k].counter % CHECK_EVERY == 0:
+                traders[k].lastCounter = traders[k].tradesCounter
+
+        if len(traders) == 0:
+            break
+
+    return traders, died_traders
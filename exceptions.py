@@ -96,4 +96,25 @@ class UnknownSymbolException(Exception):
         self.message = f"Unknown symbol {value}"
     
     def __str__(self):
-        return f"UnknownSymbolException: {self.message}"
\ No newline at end of file
+        return f"UnknownSymbolException: {self.message}"
+
+
+class OrderMaxPriceException(OrderException):
+
+    def __init__(self, value):
+        message = "Price must be at most {}".format(value)
+        super(OrderMaxPriceException, self).__init__(-1013, message)
+
+
+class OrderMaxAmountException(OrderException):
+
+    def __init__(self, value):
+        message = "Amount must be at most {}".format(value)
+        super(OrderMaxAmountException, self).__init__(-1013, message)
+
+
+class OrderPercentPriceException(OrderException):
+
+    def __init__(self, low, high):
+        message = "Price must be between {} and {}".format(low, high)
+        super(OrderPercentPriceException, self).__init__(-1013, message)
@@ -0,0 +1,246 @@
+import hashlib
+import hmac
+import http.client
+import json
+import socket
+import threading
+import time
+from collections import deque
+from urllib.parse import urlencode, urlsplit
+
+from binance.exceptions import APIException, RequestException
+
+# Low latency order path next to Client._request.
+#
+# The HMAC is keyed once and copied per request, the query string is built in one pass
+# over the params in the order they are given (Binance signs the string as sent, it does
+# not need to be sorted), headers are built once and orders go over one persistent
+# HTTPS connection that is opened up front and kept warm with pings while idle.
+
+STAGES = ("build", "sign", "send", "wait", "read")
+
+class FastResponse:
+
+    def __init__(self, status_code, text, headers):
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers
+        self.request = None
+
+    def json(self):
+        return json.loads(self.text)
+
+class FastOrderSender:
+    """Send orders for a Client over a warm connection
+    :params: client -> Client with API_KEY and API_SECRET
+             keepalive -> seconds between pings while the connection is idle, None disables them
+             history -> amount of timings kept per stage
+    """
+
+    def __init__(self, client, keepalive=30, timeout=10, history=1000):
+        self.client = client
+        self.timeout = timeout
+        self.keepalive = keepalive
+
+        url = urlsplit(client.API_URL)
+        self.host = url.hostname
+        self.port = url.port
+        self.order_path = f"{url.path}/{client.PRIVATE_API_VERSION}/order"
+        self.ping_path = f"{url.path}/{client.PUBLIC_API_VERSION}/ping"
+
+        self.mac = hmac.new(client.API_SECRET.encode("utf-8"), digestmod=hashlib.sha256)
+        self.headers = {
+            "Accept": "application/json",
+            "User-Agent": "binance/python",
+            "X-MBX-APIKEY": client.API_KEY,
+            "Content-Type": "application/x-www-form-urlencoded",
+            "Connection": "keep-alive"
+        }
+
+        self.connection = None
+        self.lock = threading.Lock()
+        self.last_used = 0.0
+        self.timings = {stage: deque(maxlen=history) for stage in STAGES + ("total", "tick_to_send")}
+        self.last_timing = None
+
+        self._stop = threading.Event()
+        self._thread = None
+
+    #connection
+
+    def _connect(self):
+        if self.connection is not None:
+            self.connection.close()
+
+        self.connection = http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout)
+        self.connection.connect()
+        self.connection.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def _roundtrip(self, method, path, body=None):
+        #caller holds the lock, a dropped keep alive connection is reopened once
+        for attempt in range(2):
+            try:
+                if self.connection is None:
+                    self._connect()
+
+                self.connection.request(method, path, body=body, headers=self.headers)
+                response = self.connection.getresponse()
+                text = response.read().decode("utf-8")
+                self.last_used = time.monotonic()
+                return FastResponse(response.status, text, dict(response.getheaders()))
+            except (http.client.RemoteDisconnected, http.client.CannotSendRequest, ConnectionError, BrokenPipeError):
+                self._disconnect()
+                if attempt == 1:
+                    raise
+
+    def warm(self):
+        """Open the connection, load the symbol filters and start the keep alive pings"""
+        if self.client.validate_orders and self.client.symbol_filters is None:
+            self.client.load_symbol_filters()
+
+        with self.lock:
+            self._connect()
+            self._roundtrip("GET", self.ping_path)
+
+        if self.keepalive is not None and self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._keepalive, daemon=True)
+            self._thread.start()
+
+    def _keepalive(self):
+        while not self._stop.wait(self.keepalive / 2):
+            if time.monotonic() - self.last_used < self.keepalive:
+                continue
+
+            #skip the ping when an order is being sent
+            if not self.lock.acquire(blocking=False):
+                continue
+            try:
+                self._roundtrip("GET", self.ping_path)
+            except (OSError, http.client.HTTPException):
+                self._disconnect()
+            finally:
+                self.lock.release()
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+        with self.lock:
+            self._disconnect()
+
+    def _disconnect(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    #orders
+
+    def _send(self, method, path, params, tick_ns):
+        start = time.perf_counter_ns()
+
+        parts = [(key, value) for key, value in params.items() if value is not None]
+        clock = self.client.clock
+        if clock is not None:
+            if params.get("recvWindow") is None:
+                parts.append(("recvWindow", clock.recv_window()))
+            parts.append(("timestamp", clock.timestamp()))
+        else:
+            parts.append(("timestamp", int(time.time() * 1000)))
+        query = urlencode(parts)
+        built = time.perf_counter_ns()
+
+        mac = self.mac.copy()
+        mac.update(query.encode("utf-8"))
+        body = f"{query}&signature={mac.hexdigest()}"
+        signed = time.perf_counter_ns()
+
+        sent = None
+
+        with self.lock:
+            for attempt in range(2):
+                try:
+                    if self.connection is None:
+                        self._connect()
+
+                    self.connection.request(method, path, body=body, headers=self.headers)
+                    sent = time.perf_counter_ns()
+                    response = self.connection.getresponse()
+                    answered = time.perf_counter_ns()
+                    text = response.read().decode("utf-8")
+                    break
+                except (http.client.RemoteDisconnected, http.client.CannotSendRequest, ConnectionError, BrokenPipeError):
+                    #an order is only resent when the request never left on the stale connection
+                    self._disconnect()
+                    if attempt == 1 or sent is not None:
+                        raise RequestException("Connection lost while sending order")
+                except BaseException:
+                    #timeouts, a half read response or ctrl-c leave the connection in an unknown state
+                    self._disconnect()
+                    raise
+
+            self.last_used = time.monotonic()
+
+        result = FastResponse(response.status, text, dict(response.getheaders()))
+        done = time.perf_counter_ns()
+
+        timing = {
+            "build": built - start,
+            "sign": signed - built,
+            "send": sent - signed,
+            "wait": answered - sent,
+            "read": done - answered,
+            "total": done - start
+        }
+        if tick_ns is not None:
+            timing["tick_to_send"] = sent - tick_ns
+
+        for stage, value in timing.items():
+            self.timings[stage].append(value)
+        self.last_timing = timing
+
+        if not 200 <= result.status_code < 300:
+            raise APIException(result)
+        try:
+            return result.json()
+        except ValueError:
+            raise RequestException(f"Invalid Response: {result.text}")
+
+    def create_order(self, tick_ns=None, **params):
+        """Same params and response as Client.create_order
+        :params: tick_ns -> time.perf_counter_ns() of the tick the order reacts to, to time tick to send
+        """
+        params = self.client._validate_order(params)
+        return self._send("POST", self.order_path, params, tick_ns)
+
+    def create_test_order(self, tick_ns=None, **params):
+        params = self.client._validate_order(params)
+        return self._send("POST", self.order_path + "/test", params, tick_ns)
+
+    def cancel_order(self, tick_ns=None, **params):
+        #DELETE takes the params in the body as well
+        return self._send("DELETE", self.order_path, params, tick_ns)
+
+    def stats(self):
+        """Timing per stage in microseconds
+        :returns: dict -> {stage: dict -> {"count": int, "p50": float, "p90": float, "p99": float, "max": float}}
+        """
+        result = {}
+
+        for stage, values in self.timings.items():
+            if len(values) == 0:
+                continue
+
+            ordered = sorted(values)
+            count = len(ordered)
+            result[stage] = {
+                "count": count,
+                "p50": ordered[count // 2] / 1000,
+                "p90": ordered[min(count - 1, count * 9 // 10)] / 1000,
+                "p99": ordered[min(count - 1, count * 99 // 100)] / 1000,
+                "max": ordered[-1] / 1000
+            }
+
+        return result
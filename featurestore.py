@@ -0,0 +1,211 @@
+import numpy as np
+import json
+import os
+
+FEATURE_COLUMNS = ["OpenPrice", "HighPrice", "LowPrice", "ClosePrice", "Volume", "NumberTrades"]
+DATA_FILE = "features.f32"
+
+class FeatureStore:
+    """Scaled multi timeframe feature matrix that grows with new candles.
+
+    Row i holds the base interval candle i followed by, for every other interval, the
+    last candle that closed at or before it (same alignment as pd.merge_asof). Column 0
+    is the CloseTime slot of the old merged frame; it stays 0 so the ever growing times
+    never move the scaler bounds, the real times are kept unscaled in closetime.i64.
+    Values are min/max scaled into float32 and appended to the data file; the scaler
+    bounds and per interval alignment positions are kept in meta.json so an update only
+    touches the new candles. When new values fall outside the stored bounds the rows are
+    remapped into a new data file, which meta.json only points to once it is complete.
+    """
+
+    def __init__(self, path, names, columns=FEATURE_COLUMNS, chunk_rows=1 << 18):
+        self.path = path
+        self.names = list(names)
+        self.columns = list(columns)
+        self.chunk_rows = chunk_rows
+        self.width = 1 + len(self.columns) * len(self.names)
+
+        self.meta_path = os.path.join(path, "meta.json")
+        self.time_path = os.path.join(path, "closetime.i64")
+
+        if not os.path.exists(path):
+            os.makedirs(path)
+
+        if os.path.isfile(self.meta_path):
+            with open(self.meta_path, "r") as fh:
+                self.meta = json.load(fh)
+
+            if self.meta["names"] != self.names or self.meta["columns"] != self.columns:
+                raise ValueError(f"{path} was built for other intervals or columns")
+        else:
+            self.meta = {
+                "names": self.names,
+                "columns": self.columns,
+                "rows": 0,
+                "version": 0,
+                "min": None,
+                "max": None,
+                "align": {name: 0 for name in self.names[1:]}
+            }
+
+    @property
+    def data_path(self):
+        return os.path.join(self.path, self.meta.get("data", DATA_FILE))
+
+    def __len__(self):
+        return self.meta["rows"]
+
+    @property
+    def version(self):
+        #changes whenever rows are added or the scaling changes
+        return self.meta["version"]
+
+    def matrix(self, mode="r"):
+        #memory mapped (rows, width) float32 view of the scaled features
+        if self.meta["rows"] == 0:
+            return np.empty((0, self.width), dtype=np.float32)
+
+        return np.memmap(self.data_path, dtype=np.float32, mode=mode, shape=(self.meta["rows"], self.width))
+
+    def closeTimes(self):
+        if self.meta["rows"] == 0:
+            return np.empty(0, dtype=np.int64)
+
+        return np.memmap(self.time_path, dtype=np.int64, mode="r", shape=(self.meta["rows"],))
+
+    def update(self, frames):
+        """Append the candles that are not in the store yet
+        :params: frames -> dict -> {interval name: DataFrame with CloseTime and the feature columns}
+            the frames are the complete candle files in CloseTime order, the first name is the base interval
+        :returns: int -> amount of rows appended
+        """
+        base = self._toArray(frames[self.names[0]])
+
+        if self.meta["rows"] > 0:
+            last_close = int(self.closeTimes()[-1])
+            base = base[base[:, 0] > last_close]
+
+        if len(base) == 0:
+            return 0
+
+        close = base[:, 0]
+        raw = np.full((len(base), self.width), np.nan)
+        raw[:, :1 + len(self.columns)] = base
+        raw[:, 0] = 0.0
+
+        for n, name in enumerate(self.names[1:]):
+            other = self._toArray(frames[name])
+            start = self.meta["align"][name]
+
+            #last candle of this interval closed at or before each new base candle
+            pos = start + np.searchsorted(other[start:, 0], close, side="right") - 1
+            valid = pos >= 0
+
+            col = 1 + len(self.columns) * (n + 1)
+            raw[valid, col:col + len(self.columns)] = other[pos[valid], 1:]
+
+            self.meta["align"][name] = int(max(pos[-1], 0))
+
+        self._fit(raw)
+
+        scaled = self._scale(raw)
+        rows = self.meta["rows"]
+
+        #drop anything a crashed update left behind before appending
+        self._append(self.data_path, scaled, rows * self.width * 4)
+        self._append(self.time_path, close.astype(np.int64), rows * 8)
+
+        self.meta["rows"] = rows + len(scaled)
+        self.meta["version"] += 1
+        self._storeMeta()
+
+        return len(scaled)
+
+    def _toArray(self, frame):
+        if hasattr(frame, "loc"):
+            frame = frame[["CloseTime"] + self.columns].to_numpy()
+
+        return np.asarray(frame, dtype=np.float64)
+
+    def _range(self, low, high):
+        #same as MinMaxScaler, a constant column gets a range of 1
+        rng = high - low
+        return np.where(rng == 0, 1.0, rng)
+
+    def _fit(self, raw):
+        #nan (not yet aligned) values are ignored, just like MinMaxScaler does
+        new_min = np.where(np.isnan(raw), np.inf, raw).min(axis=0)
+        new_max = np.where(np.isnan(raw), -np.inf, raw).max(axis=0)
+
+        #a column without any value yet keeps +-inf bounds until its first real values arrive
+        if self.meta["min"] is None:
+            self.meta["min"] = new_min.tolist()
+            self.meta["max"] = new_max.tolist()
+            return
+
+        old_min = np.array(self.meta["min"])
+        old_max = np.array(self.meta["max"])
+        low = np.minimum(old_min, new_min)
+        high = np.maximum(old_max, new_max)
+
+        if (low == old_min).all() and (high == old_max).all():
+            return
+
+        #refit: x_raw = x * old_range + old_min, so the stored rows only need x * a + b
+        with np.errstate(invalid="ignore"):
+            a = (self._range(old_min, old_max) / self._range(low, high)).astype(np.float32)
+            b = ((old_min - low) / self._range(low, high)).astype(np.float32)
+
+        #the remapped rows go to a new file, a crash before the meta points to it leaves the old file and bounds intact
+        old_path = self.data_path
+        if self.meta["rows"] > 0:
+            name = f"features.{self.meta['version'] + 1}.f32"
+            data = self.matrix()
+            remapped = np.memmap(os.path.join(self.path, name), dtype=np.float32, mode="w+", shape=data.shape)
+            for start in range(0, len(data), self.chunk_rows):
+                chunk = remapped[start:start + self.chunk_rows]
+                np.multiply(data[start:start + self.chunk_rows], a, out=chunk)
+                chunk += b
+            remapped.flush()
+            del data, remapped
+            self.meta["data"] = name
+
+        self.meta["min"] = low.tolist()
+        self.meta["max"] = high.tolist()
+        self.meta["version"] += 1
+        self._storeMeta()
+
+        if self.data_path != old_path:
+            self._removeStale()
+
+    def _scale(self, raw):
+        low = np.array(self.meta["min"])
+        high = np.array(self.meta["max"])
+        return ((raw - low) / self._range(low, high)).astype(np.float32)
+
+    def _append(self, path, arr, size):
+        mode = "r+b" if os.path.isfile(path) else "wb"
+
+        with open(path, mode) as fh:
+            fh.truncate(size)
+            fh.seek(size)
+            fh.write(np.ascontiguousarray(arr).tobytes())
+            fh.flush()
+            os.fsync(fh.fileno())
+
+    def _removeStale(self):
+        #data files the meta no longer points to, one that is still mapped elsewhere is left for a later refit
+        for name in os.listdir(self.path):
+            if name.startswith("features.") and name.endswith(".f32") and os.path.join(self.path, name) != self.data_path:
+                try:
+                    os.remove(os.path.join(self.path, name))
+                except OSError:
+                    pass
+
+    def _storeMeta(self):
+        temp_path = f"{self.meta_path}.tmp"
+
+        with open(temp_path, "w") as fh:
+            json.dump(self.meta, fh)
+
+        os.replace(temp_path, self.meta_path)
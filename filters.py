@@ -0,0 +1,178 @@
+import time
+from decimal import Decimal, ROUND_DOWN, ROUND_HALF_UP, ROUND_UP
+
+from binance.exceptions import OrderUnknownSymbolException, OrderInactiveSymbolException, OrderMinPriceException, OrderMaxPriceException, OrderMinAmountException, OrderMaxAmountException, OrderMinTotalException, OrderPercentPriceException
+
+# Symbol filters of exchangeInfo, checked locally before an order is sent.
+#
+# A filter value of 0 means the filter is disabled (as on Binance). Prices are rounded to the
+# tick against the order, down for a BUY and up for a SELL, so an order never pays more or
+# gets less than was meant. Quantities are rounded down to the step so an order never asks
+# for more than was meant. Everything is Decimal so "0.1" stays 0.1 and no float rounding ends up in the
+# request.
+
+PRICE_KEYS = ("price", "stopPrice", "stopLimitPrice")
+QUANTITY_KEYS = ("quantity", "icebergQty", "limitIcebergQty", "stopIcebergQty")
+MARKET_TYPES = ("MARKET", "STOP_LOSS", "TAKE_PROFIT")
+
+def _decimal(value):
+    if isinstance(value, Decimal):
+        return value
+    return Decimal(str(value))
+
+def _round(value, step, rounding):
+    if not step:
+        return value
+    return (value / step).to_integral_value(rounding) * step
+
+def _format(value):
+    return format(value.normalize(), "f")
+
+class SymbolFilters:
+
+    def __init__(self, info):
+        self.symbol = info["symbol"]
+        self.status = info["status"]
+        self.base_asset = info.get("baseAsset")
+        self.quote_asset = info.get("quoteAsset")
+
+        self.min_price = self.max_price = self.tick_size = Decimal(0)
+        self.min_qty = self.max_qty = self.step_size = Decimal(0)
+        self.market_min_qty = self.market_max_qty = self.market_step_size = None
+        self.min_notional = Decimal(0)
+        self.notional_market = True
+        self.multiplier_up = self.multiplier_down = None
+
+        #average price for PERCENT_PRICE and market order notional, see update_price
+        self.avg_price = None
+        self.avg_price_time = None
+
+        for item in info.get("filters", []):
+            filter_type = item["filterType"]
+
+            if filter_type == "PRICE_FILTER":
+                self.min_price = _decimal(item["minPrice"])
+                self.max_price = _decimal(item["maxPrice"])
+                self.tick_size = _decimal(item["tickSize"])
+            elif filter_type == "LOT_SIZE":
+                self.min_qty = _decimal(item["minQty"])
+                self.max_qty = _decimal(item["maxQty"])
+                self.step_size = _decimal(item["stepSize"])
+            elif filter_type == "MARKET_LOT_SIZE":
+                self.market_min_qty = _decimal(item["minQty"])
+                self.market_max_qty = _decimal(item["maxQty"])
+                self.market_step_size = _decimal(item["stepSize"])
+            elif filter_type in ("MIN_NOTIONAL", "NOTIONAL"):
+                self.min_notional = _decimal(item["minNotional"])
+                self.notional_market = item.get("applyToMarket", item.get("applyMinToMarket", True))
+            elif filter_type == "PERCENT_PRICE":
+                self.multiplier_up = _decimal(item["multiplierUp"])
+                self.multiplier_down = _decimal(item["multiplierDown"])
+
+    def update_price(self, price):
+        self.avg_price = None if price is None else _decimal(price)
+        self.avg_price_time = time.monotonic()
+
+    def needs_price(self, params, max_age):
+        #True when params are checked against the average price and it is missing or older than max_age seconds
+        if self.avg_price_time is not None and time.monotonic() - self.avg_price_time < max_age:
+            return False
+
+        if self.multiplier_up is not None and any(params.get(key) is not None for key in PRICE_KEYS):
+            return True
+
+        return params.get("type") in MARKET_TYPES and bool(self.min_notional) and self.notional_market and params.get("stopPrice") is None
+
+    def price(self, value, side=None):
+        """Round value to the tick size and check PRICE_FILTER and PERCENT_PRICE
+        :params: side -> "BUY" rounds down, "SELL" rounds up, None to the nearest tick
+        :returns: Decimal
+        """
+        rounding = ROUND_DOWN if side == "BUY" else ROUND_UP if side == "SELL" else ROUND_HALF_UP
+        value = _round(_decimal(value), self.tick_size, rounding)
+
+        if self.min_price and value < self.min_price:
+            raise OrderMinPriceException(_format(self.min_price))
+        if self.max_price and value > self.max_price:
+            raise OrderMaxPriceException(_format(self.max_price))
+
+        if self.avg_price and self.multiplier_up is not None:
+            low = self.avg_price * self.multiplier_down
+            high = self.avg_price * self.multiplier_up
+            if value < low or value > high:
+                raise OrderPercentPriceException(_format(low), _format(high))
+
+        return value
+
+    def quantity(self, value, market=False):
+        """Round value down to the step size and check LOT_SIZE (MARKET_LOT_SIZE for market orders)
+        :returns: Decimal
+        """
+        if market and self.market_step_size:
+            step, low, high = self.market_step_size, self.market_min_qty, self.market_max_qty
+        else:
+            step, low, high = self.step_size, self.min_qty, self.max_qty
+
+        value = _round(_decimal(value), step, ROUND_DOWN)
+
+        if value <= 0 or low and value < low:
+            raise OrderMinAmountException(_format(low if low else step))
+        if high and value > high:
+            raise OrderMaxAmountException(_format(high))
+
+        return value
+
+    def notional(self, price, quantity):
+        if self.min_notional and price is not None and price * quantity < self.min_notional:
+            raise OrderMinTotalException(_format(self.min_notional))
+
+    def normalize(self, params):
+        """Check an order against the filters
+        :params: dict -> params of create_order, create_test_order or create_oco_order
+        :returns: dict -> copy of params with price and quantity fields rounded and formatted as str
+        """
+        if self.status != "TRADING":
+            raise OrderInactiveSymbolException(self.symbol)
+
+        params = dict(params)
+        market = params.get("type") in MARKET_TYPES
+        prices = {}
+
+        for key in PRICE_KEYS:
+            if params.get(key) is not None:
+                prices[key] = self.price(params[key], params.get("side"))
+                params[key] = _format(prices[key])
+
+        quantity = None
+        for key in QUANTITY_KEYS:
+            if params.get(key) is not None:
+                value = self.quantity(params[key], market and key == "quantity")
+                params[key] = _format(value)
+                if key == "quantity":
+                    quantity = value
+
+        if quantity is not None:
+            if market:
+                #a market order is filled around the average price, a stop market around its stop price
+                reference = prices.get("stopPrice", self.avg_price)
+                if self.notional_market:
+                    self.notional(reference, quantity)
+            else:
+                for key in ("price", "stopLimitPrice"):
+                    self.notional(prices.get(key), quantity)
+
+        return params
+
+def compile_filters(exchange_info):
+    """SymbolFilters for every symbol of an exchangeInfo response
+    :returns: dict -> {symbol: SymbolFilters}
+    """
+    return {info["symbol"]: SymbolFilters(info) for info in exchange_info["symbols"]}
+
+def normalize_order(symbol_filters, params):
+    filters = symbol_filters.get(params.get("symbol"))
+
+    if filters is None:
+        raise OrderUnknownSymbolException(params.get("symbol"))
+
+    return filters.normalize(params)
@@ -0,0 +1,108 @@
+import numpy as np
+import hashlib
+import weakref
+from collections import OrderedDict
+
+# counters a trader ends an evaluation run with, restoring them is the same as re-running it
+RESULT_FIELDS = [
+    "bought", "bought_value", "profit", "lastProfit", "lastCounter",
+    "counter", "counterHolding", "countBuy", "countSell", "countHold",
+    "tradesProfit", "tradesLoss", "tradesCounter", "fitness"
+]
+
+class FitnessCache:
+    """Evaluation results keyed by brain content and dataset version.
+
+    The key is a blake2b hash over the hidden nodes, the weights and the biases of a brain.
+    A layer with a pending sparse delta is keyed on the digest of the parent matrix the
+    delta applies to plus the delta itself (sorted flat indices and values), so a mutated
+    child costs a hash over its few changed elements instead of a dense copy of every
+    matrix. Weight matrices are never written in place (clones share them copy on write),
+    so the digest of a dense matrix is computed once and remembered for as long as it is
+    alive. The elite, carried into the next generation unmutated, and clones whose mutation
+    came out empty hash to a stored key and are not evaluated again.
+    """
+
+    def __init__(self, max_entries=100000):
+        self.max_entries = max_entries
+        self.results = OrderedDict()
+        self.digests = {}       #id(arr) -> (weakref, digest) of dense matrices
+
+        self.hits = 0
+        self.misses = 0
+        self.evaluated = 0
+        self.evaluation_seconds = 0.0
+
+    def _digest(self, arr, delta=None):
+        if delta is not None:
+            #parent digest plus the delta, its indices are kept sorted so equal deltas encode the same
+            h = hashlib.blake2b(self._digest(arr), digest_size=16)
+            h.update(np.ascontiguousarray(delta.index, dtype=np.int64).data)
+            h.update(np.ascontiguousarray(delta.values, dtype=np.float64).data)
+            return h.digest()
+
+        key = id(arr)
+        entry = self.digests.get(key)
+        if entry is not None and entry[0]() is arr:
+            return entry[1]
+
+        digest = hashlib.blake2b(np.ascontiguousarray(arr, dtype=np.float64).data, digest_size=16).digest()
+
+        try:
+            self.digests[key] = (weakref.ref(arr, lambda _, key=key: self.digests.pop(key, None)), digest)
+        except TypeError:
+            pass
+
+        return digest
+
+    def key(self, brain, version):
+        h = hashlib.blake2b(digest_size=16)
+        h.update(str(version).encode("utf-8"))
+        h.update(np.asarray(brain.hidden_nodes, dtype=np.int64).tobytes())
+
+        deltas = getattr(brain, "deltas", [None] * len(brain.weights))
+
+        for weights, delta, biases in zip(brain.weights, deltas, brain.biases):
+            h.update(self._digest(weights, delta))
+            h.update(b"|")
+            h.update(np.ascontiguousarray(biases).tobytes())
+
+        return h.digest()
+
+    def lookup(self, trader, version):
+        #on a hit the trader gets the stored result and True is returned
+        key = self.key(trader.brain, version)
+        result = self.results.get(key)
+
+        if result is None:
+            self.misses += 1
+            return False
+
+        self.hits += 1
+        self.results.move_to_end(key)
+
+        for field, value in zip(RESULT_FIELDS, result):
+            setattr(trader, field, value)
+
+        return True
+
+    def store(self, trader, version):
+        self.results[self.key(trader.brain, version)] = tuple(getattr(trader, field) for field in RESULT_FIELDS)
+
+        while len(self.results) > self.max_entries:
+            self.results.popitem(last=False)
+
+    def addEvaluationTime(self, traders, seconds):
+        self.evaluated += traders
+        self.evaluation_seconds += seconds
+
+    def stats(self):
+        per_trader = self.evaluation_seconds / self.evaluated if self.evaluated > 0 else 0.0
+
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self.results),
+            "seconds_per_evaluation": per_trader,
+            "seconds_saved": per_trader * self.hits
+        }
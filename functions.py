@@ -8,6 +8,9 @@ from talib import MA_Type
 import talib as tb
 
 from .exceptions import UnknownMATypeException, UnknownSymbolException
+from .helpers import interval_to_milliseconds
+
+COL_CANDLE = ["OpenTime","OpenPrice","HighPrice","LowPrice","ClosePrice","CloseTime","Volume","NumberTrades"]
 
 def update():
     print("Test")
@@ -85,12 +88,16 @@ def get_all_asset_balance(Client, n=0):
     
     return temp_dic
 
+def candleRow(candle):
+    #kline as returned by get_candles into a row of the candle store
+    return [int(candle[0]), float(candle[1]), float(candle[2]), float(candle[3]), float(candle[4]), int(candle[6]), float(candle[5]), int(candle[8])]
+
 def updateCandle(Client, symbol, interval):
         
         #check excistence of the folders and create structure if not already there
         filename = f"{Client.MAIN_PATH}/data/candles/{interval}"
         lastTime = 0
-        colCandle = ["OpenTime","OpenPrice","HighPrice","LowPrice","ClosePrice","CloseTime","Volume","NumberTrades"]
+        colCandle = COL_CANDLE
         
         if not os.path.exists(filename):
             os.makedirs(filename)
@@ -109,21 +116,138 @@ def updateCandle(Client, symbol, interval):
         lst = []
 
         for candle in Client.get_historical_candles_generator(symbol, lastTime, interval):
-            lst.append([int(candle[0]), float(candle[1]), float(candle[2]), float(candle[3]), float(candle[4]), int(candle[6]), float(candle[5]), int(candle[8])])
+            lst.append(candleRow(candle))
 
         df = df.append(pd.DataFrame(lst, columns=colCandle), ignore_index=True)
 
         feather.write_feather(df, filename)
 
 
-def updateAllCandles(Client, symbols, interval):
+def appendCandles(Client, symbol, interval, rows):
+    """Add closed candles to the stored series, rows at or before its last OpenTime are skipped
+    :params: rows -> lst -> rows as made by candleRow
+    :returns: int -> amount of candles added
+    """
+    filename = f"{Client.MAIN_PATH}/data/candles/{interval}"
+    if not os.path.exists(filename):
+        os.makedirs(filename)
+    filename = f"{filename}/{symbol}.feather"
+
+    if os.path.isfile(filename):
+        df = feather.read_feather(filename)
+    else:
+        df = pd.DataFrame(columns=COL_CANDLE)
+
+    lastTime = int(df["OpenTime"].iloc[-1]) if not df.empty else -1
+    rows = [row for row in rows if row[0] > lastTime]
+    if len(rows) == 0:
+        return 0
+
+    new = pd.DataFrame(rows, columns=COL_CANDLE)
+    df = pd.concat([df, new], ignore_index=True) if not df.empty else new
+    feather.write_feather(df, filename)
+
+    return len(rows)
+
+def updateAllCandles(Client, symbols, interval, quote="BTC"):
     
-    symbols = [symbol for symbol in symbols if "BTC" in symbol]
+    symbols = [symbol for symbol in symbols if symbol[-len(quote):] == quote]
 
     for symbol in symbols:
         updateCandle(Client, symbol, interval)
         print(f"{symbol} Done")
 
+def checkCandles(Client, symbol, interval, df=None):
+    """Integrity of a stored candle series
+    :returns: dict -> {
+        "symbol": str,
+        "interval": str,
+        "rows": int,
+        "duplicates": int,      #rows with an OpenTime that is already in the series
+        "unordered": int,       #rows with an OpenTime before the row in front of them
+        "misaligned": int,      #rows not on the interval grid of the first row
+        "missing": int,         #candles missing between the first and the last row
+        "gaps": lst -> [(int -> first missing OpenTime, int -> OpenTime of the next stored candle)]
+    }
+    """
+    if df is None:
+        df = feather.read_feather(f"{Client.MAIN_PATH}/data/candles/{interval}/{symbol}.feather", columns=["OpenTime"])
+
+    times = df["OpenTime"].to_numpy(dtype=np.int64)
+    report = {"symbol": symbol, "interval": interval, "rows": len(times), "duplicates": 0, "unordered": 0, "misaligned": 0, "missing": 0, "gaps": []}
+
+    if len(times) < 2:
+        return report
+
+    report["unordered"] = int(np.count_nonzero(np.diff(times) < 0))
+
+    unique = np.unique(times)
+    report["duplicates"] = len(times) - len(unique)
+
+    #months differ in length, only order and duplicates can be checked for them
+    step = interval_to_milliseconds(interval)
+    if step is None or interval[-1] == "M":
+        return report
+
+    report["misaligned"] = int(np.count_nonzero((unique - unique[0]) % step))
+
+    diffs = np.diff(unique)
+    at = np.flatnonzero(diffs > step)
+    report["missing"] = int((diffs[at] // step - 1).sum())
+    report["gaps"] = [(int(unique[i] + step), int(unique[i + 1])) for i in at]
+
+    return report
+
+def checkAllCandles(Client, symbols, interval):
+    #one row per symbol, gaps are counted instead of listed
+    rows = []
+
+    for symbol in symbols:
+        filename = f"{Client.MAIN_PATH}/data/candles/{interval}/{symbol}.feather"
+        if not os.path.isfile(filename):
+            continue
+
+        report = checkCandles(Client, symbol, interval)
+        report["gaps"] = len(report["gaps"])
+        rows.append(report)
+
+    return pd.DataFrame(rows)
+
+def repairCandle(Client, symbol, interval, report=None):
+    """Fetch the missing candles of a stored series, drop duplicates and sort it
+    Gaps the exchange has no candles for (outages) stay, they are returned in the new report.
+    :returns: dict -> report of checkCandles after the repair with "fetched": int added
+    """
+    filename = f"{Client.MAIN_PATH}/data/candles/{interval}/{symbol}.feather"
+    df = feather.read_feather(filename)
+
+    if report is None:
+        report = checkCandles(Client, symbol, interval, df)
+
+    step = interval_to_milliseconds(interval)
+    lst = []
+
+    for start, stop in report["gaps"]:
+        params = {"symbol": symbol, "interval": interval, "limit": 1000, "startTime": start, "endTime": stop - 1}
+
+        while params["startTime"] < stop:
+            candles = Client.get_candles(**params)
+            if len(candles) == 0:
+                break
+
+            lst.extend(candleRow(candle) for candle in candles)
+            params["startTime"] = int(candles[-1][0]) + step
+
+    if len(lst) > 0 or report["duplicates"] > 0 or report["unordered"] > 0:
+        df = pd.concat([df, pd.DataFrame(lst, columns=COL_CANDLE)], ignore_index=True)
+        df = df.drop_duplicates(subset="OpenTime", keep="last").sort_values("OpenTime", kind="stable").reset_index(drop=True)
+        feather.write_feather(df, filename)
+
+    result = checkCandles(Client, symbol, interval, df)
+    result["fetched"] = len(lst)
+
+    return result
+
 def updateEMA(Client, symbol, emas, interval):
 
     First = True
@@ -192,9 +316,9 @@ def updateEMA(Client, symbol, emas, interval):
         else:
             print("file is empty")
 
-def updateAllEMA(Client, symbols, emas, interval):
+def updateAllEMA(Client, symbols, emas, interval, quote="BTC"):
 
-    symbols = [symbol for symbol in symbols if "BTC" in symbol]
+    symbols = [symbol for symbol in symbols if symbol[-len(quote):] == quote]
 
     length = len(symbols)
     cur_amount = 0
@@ -267,9 +391,9 @@ def updateMA(Client, symbol, mas, interval, ma_type):
         else:
             print("file is empty")
 
-def updateAllMA(Client, symbols, mas, interval, ma_type):
+def updateAllMA(Client, symbols, mas, interval, ma_type, quote="BTC"):
 
-    symbols = [symbol for symbol in symbols if "BTC" in symbol]
+    symbols = [symbol for symbol in symbols if symbol[-len(quote):] == quote]
 
     length = len(symbols)
     cur_amount = 0
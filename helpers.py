@@ -1,7 +1,5 @@
 
-import dateparser
-import pytz
-from datetime import datetime
+from datetime import datetime, timezone
 
 
 def date_to_milliseconds(date_str):
@@ -11,6 +9,10 @@ def date_to_milliseconds(date_str):
     :param date_str: date in readable format, i.e. "January 01, 2018", "11 hours ago UTC", "now UTC"
     :type date_str: str
     """
+    #dateparser is slow to import and only needed for readable dates
+    import dateparser
+    import pytz
+
     # get epoch value in UTC
     epoch = datetime.utcfromtimestamp(0).replace(tzinfo=pytz.utc)
     # parse our date string
@@ -42,4 +44,24 @@ def interval_to_milliseconds(interval):
     try:
         return int(interval[:-1]) * seconds_per_unit[interval[-1]] * 1000
     except (ValueError, KeyError):
-        return None
\ No newline at end of file
+        return None
+
+
+DAY_MS = 24 * 60 * 60 * 1000
+WEEK_OFFSET = 4 * DAY_MS            #weekly candles open on monday, the epoch was a thursday
+
+def nextClose(interval, now):
+    """First candle close of interval after now, which is the OpenTime of the next candle
+    :params: now -> ms
+    :returns: int -> ms
+    """
+    if interval[-1] == "M":
+        #months differ in length, the candles open on the first of every month
+        date = datetime.fromtimestamp(now / 1000, tz=timezone.utc)
+        months = date.year * 12 + date.month - 1 + int(interval[:-1])
+        return int(datetime(months // 12, months % 12 + 1, 1, tzinfo=timezone.utc).timestamp() * 1000)
+
+    step = interval_to_milliseconds(interval)
+    offset = WEEK_OFFSET if interval[-1] == "w" else 0
+
+    return (now - offset) // step * step + step + offset
@@ -0,0 +1,424 @@
+import json
+import os
+import sys
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+import pyarrow.feather as feather
+
+from .functions import COL_CANDLE, appendCandles, candleRow, updateCandle
+
+# Market data service: one process owns the candle store and the requests to Binance and
+# publishes every (symbol, interval) series in a shared memory ring, any number of processes
+# attach to the rings and read the candles without a copy.
+#
+# A ring is a header of int64 slots followed by 2 * capacity candle records. Candle k is
+# written at record k % capacity and again at k % capacity + capacity, so the last n
+# candles are always one contiguous slice and a reader gets them as a plain numpy view.
+# The last record is the open candle, it is rewritten in place until it closes.
+#
+# The sequence slot is a seqlock: the writer makes it odd before it touches the records and
+# even again afterwards. A reader takes the sequence, reads, and takes it again, when it
+# was odd or has changed the read overlapped a write and is repeated. Slots are aligned
+# 8 byte values, so every slot is read and written in one piece and the reader never
+# takes a lock the writer would have to wait for.
+#
+# The service has no websocket: open candles follow the prices of one all symbols ticker
+# call per poll, and right after a candle closes the closed candles of every due series are
+# fetched in one batch of concurrent klines calls. N readers cost one set of request weight.
+
+PREFIX = "binance"
+MAGIC = 0x424E4352
+CAPACITY = 5000
+
+HEADER_SLOTS = 8
+MAGIC_SLOT, CAPACITY_SLOT, SEQUENCE_SLOT, COUNT_SLOT, UPDATED_SLOT = range(5)
+
+CANDLE_DTYPE = np.dtype([
+    ("OpenTime", np.int64),
+    ("OpenPrice", np.float64),
+    ("HighPrice", np.float64),
+    ("LowPrice", np.float64),
+    ("ClosePrice", np.float64),
+    ("CloseTime", np.int64),
+    ("Volume", np.float64),
+    ("NumberTrades", np.int64)
+])
+
+def ringName(symbol, interval, prefix=PREFIX):
+    return f"{prefix}_{symbol}_{interval}"
+
+_created = set()           #rings made by this process, its resource tracker must keep them
+
+def _attach(name):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        #before python 3.13 the resource tracker unlinks an attached segment when the reader exits
+        memory = shared_memory.SharedMemory(name=name)
+        if os.name == "posix" and name not in _created:
+            resource_tracker.unregister(memory._name, "shared_memory")
+        return memory
+
+class CandleRing:
+    """Candles of one series in shared memory, made by the service with create and opened by readers with attach"""
+
+    def __init__(self, memory, owner=False):
+        self.memory = memory
+        self.owner = owner
+        self.header = np.ndarray((HEADER_SLOTS,), dtype=np.int64, buffer=memory.buf)
+        self.capacity = int(self.header[CAPACITY_SLOT])
+        self.records = np.ndarray((2 * self.capacity,), dtype=CANDLE_DTYPE, buffer=memory.buf, offset=HEADER_SLOTS * 8)
+
+    @classmethod
+    def create(cls, name, capacity=CAPACITY):
+        size = HEADER_SLOTS * 8 + 2 * capacity * CANDLE_DTYPE.itemsize
+
+        try:
+            memory = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            #left by a service that did not stop cleanly, attached readers keep working when it fits
+            memory = shared_memory.SharedMemory(name=name)
+            header = np.ndarray((HEADER_SLOTS,), dtype=np.int64, buffer=memory.buf)
+            if memory.size < size or header[MAGIC_SLOT] != MAGIC or header[CAPACITY_SLOT] != capacity:
+                del header
+                memory.close()
+                memory.unlink()
+                memory = shared_memory.SharedMemory(name=name, create=True, size=size)
+
+        header = np.ndarray((HEADER_SLOTS,), dtype=np.int64, buffer=memory.buf)
+        header[CAPACITY_SLOT] = capacity
+        header[MAGIC_SLOT] = MAGIC
+        del header
+        _created.add(name)
+
+        return cls(memory, owner=True)
+
+    @classmethod
+    def attach(cls, symbol, interval, prefix=PREFIX):
+        memory = _attach(ringName(symbol, interval, prefix))
+        if np.ndarray((1,), dtype=np.int64, buffer=memory.buf)[0] != MAGIC:
+            memory.close()
+            raise ValueError(f"{memory.name} is not a candle ring")
+
+        return cls(memory)
+
+    @property
+    def sequence(self):
+        return int(self.header[SEQUENCE_SLOT])
+
+    @property
+    def count(self):
+        #candles written since the ring was made, the ring keeps the last capacity of them
+        return int(self.header[COUNT_SLOT])
+
+    @property
+    def updated(self):
+        #ms timestamp of the last write
+        return int(self.header[UPDATED_SLOT])
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    #writer, only the service calls these
+
+    def _begin(self):
+        self.header[SEQUENCE_SLOT] += 1
+
+    def _end(self):
+        self.header[UPDATED_SLOT] = int(time.time() * 1000)
+        self.header[SEQUENCE_SLOT] += 1
+
+    def _put(self, index, record):
+        slot = index % self.capacity
+        self.records[slot] = record
+        self.records[slot + self.capacity] = record
+
+    def reset(self, records=None):
+        """Replace the contents by records, the last capacity of them are kept"""
+        self._begin()
+        self.header[COUNT_SLOT] = 0
+
+        if records is not None and len(records) > 0:
+            records = records[-self.capacity:]
+            self.records[:len(records)] = records
+            self.records[self.capacity:self.capacity + len(records)] = records
+            self.header[COUNT_SLOT] = len(records)
+
+        self._end()
+
+    def write(self, records):
+        """Add candles, a candle with the OpenTime of the last one replaces it and older ones are skipped
+        :returns: int -> amount of candles added
+        """
+        added = 0
+        self._begin()
+
+        for record in records:
+            count = int(self.header[COUNT_SLOT])
+            last_open = int(self.records[(count - 1) % self.capacity + self.capacity]["OpenTime"]) if count > 0 else None
+
+            if last_open is None or record[0] > last_open:
+                self._put(count, record)
+                self.header[COUNT_SLOT] = count + 1
+                added += 1
+            elif record[0] == last_open:
+                self._put(count - 1, record)
+
+        self._end()
+        return added
+
+    def tick(self, price, now):
+        #move the open candle to the latest trade price, a candle that has closed is left for the fetch
+        count = self.count
+        if count == 0:
+            return False
+
+        slots = [(count - 1) % self.capacity, (count - 1) % self.capacity + self.capacity]
+        if now > self.records["CloseTime"][slots[0]]:
+            return False
+
+        self._begin()
+        for slot in slots:
+            self.records["HighPrice"][slot] = max(self.records["HighPrice"][slot], price)
+            self.records["LowPrice"][slot] = min(self.records["LowPrice"][slot], price)
+            self.records["ClosePrice"][slot] = price
+        self._end()
+        return True
+
+    #reader
+
+    def view(self, n=None):
+        """Zero copy view of the last n candles, oldest first, the open candle last
+        Writes go on underneath a view, compare the sequence with ring.sequence after using it
+        to know it was not written meanwhile (or read with snapshot).
+        :returns: (int -> sequence, structured ndarray -> CANDLE_DTYPE)
+        """
+        sequence = self.sequence
+        count = self.count
+        n = min(count, self.capacity) if n is None else min(n, count, self.capacity)
+
+        if n == 0:
+            return sequence, self.records[:0]
+
+        end = (count - 1) % self.capacity + self.capacity + 1
+        return sequence, self.records[end - n:end]
+
+    def snapshot(self, n=None, timeout=1.0):
+        """Consistent copy of the last n candles
+        :returns: (int -> sequence, structured ndarray -> CANDLE_DTYPE)
+        """
+        deadline = time.monotonic() + timeout
+
+        while True:
+            sequence, records = self.view(n)
+            if sequence % 2 == 0:
+                records = records.copy()
+                if self.sequence == sequence:
+                    return sequence, records
+
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"{self.memory.name} kept changing for {timeout} seconds")
+            #give the writer the cpu to finish
+            time.sleep(0)
+
+    def last(self):
+        #consistent copy of the open candle, None while the ring is empty
+        _, records = self.snapshot(1)
+        return records[0] if len(records) > 0 else None
+
+    def wait(self, sequence, timeout=None, interval=0.001):
+        """Block until the ring changes after sequence
+        :returns: int -> new sequence, or sequence when timeout passed first
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while True:
+            current = self.sequence
+            if current != sequence and current % 2 == 0:
+                return current
+            if deadline is not None and time.monotonic() >= deadline:
+                return sequence
+            time.sleep(interval)
+
+    def close(self):
+        del self.records
+        del self.header
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+            _created.discard(self.memory.name)
+
+def listSeries(Client):
+    """Series published by the running service
+    :returns: dict -> manifest, {"prefix": str, "pid": int, "capacity": int, "series": [[symbol, interval]]}
+    """
+    with open(f"{Client.MAIN_PATH}/data/marketdata.json", "r") as f:
+        return json.load(f)
+
+def attachCandles(symbol, interval, prefix=PREFIX):
+    return CandleRing.attach(symbol, interval, prefix)
+
+class MarketDataService:
+    """Owner of the candle store that publishes candles and live bars in shared memory
+    :params: symbols, intervals -> every symbol is served in every interval
+             capacity -> candles kept per ring
+             poll -> seconds between updates of the open candles
+             delay -> ms after a close before the closed candle is fetched
+             persist -> catch up the stored series at start and append every closed candle to them
+    """
+
+    def __init__(self, Client, symbols, intervals, capacity=CAPACITY, poll=1.0, delay=500, prefix=PREFIX, persist=True, verbose=True):
+        self.Client = Client
+        self.series = [(symbol, interval) for symbol in symbols for interval in intervals]
+        self.capacity = capacity
+        self.poll = poll
+        self.delay = delay
+        self.prefix = prefix
+        self.persist = persist
+        self.verbose = verbose
+
+        self.rings = {}
+        self.stored = {}            #(symbol, interval) -> OpenTime of the last stored candle
+        self.manifest = f"{Client.MAIN_PATH}/data/marketdata.json"
+        self.running = False
+
+        self.polls = 0
+        self.requests = 0
+        self.fetch_ms = 0.0
+
+    def _now(self):
+        clock = getattr(self.Client, "clock", None)
+        return clock.timestamp() if clock is not None else int(time.time() * 1000)
+
+    def start(self):
+        """Catch up the stored series and publish them"""
+        for symbol, interval in self.series:
+            records = np.empty(0, dtype=CANDLE_DTYPE)
+            filename = f"{self.Client.MAIN_PATH}/data/candles/{interval}/{symbol}.feather"
+
+            if self.persist:
+                updateCandle(self.Client, symbol, interval)
+
+            if os.path.isfile(filename):
+                table = feather.read_table(filename, columns=COL_CANDLE)
+                rows = table.slice(max(0, table.num_rows - self.capacity))
+                records = np.empty(rows.num_rows, dtype=CANDLE_DTYPE)
+                for name in COL_CANDLE:
+                    records[name] = rows.column(name).to_numpy()
+
+            ring = CandleRing.create(ringName(symbol, interval, self.prefix), self.capacity)
+            ring.reset(records)
+            self.rings[(symbol, interval)] = ring
+            self.stored[(symbol, interval)] = int(records["OpenTime"][-1]) if len(records) > 0 else -1
+
+            if self.verbose:
+                print(f"{symbol} {interval}\tcandles: {len(ring)}")
+
+        os.makedirs(os.path.dirname(self.manifest), exist_ok=True)
+        tmp_path = self.manifest + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"prefix": self.prefix, "pid": os.getpid(), "capacity": self.capacity, "series": self.series}, f)
+        os.replace(tmp_path, self.manifest)
+
+        self.running = True
+
+    def due(self, now=None):
+        #series whose last candle has closed, or that have no candle yet
+        now = self._now() if now is None else now
+        result = []
+
+        for key, ring in self.rings.items():
+            _, records = ring.view(1)
+            if len(records) == 0 or now >= int(records[0]["CloseTime"]) + 1 + self.delay:
+                result.append(key)
+
+        return result
+
+    def fetch(self, keys):
+        """Closed and open candles of keys since their last candle, in one batch of concurrent calls"""
+        params_list = []
+        for symbol, interval in keys:
+            params = {"symbol": symbol, "interval": interval, "limit": 1000}
+            _, records = self.rings[(symbol, interval)].view(1)
+            if len(records) > 0:
+                params["startTime"] = int(records[0]["OpenTime"])
+            params_list.append(params)
+
+        start = time.perf_counter()
+        results = self.Client.map("get_candles", params_list)
+        self.fetch_ms += (time.perf_counter() - start) * 1000
+        self.requests += len(params_list)
+
+        now = self._now()
+        for key, candles in zip(keys, results):
+            rows = [candleRow(candle) for candle in candles]
+            self.rings[key].write([tuple(row) for row in rows])
+
+            if self.persist:
+                closed = [row for row in rows if row[5] < now and row[0] > self.stored[key]]
+                if closed:
+                    appendCandles(self.Client, key[0], key[1], closed)
+                    self.stored[key] = closed[-1][0]
+
+    def update(self):
+        """One poll: fetch the series that closed a candle and move the other open candles to the last prices"""
+        keys = self.due()
+        if keys:
+            self.fetch(keys)
+
+        prices = self.Client.get_all_tickers()
+        self.requests += 1
+        prices = {item["symbol"]: float(item["price"]) for item in prices}
+        now = self._now()
+
+        for (symbol, interval), ring in self.rings.items():
+            if symbol in prices:
+                ring.tick(prices[symbol], now)
+
+        self.polls += 1
+        return keys
+
+    def run(self):
+        """Serve until stop() or ctrl-c, the rings are removed at the end"""
+        if not self.running:
+            self.start()
+
+        try:
+            while self.running:
+                started = time.monotonic()
+                try:
+                    self.update()
+                except Exception as e:
+                    #a failed poll leaves the rings as they are, the next poll catches up
+                    if self.verbose:
+                        print(f"poll failed: {e}")
+                time.sleep(max(0.0, self.poll - (time.monotonic() - started)))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def stop(self):
+        self.running = False
+        for ring in self.rings.values():
+            ring.close()
+        self.rings = {}
+
+        if os.path.isfile(self.manifest):
+            os.remove(self.manifest)
+
+    def stats(self):
+        return {
+            "series": len(self.series),
+            "polls": self.polls,
+            "requests": self.requests,
+            "fetch_ms": self.fetch_ms
+        }
+
+if __name__ == "__main__":
+    #python -m binance.marketdata ETHBTC,LTCBTC 1m,1h
+    from .client import Client
+
+    MarketDataService(Client(), sys.argv[1].split(","), sys.argv[2].split(",")).run()
@@ -0,0 +1,207 @@
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+# Request instrumentation for Client.
+#
+# With Client.metrics set to a sink (any callable), every attempt of every request is
+# reported as one event dict:
+#
+#   method, path, status ("error" when no response came back), attempt (0 first, >0 retries),
+#   total    -> seconds from sending to the decoded result
+#   wait     -> seconds until the response headers arrived (DNS, connect, TLS and server time
+#               together, requests does not split them)
+#   transfer -> seconds reading the body
+#   decode   -> seconds decoding the JSON
+#   bytes_out, bytes_in, headers -> dict of the x-mbx-* headers (used weight, order count)
+#
+# With Client.metrics None (the default) _request does not time anything.
+
+STAGES = ("total", "wait", "transfer", "decode")
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def request_event(method, uri, response, attempt, start, received, end):
+    path = urlsplit(uri).path
+
+    if response is None:
+        return {
+            "method": method, "path": path, "status": "error", "attempt": attempt,
+            "total": end - start, "wait": end - start, "transfer": 0.0, "decode": 0.0,
+            "bytes_out": 0, "bytes_in": 0, "headers": {}
+        }
+
+    elapsed = getattr(response, "elapsed", None)
+    wait = elapsed.total_seconds() if elapsed is not None else received - start
+    wait = min(wait, received - start)
+
+    bytes_out = 0
+    request = getattr(response, "request", None)
+    if request is not None:
+        body = request.body or b""
+        bytes_out = len(request.url) + len(body)
+
+    headers = {key.lower(): value for key, value in response.headers.items() if key[:6].lower() == "x-mbx-"}
+
+    return {
+        "method": method,
+        "path": path,
+        "status": response.status_code,
+        "attempt": attempt,
+        "total": end - start,
+        "wait": wait,
+        "transfer": received - start - wait,
+        "decode": end - received,
+        "bytes_out": bytes_out,
+        "bytes_in": len(response.content),
+        "headers": headers
+    }
+
+class Histogram:
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        #upper bound of the bucket the quantile falls in
+        if self.count == 0:
+            return 0.0
+
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return self.buckets[i] if i < len(self.buckets) else float("inf")
+
+        return float("inf")
+
+class MetricsRegistry:
+    """In process sink, keeps histograms and counters per path"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+
+        self.histograms = {}                    #(path, stage) -> Histogram
+        self.responses = defaultdict(int)       #(path, method, status) -> count
+        self.retries = defaultdict(int)         #path -> count
+        self.bytes_in = defaultdict(int)
+        self.bytes_out = defaultdict(int)
+        self.headers = {}                       #x-mbx-* header -> last value
+
+    def __call__(self, event):
+        path = event["path"]
+
+        with self.lock:
+            for stage in STAGES:
+                histogram = self.histograms.get((path, stage))
+                if histogram is None:
+                    histogram = self.histograms[(path, stage)] = Histogram(self.buckets)
+                histogram.observe(event[stage])
+
+            self.responses[(path, event["method"], event["status"])] += 1
+            if event["attempt"] > 0:
+                self.retries[path] += 1
+            self.bytes_in[path] += event["bytes_in"]
+            self.bytes_out[path] += event["bytes_out"]
+            self.headers.update(event["headers"])
+
+    def snapshot(self):
+        """
+        :returns: dict -> {path: dict -> {"requests": int, "retries": int, "bytes_in": int, "bytes_out": int,
+                                           "status": dict -> {status: int}, stage: dict -> {"mean", "p50", "p99"}}}
+        """
+        result = {}
+
+        with self.lock:
+            for (path, method, status), count in self.responses.items():
+                item = result.setdefault(path, {"requests": 0, "retries": self.retries[path], "bytes_in": self.bytes_in[path], "bytes_out": self.bytes_out[path], "status": {}})
+                item["requests"] += count
+                item["status"][status] = item["status"].get(status, 0) + count
+
+            for (path, stage), histogram in self.histograms.items():
+                result[path][stage] = {
+                    "mean": histogram.sum / histogram.count,
+                    "p50": histogram.quantile(0.5),
+                    "p99": histogram.quantile(0.99)
+                }
+
+        return result
+
+    def prometheus(self):
+        """Registry in the Prometheus text format"""
+        lines = [
+            "# TYPE binance_request_seconds histogram",
+        ]
+
+        with self.lock:
+            for (path, stage), histogram in sorted(self.histograms.items()):
+                labels = f'path="{path}",stage="{stage}"'
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'binance_request_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'binance_request_seconds_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                lines.append(f"binance_request_seconds_sum{{{labels}}} {histogram.sum}")
+                lines.append(f"binance_request_seconds_count{{{labels}}} {histogram.count}")
+
+            lines.append("# TYPE binance_responses_total counter")
+            for (path, method, status), count in sorted(self.responses.items(), key=str):
+                lines.append(f'binance_responses_total{{path="{path}",method="{method}",status="{status}"}} {count}')
+
+            lines.append("# TYPE binance_retries_total counter")
+            for path, count in sorted(self.retries.items()):
+                lines.append(f'binance_retries_total{{path="{path}"}} {count}')
+
+            lines.append("# TYPE binance_bytes_total counter")
+            for direction, counter in (("in", self.bytes_in), ("out", self.bytes_out)):
+                for path, count in sorted(counter.items()):
+                    lines.append(f'binance_bytes_total{{path="{path}",direction="{direction}"}} {count}')
+
+            lines.append("# TYPE binance_header gauge")
+            for header, value in sorted(self.headers.items()):
+                lines.append(f'binance_header{{name="{header}"}} {value}')
+
+        return "\n".join(lines) + "\n"
+
+def serve_prometheus(registry, port=9108, host=""):
+    """Serve registry.prometheus() on http://host:port/metrics from a daemon thread
+    :returns: ThreadingHTTPServer, call shutdown() to stop it
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            body = registry.prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+class CallbackSink:
+    """Pass events on to several sinks, e.g. a MetricsRegistry and a logger"""
+
+    def __init__(self, *callbacks):
+        self.callbacks = list(callbacks)
+
+    def __call__(self, event):
+        for callback in self.callbacks:
+            callback(event)
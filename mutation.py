@@ -0,0 +1,69 @@
+import numpy as np
+
+class SparseDelta:
+    """Additive correction on a few elements of a matrix.
+
+    A mutated child keeps a reference to its parent's matrix and only stores the
+    changed positions (flat index) and the amount they changed by. The delta is
+    immutable, so children can share it and merge() always returns a new one.
+    """
+
+    __slots__ = ("shape", "index", "values", "rows", "cols")
+
+    def __init__(self, shape, index, values):
+        self.shape = tuple(shape)
+        self.index = index
+        self.values = values
+
+        if len(self.shape) == 2:
+            self.rows, self.cols = np.divmod(index, self.shape[1])
+        else:
+            self.rows, self.cols = index, None
+
+    @classmethod
+    def sample(cls, generator, shape, rate, scale):
+        #every element changes with probability rate, so the amount of changes is binomial
+        size = int(np.prod(shape, dtype=np.int64))
+        n = generator.binomial(size, rate)
+
+        index = np.sort(generator.choice(size, n, replace=False)).astype(np.int64)
+        values = generator.normal(0, scale, n)
+
+        return cls(shape, index, values)
+
+    @property
+    def nnz(self):
+        return len(self.index)
+
+    @property
+    def nbytes(self):
+        return self.index.nbytes + self.values.nbytes
+
+    def merge(self, other):
+        if other.nnz == 0:
+            return self
+        if self.nnz == 0:
+            return other
+
+        index, inverse = np.unique(np.concatenate((self.index, other.index)), return_inverse=True)
+        values = np.bincount(inverse, weights=np.concatenate((self.values, other.values)), minlength=len(index))
+
+        return SparseDelta(self.shape, index, values)
+
+    def apply(self, arr):
+        #new dense matrix with the delta folded in, arr itself is never written
+        out = np.array(arr, dtype=np.result_type(arr, self.values))
+        out.reshape(-1)[self.index] += self.values
+        return out
+
+    def matmul(self, x):
+        #(delta @ x) without building the dense delta, x is (cols,) or (cols, k)
+        contrib = self.values.reshape((-1,) + (1,) * (x.ndim - 1)) * x[self.cols]
+
+        if x.ndim == 1 or x.shape[1] == 1:
+            out = np.bincount(self.rows, weights=contrib.reshape(-1), minlength=self.shape[0])
+            return out.reshape((self.shape[0],) + x.shape[1:])
+
+        out = np.zeros((self.shape[0],) + x.shape[1:], dtype=contrib.dtype)
+        np.add.at(out, self.rows, contrib)
+        return out
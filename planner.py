@@ -0,0 +1,230 @@
+import json
+import os
+import threading
+import time
+
+import pyarrow.feather as feather
+
+from .helpers import DAY_MS, nextClose
+
+# Planner for candle syncs: works out which series can have new candles before any klines
+# request is made, instead of asking the exchange about every listed symbol.
+#
+# A series is skipped when its symbol
+#   status -> is not TRADING (HALT, BREAK, delisted), from exchangeInfo cached on disk
+#   quote  -> is not quoted in the wanted asset
+#   closed -> has no candle closed after the last stored one, from the sync metadata
+#   idle   -> had no trade since the last sync, from one all symbols 24hr ticker call
+#
+# The sync metadata of an interval is data/candles/{interval}/sync.json, the last stored
+# OpenTime and the last trade id per symbol, so a plan does not open the candle files. The
+# trade id is only kept when the candle that was still open at the sync had no trades, else
+# that candle closes with trades that an unchanged trade id would hide.
+#
+# Intervals without trades still get a candle on the exchange (volume 0). An idle series
+# skips them until it trades again, then they are fetched with the new ones.
+
+EXCHANGE_INFO_AGE = 3600
+
+def exchangeInfo(Client, max_age=EXCHANGE_INFO_AGE):
+    """exchangeInfo kept in data/exchangeinfo.json, downloaded again when it is older than max_age seconds"""
+    filename = f"{Client.MAIN_PATH}/data/exchangeinfo.json"
+
+    if os.path.isfile(filename) and time.time() - os.path.getmtime(filename) < max_age:
+        with open(filename, "r") as f:
+            return json.load(f)
+
+    info = Client.get_exchange_info()
+
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    tmp_path = filename + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(info, f)
+    os.replace(tmp_path, filename)
+
+    return info
+
+def tradingSymbols(Client, quote=None, max_age=EXCHANGE_INFO_AGE):
+    #symbols with status TRADING, only those quoted in quote when it is given
+    info = exchangeInfo(Client, max_age)
+
+    return sorted(item["symbol"] for item in info["symbols"] if item["status"] == "TRADING" and (quote is None or item["quoteAsset"] == quote))
+
+def storedLast(Client, symbol, interval):
+    #OpenTime of the last candle in the store, -1 when nothing is stored
+    filename = f"{Client.MAIN_PATH}/data/candles/{interval}/{symbol}.feather"
+    if not os.path.isfile(filename):
+        return -1
+
+    times = feather.read_table(filename, columns=["OpenTime"]).column("OpenTime")
+    return int(times[-1].as_py()) if len(times) > 0 else -1
+
+class SyncState:
+    """Last stored OpenTime and last trade id of every symbol of one interval"""
+
+    def __init__(self, Client, interval):
+        self.Client = Client
+        self.interval = interval
+        self.path = f"{Client.MAIN_PATH}/data/candles/{interval}/sync.json"
+        self.lock = threading.Lock()
+        self.entries = {}           #symbol -> {"last": OpenTime, "last_id": int, "synced": ms}
+
+        if os.path.isfile(self.path):
+            with open(self.path, "r") as f:
+                self.entries = json.load(f)
+
+    def last(self, symbol):
+        """OpenTime of the last stored candle, -1 when nothing is stored"""
+        entry = self.entries.get(symbol)
+        if entry is not None:
+            return entry["last"]
+
+        #series stored before there was sync metadata, read once
+        last = storedLast(self.Client, symbol, self.interval)
+        if last >= 0:
+            self.entries[symbol] = {"last": last, "last_id": None, "synced": None}
+
+        return last
+
+    def last_id(self, symbol):
+        entry = self.entries.get(symbol)
+        return entry["last_id"] if entry is not None else None
+
+    def set(self, symbol, last, last_id):
+        with self.lock:
+            self.entries[symbol] = {"last": last, "last_id": last_id, "synced": int(time.time() * 1000)}
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+
+        with self.lock:
+            with open(tmp_path, "w") as f:
+                json.dump(self.entries, f)
+        os.replace(tmp_path, self.path)
+
+def planUpdates(Client, intervals, quote="BTC", symbols=None, skip_idle=True, now=None, max_age=EXCHANGE_INFO_AGE):
+    """Series of intervals that can have new candles
+    :params: symbols -> lst, limit the plan to these symbols, None for every listed symbol
+             skip_idle -> skip symbols without a trade since their last sync
+    :returns: dict -> {
+        "series": lst -> [(symbol, interval)],
+        "skipped": dict -> {"status": int, "quote": int, "closed": int, "idle": int},
+        "last_ids": dict -> {symbol: int},      #last trade id of the 24hr ticker
+        "states": dict -> {interval: SyncState}
+    }
+    """
+    now = int(time.time() * 1000) if now is None else now
+    info = exchangeInfo(Client, max_age)
+    listed = {item["symbol"]: item for item in info["symbols"]}
+
+    if symbols is None:
+        symbols = sorted(listed)
+
+    skipped = {"status": 0, "quote": 0, "closed": 0, "idle": 0}
+    candidates = []
+
+    for symbol in symbols:
+        item = listed.get(symbol)
+        if item is None or item["status"] != "TRADING":
+            skipped["status"] += len(intervals)
+        elif quote is not None and item["quoteAsset"] != quote:
+            skipped["quote"] += len(intervals)
+        else:
+            candidates.append(symbol)
+
+    #one call for the activity of every symbol
+    tickers = {item["symbol"]: item for item in Client.get_ticker()}
+    last_ids = {symbol: tickers[symbol]["lastId"] for symbol in candidates if symbol in tickers}
+
+    states = {interval: SyncState(Client, interval) for interval in intervals}
+    series = []
+
+    for interval in intervals:
+        state = states[interval]
+
+        for symbol in candidates:
+            last = state.last(symbol)
+
+            if last >= 0 and nextClose(interval, nextClose(interval, last)) > now:
+                #the candle after the last stored one is still open
+                skipped["closed"] += 1
+            elif skip_idle and last >= 0 and (symbol not in tickers or state.last_id(symbol) == last_ids.get(symbol) or tickers[symbol]["count"] == 0 and nextClose(interval, last) >= now - DAY_MS):
+                #no trade since a sync that left no traded candle behind, or none in the 24hr window of the unstored candles
+                skipped["idle"] += 1
+            else:
+                series.append((symbol, interval))
+
+    return {"series": series, "skipped": skipped, "last_ids": last_ids, "states": states}
+
+def syncSeries(Client, symbol, interval, last, now=None):
+    """Store the closed candles after last
+    :returns: (int -> OpenTime of the last stored candle, bool -> True when the candle still open had no trades)
+    """
+    #functions pulls in talib, only needed once a series is actually synced
+    from .functions import appendCandles, candleRow, updateCandle
+
+    if last < 0:
+        #nothing stored yet, the full history
+        updateCandle(Client, symbol, interval)
+        return storedLast(Client, symbol, interval), False
+
+    while True:
+        now = int(time.time() * 1000) if now is None else now
+        candles = Client.get_candles(symbol=symbol, interval=interval, startTime=last + 1, limit=1000)
+        rows = [candleRow(candle) for candle in candles if candle[6] < now]
+        quiet = all(candle[8] == 0 for candle in candles if candle[6] >= now)
+
+        if len(rows) == 0:
+            return last, quiet
+
+        appendCandles(Client, symbol, interval, rows)
+        last = rows[-1][0]
+
+        if len(candles) < 1000:
+            return last, quiet
+
+def runPlan(Client, plan, workers=None, verbose=True):
+    """Sync the series of a plan on the Client thread pool and save the sync metadata
+    A series that fails keeps its old metadata and is planned again next time, the others are saved.
+    :returns: dict -> {"synced": int, "failed": int}
+    """
+    states = plan["states"]
+    last_ids = plan["last_ids"]
+
+    def sync(symbol, interval):
+        state = states[interval]
+        try:
+            last, quiet = syncSeries(Client, symbol, interval, state.last(symbol))
+        except Exception as e:
+            if verbose:
+                print(f"sync of {symbol} {interval} failed: {e}")
+            return False
+
+        state.set(symbol, last, last_ids.get(symbol) if quiet else None)
+        return True
+
+    try:
+        results = Client.map(sync, [{"symbol": symbol, "interval": interval} for symbol, interval in plan["series"]], workers)
+    finally:
+        for state in states.values():
+            state.save()
+
+    synced = sum(results)
+    return {"synced": synced, "failed": len(results) - synced}
+
+def syncCandles(Client, intervals, quote="BTC", symbols=None, skip_idle=True, verbose=True):
+    """Plan and run one sync cycle
+    :returns: dict -> {"series": int, "synced": int, "failed": int, "skipped": dict -> {reason: int}}
+    """
+    plan = planUpdates(Client, intervals, quote, symbols, skip_idle)
+    result = runPlan(Client, plan, verbose=verbose)
+    synced = result["synced"]
+
+    total = len(plan["series"]) + sum(plan["skipped"].values())
+    summary = {"series": total, "synced": synced, "failed": result["failed"], "skipped": plan["skipped"]}
+
+    if verbose:
+        print(f"synced {synced}/{total} series, {result['failed']} failed, skipped {plan['skipped']}")
+
+    return summary
@@ -0,0 +1,142 @@
+import random
+import threading
+import time
+
+import requests
+
+from binance.exceptions import APIException
+
+# Retries for Client requests.
+#
+# Only requests that can safely be sent twice are retried: GETs, order tests and the user
+# data stream calls. A new order is retried only when it carries a client generated id
+# (newClientOrderId, listClientOrderId for OCO), and before resending the exchange is asked
+# whether the first attempt made it after all, so an order is never placed twice.
+#
+# 429 (rate limit) and 418 (IP ban) hold every Client in the process for Retry-After
+# seconds: the limits are per IP, so one client hitting them means all of them would.
+
+RETRY_STATUSES = (500, 502, 503, 504)
+UNKNOWN_ORDER = -2013
+TIMESTAMP_OUTSIDE_RECV_WINDOW = -1021
+
+_pause_until = 0.0
+_pause_lock = threading.Lock()
+
+def pause(seconds):
+    """Hold all requests that go through a RetryPolicy for seconds"""
+    global _pause_until
+
+    with _pause_lock:
+        _pause_until = max(_pause_until, time.monotonic() + seconds)
+
+def paused():
+    #seconds left of the global pause
+    return max(0.0, _pause_until - time.monotonic())
+
+class RetryPolicy:
+    """Jittered exponential backoff for Client requests
+    :params: max_retries -> retries after the first attempt
+             backoff -> seconds of the first backoff, doubled every retry up to max_backoff
+             retry_after -> seconds to pause on 429/418 without a Retry-After header
+    """
+
+    def __init__(self, max_retries=5, backoff=0.5, max_backoff=60, retry_after=60, retry_statuses=RETRY_STATUSES, sleep=time.sleep):
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.retry_after = retry_after
+        self.retry_statuses = retry_statuses
+        self.sleep = sleep
+
+        self.retries = 0
+        self.recovered_orders = 0
+
+    def delay(self, attempt):
+        #full jitter, retries of many threads do not line up again
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def _order_id(self, method, uri, data):
+        #(path, client id) of a new order, None when the request is not an order
+        if method != "post" or not data:
+            return None
+
+        if uri.endswith("/order"):
+            return "order", data.get("newClientOrderId")
+        if uri.endswith("/order/oco"):
+            return "orderList", data.get("listClientOrderId")
+
+        return None
+
+    def retryable(self, method, uri, data):
+        if method == "get" or uri.endswith("/order/test") or uri.endswith("/userDataStream"):
+            return True
+
+        order = self._order_id(method, uri, data)
+        return order is not None and order[1] is not None
+
+    def _header_seconds(self, response):
+        try:
+            return float(response.headers.get("Retry-After"))
+        except (AttributeError, TypeError, ValueError):
+            return self.retry_after
+
+    def _existing_order(self, client, uri, data):
+        #order status of a previous attempt, None when the exchange never got it
+        path, client_id = self._order_id("post", uri, data)
+        params = {"origClientOrderId": client_id}
+        if path == "order":
+            params["symbol"] = data["symbol"]
+
+        try:
+            return client._get(path, True, data=params)
+        except APIException as e:
+            if e.code == UNKNOWN_ORDER:
+                return None
+            raise
+
+    def call(self, client, method, uri, data, send):
+        """Run send() until it returns or the error is not worth another attempt"""
+        retryable = self.retryable(method, uri, data)
+        order = self._order_id(method, uri, data) is not None
+        attempt = 0
+
+        while True:
+            wait = paused()
+            if wait > 0:
+                self.sleep(wait)
+
+            try:
+                return send()
+            except APIException as e:
+                if e.status_code in (418, 429):
+                    pause(self._header_seconds(e.response))
+                elif e.code == TIMESTAMP_OUTSIDE_RECV_WINDOW and getattr(client, "clock", None) is not None:
+                    #refused before execution, safe to resend once the clock is synced again
+                    client.clock.sync()
+                    if attempt >= self.max_retries:
+                        raise
+                    attempt += 1
+                    self.retries += 1
+                    continue
+                elif e.status_code not in self.retry_statuses:
+                    raise
+
+                if not retryable or attempt >= self.max_retries:
+                    raise
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if not retryable or attempt >= self.max_retries:
+                    raise
+
+            self.sleep(self.delay(attempt))
+            attempt += 1
+            self.retries += 1
+
+            if order:
+                existing = self._existing_order(client, uri, data)
+                if existing is not None:
+                    self.recovered_orders += 1
+                    return existing
+
+    def stats(self):
+        return {"retries": self.retries, "recovered_orders": self.recovered_orders, "paused": paused()}
@@ -0,0 +1,257 @@
+import heapq
+import os
+import time
+
+import pyarrow.feather as feather
+from talib import MA_Type
+
+from .functions import appendCandles, candleRow, updateCandle, updateEMA, updateMA
+from .helpers import nextClose
+from .metrics import Histogram
+
+# Scheduler that keeps the stored candles up to date right after every close, instead of
+# rescanning every series from cron.
+#
+# Every (symbol, interval) series sits in one heap ordered by the time its next candle
+# closes. The scheduler sleeps until the first close, takes every series due at that moment
+# and fetches their new candles in batches of concurrent klines calls (Client.map). The
+# closed candles are appended to the store, the indicators of the series are updated and
+# the series goes back in the heap at its next close. The last stored OpenTime of every
+# series is kept in memory, so a sync reads no files and downloads no exchangeInfo.
+#
+# Lag is the time between a close and the moment its candle is stored, kept per interval.
+
+LAG_BUCKETS = (0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+class CandleScheduler:
+    """Fetch the new candle of every series right after it closes
+    :params: delay -> ms after a close before its candle is fetched, the exchange needs a moment to finish it
+             retry -> ms until a series is tried again when its candle was not there yet or the request failed
+             batch -> klines requests per Client.map call
+             emas, mas -> periods of the EMA / MA files to update after new candles, None to skip them
+             ma_types -> MA_Type values of the MA files, defaults to MA_Type.SMA
+             hooks -> lst -> callables hook(symbol, interval, rows), called with the new closed rows
+    """
+
+    def __init__(self, Client, symbols, intervals, delay=1000, retry=2000, batch=50, emas=None, mas=None, ma_types=None, hooks=None, verbose=True):
+        self.Client = Client
+        self.series = [(symbol, interval) for symbol in symbols for interval in intervals]
+        self.delay = delay
+        self.retry = retry
+        self.batch = batch
+        self.emas = emas
+        self.mas = mas
+        self.ma_types = ma_types if ma_types is not None else [MA_Type.SMA]
+        self.hooks = list(hooks) if hooks is not None else []
+        self.verbose = verbose
+
+        self.heap = []              #(due ms, symbol, interval)
+        self.last = {}              #(symbol, interval) -> OpenTime of the last stored candle
+        self.running = False
+
+        self.lag = {interval: Histogram(LAG_BUCKETS) for interval in intervals}
+        self.last_lag = {}          #interval -> seconds
+        self.max_lag = {}           #interval -> seconds
+        self.fetches = 0
+        self.candles = 0
+        self.retries = 0
+        self.errors = 0
+
+    def _now(self):
+        clock = getattr(self.Client, "clock", None)
+        return clock.timestamp() if clock is not None else int(time.time() * 1000)
+
+    def start(self):
+        """Read the last stored candle of every series and schedule it"""
+        now = self._now()
+
+        for symbol, interval in self.series:
+            filename = f"{self.Client.MAIN_PATH}/data/candles/{interval}/{symbol}.feather"
+            if not os.path.isfile(filename):
+                #full history once, from then on only the new candles
+                updateCandle(self.Client, symbol, interval)
+
+            times = feather.read_table(filename, columns=["OpenTime"]).column("OpenTime")
+            self.last[(symbol, interval)] = int(times[-1].as_py()) if len(times) > 0 else -1
+
+            #a store that is behind, the candle after its last one has closed already, is caught up right away
+            last = self.last[(symbol, interval)]
+            behind = last < 0 or nextClose(interval, nextClose(interval, last)) <= now
+            due = now if behind else nextClose(interval, now) + self.delay
+            heapq.heappush(self.heap, (due, symbol, interval))
+
+        self.running = True
+
+    def due(self, now=None):
+        #series due at now, taken off the heap
+        now = self._now() if now is None else now
+        result = []
+
+        while self.heap and self.heap[0][0] <= now:
+            _, symbol, interval = heapq.heappop(self.heap)
+            result.append((symbol, interval))
+
+        return result
+
+    def sync(self, keys):
+        """Fetch and store the new closed candles of keys
+        :returns: int -> amount of candles stored
+        """
+        stored = 0
+
+        for start in range(0, len(keys), self.batch):
+            batch = keys[start:start + self.batch]
+            params_list = [{"symbol": symbol, "interval": interval, "startTime": self.last[(symbol, interval)] + 1, "limit": 1000} for symbol, interval in batch]
+
+            try:
+                results = self.Client.map("get_candles", params_list)
+            except Exception as e:
+                self.errors += 1
+                if self.verbose:
+                    print(f"sync failed: {e}")
+                for symbol, interval in batch:
+                    heapq.heappush(self.heap, (self._now() + self.retry, symbol, interval))
+                continue
+
+            self.fetches += len(batch)
+            now = self._now()
+
+            for (symbol, interval), candles in zip(batch, results):
+                rows = [candleRow(candle) for candle in candles]
+                closed = [row for row in rows if row[5] < now]
+
+                if len(closed) == 0:
+                    #the exchange has not finished the candle yet, a series without trades is left until the next close
+                    expected = nextClose(interval, nextClose(interval, self.last[(symbol, interval)]))
+                    due = now + self.retry if now - expected < 10 * self.retry else nextClose(interval, now) + self.delay
+                    self.retries += 1
+                    heapq.heappush(self.heap, (due, symbol, interval))
+                    continue
+
+                try:
+                    appendCandles(self.Client, symbol, interval, closed)
+                except Exception as e:
+                    #nothing stored, the series is fetched again from its last stored candle
+                    self.errors += 1
+                    if self.verbose:
+                        print(f"storing {symbol} {interval} failed: {e}")
+                    heapq.heappush(self.heap, (now + self.retry, symbol, interval))
+                    continue
+
+                self.last[(symbol, interval)] = closed[-1][0]
+                stored += len(closed)
+                self._indicators(symbol, interval, closed)
+
+                #lag of the latest close only, candles caught up after a pause would swamp it
+                if nextClose(interval, closed[-1][5] + 1) > now:
+                    lag = (self._now() - closed[-1][5] - 1) / 1000
+                    self.lag[interval].observe(lag)
+                    self.last_lag[interval] = lag
+                    self.max_lag[interval] = max(self.max_lag.get(interval, 0.0), lag)
+
+                #a full page means more closed candles are waiting
+                due = now if len(rows) == 1000 and rows[-1][5] < now else nextClose(interval, now) + self.delay
+                heapq.heappush(self.heap, (due, symbol, interval))
+
+        self.candles += stored
+        return stored
+
+    def _indicators(self, symbol, interval, rows):
+        #the candles are stored already, a failing update is counted and the others still run
+        updates = []
+        if self.emas is not None:
+            updates.append(lambda: updateEMA(self.Client, symbol, self.emas, interval))
+
+        if self.mas is not None:
+            for ma_type in self.ma_types:
+                updates.append(lambda ma_type=ma_type: updateMA(self.Client, symbol, self.mas, interval, ma_type))
+
+        for hook in self.hooks:
+            updates.append(lambda hook=hook: hook(symbol, interval, rows))
+
+        for update in updates:
+            try:
+                update()
+            except Exception as e:
+                self.errors += 1
+                if self.verbose:
+                    print(f"update of {symbol} {interval} failed: {e}")
+
+    def run_pending(self):
+        keys = self.due()
+        if not keys:
+            return 0
+
+        try:
+            stored = self.sync(keys)
+        except Exception:
+            #series taken off the heap are never dropped, the ones not scheduled again are retried
+            scheduled = {(symbol, interval) for _, symbol, interval in self.heap}
+            for symbol, interval in keys:
+                if (symbol, interval) not in scheduled:
+                    heapq.heappush(self.heap, (self._now() + self.retry, symbol, interval))
+            raise
+
+        if self.verbose:
+            print(f"synced {len(keys)} series, {stored} candles")
+        return stored
+
+    def run(self):
+        """Sync every series after each close until stop() or ctrl-c"""
+        if not self.running:
+            self.start()
+
+        try:
+            while self.running and self.heap:
+                wait = (self.heap[0][0] - self._now()) / 1000
+                if wait > 0:
+                    #short sleeps so stop() is noticed
+                    time.sleep(min(wait, 1.0))
+                    continue
+
+                try:
+                    self.run_pending()
+                except Exception as e:
+                    self.errors += 1
+                    if self.verbose:
+                        print(f"sync failed: {e}")
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.running = False
+
+    def stop(self):
+        self.running = False
+
+    def stats(self):
+        """
+        :returns: dict -> {"series": int, "fetches": int, "candles": int, "retries": int, "errors": int,
+            "next": float -> seconds until the next close is synced,
+            "lag": dict -> {interval: dict -> {"last": float, "max": float, "p50": float, "p99": float, "count": int}}}
+        """
+        lag = {}
+        for interval, histogram in self.lag.items():
+            lag[interval] = {
+                "last": self.last_lag.get(interval, 0.0),
+                "max": self.max_lag.get(interval, 0.0),
+                "p50": histogram.quantile(0.5),
+                "p99": histogram.quantile(0.99),
+                "count": histogram.count
+            }
+
+        return {
+            "series": len(self.series),
+            "fetches": self.fetches,
+            "candles": self.candles,
+            "retries": self.retries,
+            "errors": self.errors,
+            "next": (self.heap[0][0] - self._now()) / 1000 if self.heap else None,
+            "lag": lag
+        }
+
+if __name__ == "__main__":
+    #python -m binance.scheduler ETHBTC,LTCBTC 1m,1h
+    import sys
+    from .client import Client
+
+    CandleScheduler(Client(), sys.argv[1].split(","), sys.argv[2].split(",")).run()
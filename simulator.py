@@ -0,0 +1,919 @@
+import hashlib
+import hmac
+import json
+import threading
+import time
+from decimal import Decimal
+from urllib.parse import urlsplit, parse_qsl
+
+import numpy as np
+
+from .client import Client
+
+# In process simulated exchange.
+#
+# SimulatedExchange keeps symbols, balances and orders and answers the same REST paths
+# (/api/v3/...) Client talks to. SimulatedSession stands in for requests.Session, so a
+# SimulatedClient runs the real Client code paths (parameter ordering, signing, error
+# handling) without a network. Orders are matched against candles that are fed bar by
+# bar with replay() / step(); inside a bar the price is assumed to go open -> low ->
+# high -> close for a rising bar and open -> high -> low -> close for a falling one.
+
+def _fmt(value):
+    return f"{value:.8f}"
+
+class SimulatedResponse:
+
+    def __init__(self, status_code, payload, headers=None):
+        self.status_code = status_code
+        self.text = json.dumps(payload)
+        self.content = self.text.encode("utf-8")
+        self.headers = headers if headers is not None else {}
+        self.request = None
+
+    def json(self):
+        return json.loads(self.text)
+
+class SimulatedError(Exception):
+
+    def __init__(self, code, msg, status_code=400):
+        self.code = code
+        self.msg = msg
+        self.status_code = status_code
+
+class SimulatedExchange:
+
+    FILLED_STATES = ("FILLED", "CANCELED", "EXPIRED", "REJECTED")
+
+    def __init__(self, api_secret=None, fee=0.001, start_time=None):
+        self.api_secret = api_secret
+        self.fee = fee
+        #requests of several client threads and step() are handled one at a time
+        self.lock = threading.RLock()
+        self.time = start_time if start_time is not None else int(time.time() * 1000)
+
+        self.symbols = {}           #symbol -> exchangeInfo symbol dict
+        self.filters = {}           #symbol -> dict filterType -> filter
+        self.balances = {}          #asset -> [free, locked]
+        self.orders = {}            #orderId -> order
+        self.open_orders = {}       #symbol -> {orderId: order}
+        self.order_lists = {}       #orderListId -> order list
+        self.trades = {}            #symbol -> lst of trades
+        self.candles = {}           #symbol -> dict of column arrays
+        self.position = {}          #symbol -> index of the current candle
+        self.last_price = {}
+        self.listeners = []
+        self.listen_keys = set()
+
+        self.next_order_id = 1
+        self.next_list_id = 1
+        self.next_trade_id = 1
+
+    #setup
+
+    def add_symbol(self, symbol, base, quote, tick_size="0.00000100", step_size="0.00100000", min_qty="0.00100000", max_qty="900000.00000000", min_price="0.00000100", max_price="100000.00000000", min_notional="0.00010000", multiplier_up="5", multiplier_down="0.2", status=Client.SYMBOL_STATUS_TRADING):
+        filters = [
+            {"filterType": "PRICE_FILTER", "minPrice": min_price, "maxPrice": max_price, "tickSize": tick_size},
+            {"filterType": "PERCENT_PRICE", "multiplierUp": multiplier_up, "multiplierDown": multiplier_down, "avgPriceMins": 5},
+            {"filterType": "LOT_SIZE", "minQty": min_qty, "maxQty": max_qty, "stepSize": step_size},
+            {"filterType": "MIN_NOTIONAL", "minNotional": min_notional, "applyToMarket": True, "avgPriceMins": 5}
+        ]
+
+        self.symbols[symbol] = {
+            "symbol": symbol,
+            "status": status,
+            "baseAsset": base,
+            "baseAssetPrecision": 8,
+            "quoteAsset": quote,
+            "quotePrecision": 8,
+            "quoteAssetPrecision": 8,
+            "orderTypes": ["LIMIT", "LIMIT_MAKER", "MARKET", "STOP_LOSS", "STOP_LOSS_LIMIT", "TAKE_PROFIT", "TAKE_PROFIT_LIMIT"],
+            "icebergAllowed": True,
+            "ocoAllowed": True,
+            "isSpotTradingAllowed": True,
+            "isMarginTradingAllowed": False,
+            "filters": filters,
+            "permissions": ["SPOT"]
+        }
+        self.filters[symbol] = {item["filterType"]: {k: Decimal(str(v)) if k not in ("filterType", "applyToMarket") else v for k, v in item.items()} for item in filters}
+        self.open_orders.setdefault(symbol, {})
+        self.trades.setdefault(symbol, [])
+
+        for asset in (base, quote):
+            self.balances.setdefault(asset, [0.0, 0.0])
+
+    def deposit(self, asset, amount):
+        self.balances.setdefault(asset, [0.0, 0.0])[0] += amount
+
+    def subscribe(self, callback):
+        #callback(event) for every executionReport / listStatus / outboundAccountPosition
+        self.listeners.append(callback)
+
+    def load_candles(self, symbol, candles):
+        """Candles from the candle store (DataFrame) or klines as returned by get_candles"""
+        if hasattr(candles, "loc"):
+            columns = {
+                "open_time": candles["OpenTime"], "open": candles["OpenPrice"], "high": candles["HighPrice"],
+                "low": candles["LowPrice"], "close": candles["ClosePrice"], "close_time": candles["CloseTime"],
+                "volume": candles["Volume"]
+            }
+            columns = {key: value.to_numpy() for key, value in columns.items()}
+        else:
+            rows = np.array(candles, dtype=object)
+            columns = {
+                "open_time": rows[:, 0], "open": rows[:, 1], "high": rows[:, 2], "low": rows[:, 3],
+                "close": rows[:, 4], "volume": rows[:, 5], "close_time": rows[:, 6]
+            }
+
+        self.candles[symbol] = {
+            key: np.asarray(value, dtype=np.int64 if key.endswith("time") else np.float64) for key, value in columns.items()
+        }
+        self.position[symbol] = -1
+
+    #market simulation
+
+    def step(self, symbol):
+        #move symbol one candle forward, returns False when there are no candles left
+        with self.lock:
+            return self._step(symbol)
+
+    def _step(self, symbol):
+        index = self.position[symbol] + 1
+        candles = self.candles[symbol]
+
+        if index >= len(candles["open"]):
+            return False
+
+        self.position[symbol] = index
+        self.time = int(candles["close_time"][index])
+
+        bar_open = candles["open"][index]
+        bar_close = candles["close"][index]
+
+        if bar_close >= bar_open:
+            path = (bar_open, candles["low"][index], candles["high"][index], bar_close)
+        else:
+            path = (bar_open, candles["high"][index], candles["low"][index], bar_close)
+
+        if symbol not in self.last_price:
+            self.last_price[symbol] = bar_open
+
+        for price in path:
+            self._move(symbol, self.last_price[symbol], price)
+            self.last_price[symbol] = price
+
+        return True
+
+    def replay(self, symbol, callback=None):
+        """Feed all loaded candles of symbol, callback(exchange, index) runs after every candle"""
+        while self.step(symbol):
+            if callback is not None:
+                callback(self, self.position[symbol])
+
+    def _move(self, symbol, start, end):
+        low, high = min(start, end), max(start, end)
+
+        for order in list(self.open_orders[symbol].values()):
+            if order["status"] in self.FILLED_STATES:
+                continue
+
+            if order["stop"] is not None and not order["triggered"]:
+                if low <= order["stop"] <= high:
+                    order["triggered"] = True
+                    if order["type"] in ("STOP_LOSS", "TAKE_PROFIT"):
+                        self._fill(order, order["stop"], maker=False)
+                        continue
+                else:
+                    continue
+
+            if order["price"] is not None:
+                if order["side"] == "BUY" and low <= order["price"]:
+                    self._fill(order, order["price"], maker=True)
+                elif order["side"] == "SELL" and high >= order["price"]:
+                    self._fill(order, order["price"], maker=True)
+
+    #request handling
+
+    def handle(self, method, uri, params):
+        with self.lock:
+            return self._handle(method, uri, params)
+
+    def _handle(self, method, uri, params):
+        path = urlsplit(uri).path
+        for prefix in ("/api/v3/", "/sapi/v1/", "/wapi/v3/", "/fapi/v1/"):
+            if prefix in path:
+                path = path.split(prefix, 1)[1]
+                break
+
+        route = self.ROUTES.get((method, path))
+
+        try:
+            if route is None:
+                raise SimulatedError(-1020, "This operation is not supported.", 404)
+
+            handler, signed = route
+            params = dict(params)
+            if signed:
+                self._verify(params)
+
+            payload = handler(self, params)
+            return SimulatedResponse(200, payload)
+        except SimulatedError as e:
+            return SimulatedResponse(e.status_code, {"code": e.code, "msg": e.msg})
+
+    def _verify(self, params):
+        for key in ("timestamp", "signature"):
+            if key not in params:
+                raise SimulatedError(-1102, f"Mandatory parameter '{key}' was not sent, was empty/null, or malformed.")
+
+        if self.api_secret is not None:
+            signature = params["signature"]
+            query_string = "&".join(f"{key}={value}" for key, value in params.items() if key != "signature")
+            expected = hmac.new(self.api_secret.encode("utf-8"), query_string.encode("utf-8"), hashlib.sha256).hexdigest()
+
+            if not hmac.compare_digest(signature, expected):
+                raise SimulatedError(-1022, "Signature for this request is not valid.")
+
+        #the timestamp is wall clock time while the exchange runs on candle time, so recvWindow is not checked
+        del params["signature"]
+        params.pop("timestamp", None)
+        params.pop("recvWindow", None)
+
+    def _symbol(self, params, required=True):
+        symbol = params.get("symbol")
+
+        if symbol is None:
+            if required:
+                raise SimulatedError(-1102, "Mandatory parameter 'symbol' was not sent, was empty/null, or malformed.")
+            return None
+
+        if symbol not in self.symbols:
+            raise SimulatedError(-1121, "Invalid symbol.")
+
+        return symbol
+
+    def _ping(self, params):
+        return {}
+
+    def _time(self, params):
+        return {"serverTime": self.time}
+
+    def _exchange_info(self, params):
+        return {
+            "timezone": "UTC",
+            "serverTime": self.time,
+            "rateLimits": [],
+            "exchangeFilters": [],
+            "symbols": list(self.symbols.values())
+        }
+
+    def _klines(self, params):
+        symbol = self._symbol(params)
+        candles = self.candles.get(symbol)
+        if candles is None:
+            return []
+
+        #only what has happened so far is visible
+        stop = self.position[symbol] + 1
+        start = 0
+        if params.get("startTime") is not None:
+            start = int(np.searchsorted(candles["open_time"][:stop], int(params["startTime"])))
+        if params.get("endTime") is not None:
+            stop = min(stop, int(np.searchsorted(candles["open_time"], int(params["endTime"]), side="right")))
+
+        stop = min(stop, start + min(int(params.get("limit", 500)), 1000))
+
+        return [[
+            int(candles["open_time"][i]), _fmt(candles["open"][i]), _fmt(candles["high"][i]), _fmt(candles["low"][i]),
+            _fmt(candles["close"][i]), _fmt(candles["volume"][i]), int(candles["close_time"][i]),
+            _fmt(candles["volume"][i] * candles["close"][i]), 0, "0", "0", "0"
+        ] for i in range(start, stop)]
+
+    def _avg_price_value(self, symbol):
+        candles = self.candles.get(symbol)
+        index = self.position.get(symbol, -1)
+
+        if candles is None or index < 0:
+            return self.last_price.get(symbol)
+
+        return float(np.mean(candles["close"][max(0, index - 4):index + 1]))
+
+    def _avg_price(self, params):
+        symbol = self._symbol(params)
+        return {"mins": 5, "price": _fmt(self._avg_price_value(symbol) or 0.0)}
+
+    def _ticker_price(self, params):
+        symbol = self._symbol(params, required=False)
+        if symbol is not None:
+            return {"symbol": symbol, "price": _fmt(self.last_price.get(symbol, 0.0))}
+
+        return [{"symbol": s, "price": _fmt(self.last_price.get(s, 0.0))} for s in self.symbols]
+
+    def _book(self, symbol):
+        price = self.last_price.get(symbol, 0.0)
+        tick = float(self.filters[symbol]["PRICE_FILTER"]["tickSize"])
+        return price - tick, price + tick
+
+    def _book_ticker(self, params):
+        symbol = self._symbol(params, required=False)
+        symbols = [symbol] if symbol is not None else list(self.symbols)
+        result = []
+
+        for s in symbols:
+            bid, ask = self._book(s)
+            result.append({"symbol": s, "bidPrice": _fmt(bid), "bidQty": _fmt(1000.0), "askPrice": _fmt(ask), "askQty": _fmt(1000.0)})
+
+        return result[0] if symbol is not None else result
+
+    def _ticker_24hr(self, params):
+        symbol = self._symbol(params, required=False)
+        symbols = [symbol] if symbol is not None else list(self.symbols)
+        result = []
+
+        for s in symbols:
+            candles = self.candles.get(s)
+            index = self.position.get(s, -1)
+            last = self.last_price.get(s, 0.0)
+            item = {"symbol": s, "lastPrice": _fmt(last), "openTime": self.time - 86400000, "closeTime": self.time, "count": 0}
+
+            if candles is not None and index >= 0:
+                start = int(np.searchsorted(candles["open_time"], self.time - 86400000))
+                start = min(start, index)
+                first = candles["open"][start]
+                item.update({
+                    "openPrice": _fmt(first),
+                    "highPrice": _fmt(candles["high"][start:index + 1].max()),
+                    "lowPrice": _fmt(candles["low"][start:index + 1].min()),
+                    "volume": _fmt(candles["volume"][start:index + 1].sum()),
+                    "priceChange": _fmt(last - first),
+                    "priceChangePercent": f"{(last / first - 1) * 100:.3f}" if first else "0.000",
+                    "count": index + 1 - start
+                })
+            result.append(item)
+
+        return result[0] if symbol is not None else result
+
+    def _depth(self, params):
+        symbol = self._symbol(params)
+        limit = int(params.get("limit", 100))
+        bid, ask = self._book(symbol)
+        tick = float(self.filters[symbol]["PRICE_FILTER"]["tickSize"])
+
+        return {
+            "lastUpdateId": self.next_trade_id,
+            "bids": [[_fmt(bid - i * tick), _fmt(1000.0)] for i in range(limit)],
+            "asks": [[_fmt(ask + i * tick), _fmt(1000.0)] for i in range(limit)]
+        }
+
+    #orders
+
+    def _check_filters(self, symbol, order_type, price, quantity):
+        filters = self.filters[symbol]
+
+        if self.symbols[symbol]["status"] != Client.SYMBOL_STATUS_TRADING:
+            raise SimulatedError(-1013, "Market is closed.")
+
+        if price is not None:
+            f = filters["PRICE_FILTER"]
+            if price < f["minPrice"] or price > f["maxPrice"] or (price - f["minPrice"]) % f["tickSize"] != 0:
+                raise SimulatedError(-1013, "Filter failure: PRICE_FILTER")
+
+            avg = self._avg_price_value(symbol)
+            if avg:
+                f = filters["PERCENT_PRICE"]
+                avg = Decimal(str(avg))
+                if price > avg * f["multiplierUp"] or price < avg * f["multiplierDown"]:
+                    raise SimulatedError(-1013, "Filter failure: PERCENT_PRICE")
+
+        if quantity is not None:
+            f = filters["LOT_SIZE"]
+            if quantity < f["minQty"] or quantity > f["maxQty"] or (quantity - f["minQty"]) % f["stepSize"] != 0:
+                raise SimulatedError(-1013, "Filter failure: LOT_SIZE")
+
+            f = filters["MIN_NOTIONAL"]
+            notional_price = price
+            if notional_price is None and f["applyToMarket"]:
+                last = self.last_price.get(symbol)
+                notional_price = Decimal(str(last)) if last else None
+            if notional_price is not None and notional_price * quantity < f["minNotional"]:
+                raise SimulatedError(-1013, "Filter failure: MIN_NOTIONAL")
+
+    def _decimal(self, params, key, required=False):
+        value = params.get(key)
+
+        if value is None:
+            if required:
+                raise SimulatedError(-1102, f"Mandatory parameter '{key}' was not sent, was empty/null, or malformed.")
+            return None
+
+        return Decimal(str(value))
+
+    def _new_order(self, symbol, side, order_type, quantity, price=None, stop=None, time_in_force=None, client_order_id=None, list_id=-1):
+        last = self.last_price.get(symbol)
+        if last is None:
+            raise SimulatedError(-1013, "Market is closed.")
+
+        if client_order_id is not None:
+            for existing in self.open_orders[symbol].values():
+                if existing["clientOrderId"] == client_order_id:
+                    raise SimulatedError(-2010, "Duplicate order sent.")
+
+        info = self.symbols[symbol]
+        base, quote = info["baseAsset"], info["quoteAsset"]
+
+        #lock what the order can spend
+        if side == "BUY":
+            lock_asset = quote
+            lock_price = price if price is not None else (stop if stop is not None else last)
+            lock_amount = quantity * lock_price
+        else:
+            lock_asset = base
+            lock_amount = quantity
+
+        balance = self.balances.setdefault(lock_asset, [0.0, 0.0])
+        if balance[0] + 1e-12 < lock_amount:
+            raise SimulatedError(-2010, "Account has insufficient balance for requested action.")
+
+        balance[0] -= lock_amount
+        balance[1] += lock_amount
+
+        order_id = self.next_order_id
+        self.next_order_id += 1
+
+        order = {
+            "symbol": symbol,
+            "orderId": order_id,
+            "orderListId": list_id,
+            "clientOrderId": client_order_id if client_order_id is not None else f"sim{order_id}",
+            "transactTime": self.time,
+            "price": price,
+            "stop": stop,
+            "triggered": stop is None,
+            "origQty": quantity,
+            "executedQty": 0.0,
+            "cummulativeQuoteQty": 0.0,
+            "status": "NEW",
+            "timeInForce": time_in_force if time_in_force is not None else "GTC",
+            "type": order_type,
+            "side": side,
+            "lockAsset": lock_asset,
+            "locked": lock_amount,
+            "fills": []
+        }
+
+        self.orders[order_id] = order
+        self.open_orders[symbol][order_id] = order
+        self._emit_order(order, "NEW")
+
+        return order
+
+    def _fill(self, order, price, maker):
+        symbol = order["symbol"]
+        info = self.symbols[symbol]
+        base, quote = info["baseAsset"], info["quoteAsset"]
+        quantity = order["origQty"] - order["executedQty"]
+        total = quantity * price
+
+        if order["side"] == "BUY":
+            commission = quantity * self.fee
+            commission_asset = base
+            self.balances[base][0] += quantity - commission
+            #release the lock, anything not spent goes back to free
+            self.balances[quote][1] -= order["locked"]
+            self.balances[quote][0] += order["locked"] - total
+        else:
+            commission = total * self.fee
+            commission_asset = quote
+            self.balances[base][1] -= order["locked"]
+            self.balances[base][0] += order["locked"] - quantity
+            self.balances[quote][0] += total - commission
+
+        order["locked"] = 0.0
+        order["executedQty"] = order["origQty"]
+        order["cummulativeQuoteQty"] += total
+        order["status"] = "FILLED"
+        order["fills"].append({"price": _fmt(price), "qty": _fmt(quantity), "commission": _fmt(commission), "commissionAsset": commission_asset, "tradeId": self.next_trade_id})
+
+        self.trades[symbol].append({
+            "symbol": symbol,
+            "id": self.next_trade_id,
+            "orderId": order["orderId"],
+            "orderListId": order["orderListId"],
+            "price": _fmt(price),
+            "qty": _fmt(quantity),
+            "quoteQty": _fmt(total),
+            "commission": _fmt(commission),
+            "commissionAsset": commission_asset,
+            "time": self.time,
+            "isBuyer": order["side"] == "BUY",
+            "isMaker": maker,
+            "isBestMatch": True
+        })
+        self.next_trade_id += 1
+
+        del self.open_orders[symbol][order["orderId"]]
+        self._emit_order(order, "TRADE", quantity, price, commission, commission_asset)
+        self._emit_account((base, quote))
+
+        if order["orderListId"] != -1:
+            self._finish_list(order)
+
+    def _close(self, order, status):
+        if order["status"] in self.FILLED_STATES:
+            return
+
+        balance = self.balances[order["lockAsset"]]
+        balance[1] -= order["locked"]
+        balance[0] += order["locked"]
+        order["locked"] = 0.0
+        order["status"] = status
+
+        del self.open_orders[order["symbol"]][order["orderId"]]
+        self._emit_order(order, "CANCELED" if status == "CANCELED" else "EXPIRED")
+        self._emit_account((order["lockAsset"],))
+
+    def _finish_list(self, order):
+        order_list = self.order_lists[order["orderListId"]]
+        for other_id in order_list["orderIds"]:
+            other = self.orders[other_id]
+            if other is not order:
+                self._close(other, "EXPIRED")
+
+        order_list["listOrderStatus"] = "ALL_DONE"
+        self._emit({"e": "listStatus", "E": self.time, "s": order["symbol"], "g": order_list["orderListId"], "c": "OCO", "l": "ALL_DONE", "L": "ALL_DONE", "r": "NONE", "C": order_list["listClientOrderId"], "T": self.time, "O": [{"s": order["symbol"], "i": i, "c": self.orders[i]["clientOrderId"]} for i in order_list["orderIds"]]})
+
+    def _execute(self, order):
+        #match a new order against the current price
+        last = self.last_price[order["symbol"]]
+        bid, ask = self._book(order["symbol"])
+        marketable = (order["side"] == "BUY" and (order["price"] is None or order["price"] >= ask)) or (order["side"] == "SELL" and (order["price"] is None or order["price"] <= bid))
+
+        if order["stop"] is not None:
+            return
+
+        if order["type"] == "LIMIT_MAKER" and marketable:
+            self._close(order, "EXPIRED")
+            raise SimulatedError(-2010, "Order would immediately match and take.")
+
+        if marketable:
+            fill_price = last if order["price"] is None else (min(order["price"], ask) if order["side"] == "BUY" else max(order["price"], bid))
+            self._fill(order, fill_price, maker=False)
+        elif order["timeInForce"] in ("IOC", "FOK") or order["type"] == "MARKET":
+            self._close(order, "EXPIRED")
+
+    def _order_response(self, order, resp_type="FULL"):
+        result = {
+            "symbol": order["symbol"],
+            "orderId": order["orderId"],
+            "orderListId": order["orderListId"],
+            "clientOrderId": order["clientOrderId"],
+            "transactTime": order["transactTime"]
+        }
+
+        if resp_type in ("RESULT", "FULL"):
+            result.update({
+                "price": _fmt(order["price"] or 0.0),
+                "origQty": _fmt(order["origQty"]),
+                "executedQty": _fmt(order["executedQty"]),
+                "cummulativeQuoteQty": _fmt(order["cummulativeQuoteQty"]),
+                "status": order["status"],
+                "timeInForce": order["timeInForce"],
+                "type": order["type"],
+                "side": order["side"]
+            })
+
+        if resp_type == "FULL":
+            result["fills"] = [{key: value for key, value in fill.items() if key != "tradeId"} for fill in order["fills"]]
+
+        return result
+
+    def _order_status(self, order):
+        result = self._order_response(order, "RESULT")
+        del result["transactTime"]
+        result.update({
+            "stopPrice": _fmt(order["stop"] or 0.0),
+            "icebergQty": _fmt(0.0),
+            "time": order["transactTime"],
+            "updateTime": self.time,
+            "isWorking": order["triggered"] and order["status"] not in self.FILLED_STATES,
+            "origQuoteOrderQty": _fmt(0.0)
+        })
+        return result
+
+    def _parse_order(self, params):
+        symbol = self._symbol(params)
+        side = params.get("side")
+        order_type = params.get("type")
+
+        if side not in ("BUY", "SELL"):
+            raise SimulatedError(-1102, "Mandatory parameter 'side' was not sent, was empty/null, or malformed.")
+        if order_type not in self.symbols[symbol]["orderTypes"]:
+            raise SimulatedError(-1116, "Invalid orderType.")
+
+        price = self._decimal(params, "price", required=order_type in ("LIMIT", "LIMIT_MAKER", "STOP_LOSS_LIMIT", "TAKE_PROFIT_LIMIT"))
+        stop = self._decimal(params, "stopPrice", required=order_type in ("STOP_LOSS", "STOP_LOSS_LIMIT", "TAKE_PROFIT", "TAKE_PROFIT_LIMIT"))
+        quantity = self._decimal(params, "quantity")
+
+        if quantity is None:
+            quote_quantity = self._decimal(params, "quoteOrderQty")
+            if order_type != "MARKET" or quote_quantity is None:
+                raise SimulatedError(-1102, "Mandatory parameter 'quantity' was not sent, was empty/null, or malformed.")
+
+            step = self.filters[symbol]["LOT_SIZE"]["stepSize"]
+            quantity = (quote_quantity / Decimal(str(self.last_price[symbol])) // step) * step
+
+        if order_type in ("LIMIT", "STOP_LOSS_LIMIT", "TAKE_PROFIT_LIMIT") and params.get("timeInForce") is None:
+            raise SimulatedError(-1102, "Mandatory parameter 'timeInForce' was not sent, was empty/null, or malformed.")
+
+        self._check_filters(symbol, order_type, price, quantity)
+        if stop is not None:
+            self._check_filters(symbol, order_type, stop, None)
+
+        return symbol, side, order_type, quantity, price, stop
+
+    def _create_order(self, params):
+        symbol, side, order_type, quantity, price, stop = self._parse_order(params)
+
+        order = self._new_order(symbol, side, order_type, float(quantity), None if price is None else float(price), None if stop is None else float(stop), params.get("timeInForce"), params.get("newClientOrderId"))
+        self._execute(order)
+
+        default = "FULL" if order_type in ("MARKET", "LIMIT") else "ACK"
+        return self._order_response(order, params.get("newOrderRespType", default))
+
+    def _test_order(self, params):
+        self._parse_order(params)
+        return {}
+
+    def _find_order(self, params):
+        symbol = self._symbol(params)
+
+        if params.get("orderId") is not None:
+            order = self.orders.get(int(params["orderId"]))
+        elif params.get("origClientOrderId") is not None:
+            order = next((o for o in reversed(list(self.orders.values())) if o["symbol"] == symbol and o["clientOrderId"] == params["origClientOrderId"]), None)
+        else:
+            raise SimulatedError(-1102, "Param 'origClientOrderId' or 'orderId' must be sent, but both were empty/null!")
+
+        if order is None or order["symbol"] != symbol:
+            raise SimulatedError(-2013, "Order does not exist.")
+
+        return order
+
+    def _get_order(self, params):
+        return self._order_status(self._find_order(params))
+
+    def _cancel_order(self, params):
+        try:
+            order = self._find_order(params)
+        except SimulatedError as e:
+            if e.code == -2013:
+                raise SimulatedError(-2011, "Unknown order sent.")
+            raise
+
+        if order["status"] in self.FILLED_STATES:
+            raise SimulatedError(-2011, "Unknown order sent.")
+
+        self._close(order, "CANCELED")
+        result = self._order_response(order, "RESULT")
+        result["origClientOrderId"] = result["clientOrderId"]
+        del result["transactTime"]
+        return result
+
+    def _open_orders(self, params):
+        symbol = self._symbol(params, required=False)
+        symbols = [symbol] if symbol is not None else list(self.symbols)
+        return [self._order_status(order) for s in symbols for order in self.open_orders[s].values()]
+
+    def _cancel_open_orders(self, params):
+        symbol = self._symbol(params)
+        result = []
+
+        for order in list(self.open_orders[symbol].values()):
+            self._close(order, "CANCELED")
+            result.append(self._order_response(order, "RESULT"))
+
+        return result
+
+    def _all_orders(self, params):
+        symbol = self._symbol(params)
+        orders = [self._order_status(order) for order in self.orders.values() if order["symbol"] == symbol]
+        return orders[-int(params.get("limit", 500)):]
+
+    def _create_oco_order(self, params):
+        symbol = self._symbol(params)
+        side = params.get("side")
+        quantity = self._decimal(params, "quantity", required=True)
+        price = self._decimal(params, "price", required=True)
+        stop = self._decimal(params, "stopPrice", required=True)
+        stop_limit = self._decimal(params, "stopLimitPrice")
+
+        self._check_filters(symbol, "LIMIT_MAKER", price, quantity)
+        self._check_filters(symbol, "STOP_LOSS", stop, quantity)
+
+        #the limit leg and the stop leg share the locked balance of one order
+        list_id = self.next_list_id
+        self.next_list_id += 1
+
+        limit_order = self._new_order(symbol, side, "LIMIT_MAKER", float(quantity), float(price), None, "GTC", params.get("limitClientOrderId"), list_id)
+        stop_type = "STOP_LOSS_LIMIT" if stop_limit is not None else "STOP_LOSS"
+
+        #second leg, release the first lock so the balance check sees the same funds, the first leg keeps no lock
+        balance = self.balances[limit_order["lockAsset"]]
+        balance[1] -= limit_order["locked"]
+        balance[0] += limit_order["locked"]
+        limit_order["locked"] = 0.0
+        stop_order = self._new_order(symbol, side, stop_type, float(quantity), None if stop_limit is None else float(stop_limit), float(stop), params.get("stopLimitTimeInForce", "GTC"), params.get("stopClientOrderId"), list_id)
+
+        if side == "SELL":
+            #both legs sell the same base, the limit leg releases it through the stop leg
+            limit_order["locked"], stop_order["locked"] = stop_order["locked"], 0.0
+            limit_order["lockAsset"] = stop_order["lockAsset"]
+
+        order_list = {
+            "orderListId": list_id,
+            "contingencyType": "OCO",
+            "listStatusType": "EXEC_STARTED",
+            "listOrderStatus": "EXECUTING",
+            "listClientOrderId": params.get("listClientOrderId", f"simlist{list_id}"),
+            "transactionTime": self.time,
+            "symbol": symbol,
+            "orderIds": [stop_order["orderId"], limit_order["orderId"]]
+        }
+        self.order_lists[list_id] = order_list
+
+        try:
+            self._execute(limit_order)
+        except SimulatedError:
+            self._close(stop_order, "CANCELED")
+            raise
+
+        return {
+            "orderListId": list_id,
+            "contingencyType": "OCO",
+            "listStatusType": order_list["listStatusType"],
+            "listOrderStatus": order_list["listOrderStatus"],
+            "listClientOrderId": order_list["listClientOrderId"],
+            "transactionTime": self.time,
+            "symbol": symbol,
+            "orders": [{"symbol": symbol, "orderId": o["orderId"], "clientOrderId": o["clientOrderId"]} for o in (stop_order, limit_order)],
+            "orderReports": [self._order_response(o, "RESULT") for o in (stop_order, limit_order)]
+        }
+
+    def _account(self, params):
+        return {
+            "makerCommission": int(self.fee * 10000),
+            "takerCommission": int(self.fee * 10000),
+            "buyerCommission": 0,
+            "sellerCommission": 0,
+            "canTrade": True,
+            "canWithdraw": True,
+            "canDeposit": True,
+            "updateTime": self.time,
+            "accountType": "SPOT",
+            "balances": [{"asset": asset, "free": _fmt(free), "locked": _fmt(locked)} for asset, (free, locked) in self.balances.items()],
+            "permissions": ["SPOT"]
+        }
+
+    def _my_trades(self, params):
+        symbol = self._symbol(params)
+        return self.trades[symbol][-int(params.get("limit", 500)):]
+
+    def _listen_key(self, params):
+        key = f"simulated{len(self.listen_keys) + 1}"
+        self.listen_keys.add(key)
+        return {"listenKey": key}
+
+    def _keepalive(self, params):
+        if params.get("listenKey") not in self.listen_keys:
+            raise SimulatedError(-1125, "This listenKey does not exist.")
+        return {}
+
+    def _close_stream(self, params):
+        self.listen_keys.discard(params.get("listenKey"))
+        return {}
+
+    #user data events
+
+    def _emit(self, event):
+        for listener in self.listeners:
+            listener(event)
+
+    def _emit_order(self, order, execution, last_qty=0.0, last_price=0.0, commission=0.0, commission_asset=None):
+        if not self.listeners:
+            return
+
+        self._emit({
+            "e": "executionReport",
+            "E": self.time,
+            "s": order["symbol"],
+            "c": order["clientOrderId"],
+            "S": order["side"],
+            "o": order["type"],
+            "f": order["timeInForce"],
+            "q": _fmt(order["origQty"]),
+            "p": _fmt(order["price"] or 0.0),
+            "P": _fmt(order["stop"] or 0.0),
+            "g": order["orderListId"],
+            "x": execution,
+            "X": order["status"],
+            "r": "NONE",
+            "i": order["orderId"],
+            "l": _fmt(last_qty),
+            "z": _fmt(order["executedQty"]),
+            "L": _fmt(last_price),
+            "n": _fmt(commission),
+            "N": commission_asset,
+            "T": self.time,
+            "t": self.next_trade_id - 1 if execution == "TRADE" else -1,
+            "w": order["status"] == "NEW",
+            "m": False,
+            "Z": _fmt(order["cummulativeQuoteQty"])
+        })
+
+    def _emit_account(self, assets):
+        if not self.listeners:
+            return
+
+        self._emit({
+            "e": "outboundAccountPosition",
+            "E": self.time,
+            "u": self.time,
+            "B": [{"a": asset, "f": _fmt(self.balances[asset][0]), "l": _fmt(self.balances[asset][1])} for asset in assets]
+        })
+
+    ROUTES = {
+        ("get", "ping"): (_ping, False),
+        ("get", "time"): (_time, False),
+        ("get", "exchangeInfo"): (_exchange_info, False),
+        ("get", "klines"): (_klines, False),
+        ("get", "depth"): (_depth, False),
+        ("get", "avgPrice"): (_avg_price, False),
+        ("get", "ticker/price"): (_ticker_price, False),
+        ("get", "ticker/bookTicker"): (_book_ticker, False),
+        ("get", "ticker/24hr"): (_ticker_24hr, False),
+        ("post", "order"): (_create_order, True),
+        ("post", "order/test"): (_test_order, True),
+        ("get", "order"): (_get_order, True),
+        ("delete", "order"): (_cancel_order, True),
+        ("get", "openOrders"): (_open_orders, True),
+        ("delete", "openOrders"): (_cancel_open_orders, True),
+        ("get", "allOrders"): (_all_orders, True),
+        ("post", "order/oco"): (_create_oco_order, True),
+        ("get", "account"): (_account, True),
+        ("get", "myTrades"): (_my_trades, True),
+        ("post", "userDataStream"): (_listen_key, False),
+        ("put", "userDataStream"): (_keepalive, False),
+        ("delete", "userDataStream"): (_close_stream, False)
+    }
+
+class SimulatedSession:
+    """Drop in for the requests.Session used by Client"""
+
+    def __init__(self, exchange):
+        self.exchange = exchange
+        self.headers = {}
+
+    def request(self, method, uri, params=None, data=None, **kwargs):
+        if isinstance(params, str):
+            items = parse_qsl(params, keep_blank_values=True)
+        elif isinstance(params, dict):
+            items = list(params.items())
+        else:
+            items = list(params or [])
+
+        if isinstance(data, dict):
+            items += list(data.items())
+        elif data:
+            items += list(data)
+
+        return self.exchange.handle(method.lower(), uri, [(key, str(value)) for key, value in items])
+
+    def get(self, uri, **kwargs):
+        return self.request("get", uri, **kwargs)
+
+    def post(self, uri, **kwargs):
+        return self.request("post", uri, **kwargs)
+
+    def put(self, uri, **kwargs):
+        return self.request("put", uri, **kwargs)
+
+    def delete(self, uri, **kwargs):
+        return self.request("delete", uri, **kwargs)
+
+    def mount(self, prefix, adapter):
+        pass
+
+    def close(self):
+        pass
+
+class SimulatedClient(Client):
+    """Client talking to a SimulatedExchange instead of Binance"""
+
+    def __init__(self, exchange, api_key="simulated", api_secret="simulated", **kwargs):
+        self.exchange = exchange
+        if exchange.api_secret is None:
+            exchange.api_secret = api_secret
+        super(SimulatedClient, self).__init__(api_key, api_secret, **kwargs)
+
+    def _init_session(self):
+        return SimulatedSession(self.exchange)
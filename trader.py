@@ -4,10 +4,10 @@ import tensorflow as tf
 import os
 import shutil
 import datetime
-import pyarrow.feather as feather
-import pandas as pd
 import activations
+import brainfile
 import copy
+from mutation import SparseDelta
 from tempfile import gettempdir
 
 INPUT_NODES = 6 * 50 * 15
@@ -15,9 +15,29 @@ OUTPUT_NODES = 3
 CHANGE_RATE = 0.035
 HIDDEN_NODES = [432, 36]
 FEE = 0.001
+ACTIVATION = "tanh"
+MUTATION_SCALE = 0.08
+MATERIALIZE_FRACTION = 0.02
 
-physical_devices = tf.config.list_physical_devices('GPU') 
-tf.config.experimental.set_memory_growth(physical_devices[0], True)
+INTRA_OP_THREADS = None     #None lets tensorflow use every core
+INTER_OP_THREADS = None
+COMPILED_INFERENCE = True   #tf.function for predict, False calls the model eagerly
+BATCH_SIZE = 4096
+
+def configureDevices(intra_threads=INTRA_OP_THREADS, inter_threads=INTER_OP_THREADS):
+    #has to run before tensorflow executes anything, returns True when a gpu is available
+    if intra_threads is not None:
+        tf.config.threading.set_intra_op_parallelism_threads(intra_threads)
+    if inter_threads is not None:
+        tf.config.threading.set_inter_op_parallelism_threads(inter_threads)
+
+    physical_devices = tf.config.list_physical_devices('GPU')
+    for device in physical_devices:
+        tf.config.experimental.set_memory_growth(device, True)
+
+    return len(physical_devices) > 0
+
+GPU_AVAILABLE = configureDevices()
 
 main_path_data = os.path.join("E:\\", "Binance", "data2")
 
@@ -52,6 +72,20 @@ class Brain:
             self.model = model
             self.model_loaded = True
 
+        self.infer = self.createInference()
+
+    def createInference(self):
+        #keras predict() sets up a whole data pipeline per call, calling the model directly skips that
+        model = self.model
+
+        def infer(data):
+            return model(data, training=False)
+
+        if not COMPILED_INFERENCE:
+            return infer
+
+        return tf.function(infer, input_signature=[tf.TensorSpec(shape=(None, INPUT_NODES), dtype=tf.float32)])
+
     def storeModel(self):
         if os.path.exists(self.brain_path):
             shutil.rmtree(self.brain_path)
@@ -93,7 +127,18 @@ class Brain:
         return Brain(self.symbol, self.mutation_rate, modelCopy)
 
     def predict(self, data):
-        return self.model.predict(data)[0]
+        data = np.asarray(data, dtype=np.float32).reshape(1, INPUT_NODES)
+        return self.infer(data).numpy()[0]
+
+    def predictBatch(self, data, batch_size=BATCH_SIZE):
+        #one output row per timestep in data (timesteps, INPUT_NODES)
+        data = np.asarray(data, dtype=np.float32).reshape(-1, INPUT_NODES)
+        outputs = [self.infer(data[i:i + batch_size]).numpy() for i in range(0, len(data), batch_size)]
+
+        if len(outputs) == 0:
+            return np.empty((0, OUTPUT_NODES), dtype=np.float32)
+
+        return np.concatenate(outputs)
 
 class BrainOwn:
     def __init__(self, hidden_layers, mutation_rate, symbol):
@@ -104,23 +149,23 @@ class BrainOwn:
         self.layers = hidden_layers
 
         
-        if not os.path.exists(self.brain_path):
+        self.hidden_nodes = None
+        self.weights = None
+        self.biases = None
+        self.model_loaded = self.loadModel()
+
+        if not self.model_loaded:
+            #no stored model in the brain directory, a fresh random brain
             self.hidden_nodes = self.loadHiddenNodes()
             self.weights = self.loadWeights()
             self.biases = self.loadBiases()
-            self.model_loaded = False
-        else:
-            self.hidden_nodes = None
-            self.weights = None
-            self.biases = None
-            self.loadModel()
-            self.model_loaded = True
             
         self.len_weights = len(self.weights)
+        self.deltas = [None] * self.len_weights
         self.activation = self.loadActivation()
     
     def loadActivation(self):
-        return np.vectorize(activations.ActivationFunctionSet().get("tanh"))
+        return np.vectorize(activations.ActivationFunctionSet().get(ACTIVATION))
 
     def loadHiddenNodes(self):
         nodes = []
@@ -148,52 +193,81 @@ class BrainOwn:
 
         return biases
     
-    def storeModel(self):
-        if os.path.isdir(self.brain_path):
-            shutil.rmtree(self.brain_path)
-        
-        os.makedirs(self.brain_path)
+    def storeModel(self, generation=0, fitness=0.0):
+        #the file gets the deltas folded in, the brain itself keeps them so its fitness cache key stays the same
+        weights = [weights if delta is None else delta.apply(weights) for weights, delta in zip(self.weights, self.deltas)]
 
-        file_path_nodes = os.path.join(self.brain_path, 'hidden.feather')
+        if not os.path.isdir(self.brain_path):
+            os.makedirs(self.brain_path)
 
-        for i in range(len(self.weights)):
-            file_path_weights = os.path.join(self.brain_path, f'weights{i}.feather')
-            file_path_biases = os.path.join(self.brain_path, f'biases{i}.feather')
-            feather.write_feather(pd.DataFrame(self.weights[i]), file_path_weights)
-            feather.write_feather(pd.DataFrame(self.biases[i]), file_path_biases)
-        
-        feather.write_feather(pd.DataFrame(self.hidden_nodes), file_path_nodes)
+        #a new file next to the old one, clones of this brain may still map the old one
+        file_path = brainfile.nextModelPath(self.brain_path)
+        brainfile.writeModel(file_path, self.hidden_nodes, weights, self.biases, ACTIVATION, generation, fitness)
+        brainfile.pruneModels(self.brain_path)
     
-    def tempStore(self, idx):
-        file_path = os.path.join(main_path_data, 'temp', str(idx))
+    def tempStore(self, idx, pool=None):
+        if pool is not None:
+            #park the biases, deltas and private weights in the population pool, the parent's weight matrices stay shared
+            arrays = list(self.biases)
+            shared = []
+            self.shared_layers = []
+            self.delta_shapes = []
+            for delta in self.deltas:
+                self.delta_shapes.append(None if delta is None else delta.shape)
+                if delta is not None:
+                    arrays += [delta.index, delta.values]
+
+            for i, weights in enumerate(self.weights):
+                #only a matrix a delta applies to or a mapped model belongs to the parent, the pool never spills those
+                self.shared_layers.append(self.deltas[i] is not None or isinstance(weights, np.memmap))
+                if self.shared_layers[-1]:
+                    shared.append(weights)
+                else:
+                    arrays.append(weights)
+
+            pool.put(idx, arrays, shared=shared)
+            del self.weights
+            del self.biases
+            self.deltas = [None] * self.len_weights
+            return
+
+        self.materialize()
+
+        file_path = os.path.join(main_path_data, 'temp')
 
         if not os.path.exists(file_path):
             os.makedirs(file_path)
 
+        arrays = {}
         for i in range(len(self.weights)):
-            file_path_weights = os.path.join(file_path, f'weights{i}.feather')
-            file_path_biases = os.path.join(file_path, f'biases{i}.feather')
-            feather.write_feather(pd.DataFrame(self.weights[i]), file_path_weights, compression='lz4')
-            feather.write_feather(pd.DataFrame(self.biases[i]), file_path_biases, compression='lz4')
+            arrays[f'weights{i}'] = self.weights[i]
+            arrays[f'biases{i}'] = self.biases[i]
+
+        brainfile.writeArrays(os.path.join(file_path, f'{idx}.brain'), arrays)
         
         del self.weights
         del self.biases
     
-    def tempLoad(self, idx):
-        file_path = os.path.join(main_path_data, 'temp')
-        weights = []
-        biases = []
+    def tempLoad(self, idx, pool=None):
+        if pool is not None:
+            arrays, shared = pool.take(idx)
+            self.biases = arrays[:self.len_weights]
 
-        for i in range(self.len_weights):
-            file_path_weights = os.path.join(file_path, str(idx), f'weights{i}.feather')
-            file_path_biases = os.path.join(file_path, str(idx), f'biases{i}.feather')
-            weights.append(feather.read_feather(file_path_weights).to_numpy())
-            biases.append(feather.read_feather(file_path_biases).to_numpy())
-        
-        shutil.rmtree(os.path.dirname(file_path_weights))
+            rest = iter(arrays[self.len_weights:])
+            self.deltas = [None if shape is None else SparseDelta(shape, next(rest), next(rest)) for shape in self.delta_shapes]
+
+            shared = iter(shared)
+            self.weights = [next(shared) if is_shared else next(rest) for is_shared in self.shared_layers]
+            return
+
+        file_path = os.path.join(main_path_data, 'temp', f'{idx}.brain')
+
+        #read into memory so the file can be removed right away
+        arrays, _ = brainfile.readArrays(file_path, mmap_mode=None)
+        os.remove(file_path)
         
-        self.weights = weights
-        self.biases = biases
+        self.weights = [arrays[f'weights{i}'] for i in range(self.len_weights)]
+        self.biases = [arrays[f'biases{i}'] for i in range(self.len_weights)]
         
     def predict(self, data:np.ndarray):
         
@@ -201,35 +275,131 @@ class BrainOwn:
             data = np.transpose(data[np.newaxis])
         
         for i in range(len(self.weights)):
-            data = np.matmul(self.weights[i], data)
-            data = data + self.biases[i]
+            out = np.matmul(self.weights[i], data)
+
+            #mutations of a clone are applied as a sparse correction on the shared parent weights
+            if self.deltas[i] is not None:
+                out += self.deltas[i].matmul(data)
+
+            data = out + self.biases[i]
             data = self.activation(data)
         
         return data
 
     def clone(self):
-        return copy.deepcopy(self)
+        #copy on write: the child shares the parent's weight matrices and deltas, neither is ever written in place
+        brain = copy.copy(self)
+        brain.weights = list(self.weights)
+        brain.deltas = list(self.deltas)
+        brain.biases = [bias.copy() for bias in self.biases]
+        brain.generator = np.random.default_rng(self.generator.integers(2**63))
+        return brain
     
     def mutate(self):
         for i in range(len(self.weights)):
-            self.weights[i] = mutate_arr(self.weights[i], self.mutation_rate, 0)
-            self.biases[i] = mutate_arr(self.biases[i], self.mutation_rate, 0)
+            delta = SparseDelta.sample(self.generator, self.weights[i].shape, self.mutation_rate, MUTATION_SCALE)
+
+            if self.deltas[i] is not None:
+                delta = self.deltas[i].merge(delta)
+
+            self.deltas[i] = delta if delta.nnz > 0 else None
+
+            #once the correction gets too dense a plain matmul on a private copy is cheaper
+            if delta.nnz > MATERIALIZE_FRACTION * self.weights[i].size:
+                self.materialize(i)
+
+            #biases are small and already private, change them directly
+            bias_delta = SparseDelta.sample(self.generator, self.biases[i].shape, self.mutation_rate, MUTATION_SCALE)
+            if bias_delta.nnz > 0:
+                self.biases[i] = bias_delta.apply(self.biases[i])
+    
+    def materialize(self, i=None):
+        #fold pending deltas into private weight matrices
+        layers = range(len(self.weights)) if i is None else [i]
+
+        for layer in layers:
+            if self.deltas[layer] is not None:
+                self.weights[layer] = self.deltas[layer].apply(self.weights[layer])
+                self.deltas[layer] = None
     
     def loadModel(self):
-        file_path_nodes = os.path.join(self.brain_path, 'hidden.feather')
-        hidden_nodes_df: pd.DataFrame = feather.read_feather(file_path_nodes)
-        self.hidden_nodes = np.transpose(hidden_nodes_df.to_numpy().astype(int))[0, :]
-        self.weights = []
-        self.biases = []
-
-        for i in range(self.layers + 1):
-            file_path_weights = os.path.join(self.brain_path, f'weights{i}.feather')
-            file_path_biases = os.path.join(self.brain_path, f'biases{i}.feather')
-            weights_df: pd.DataFrame = feather.read_feather(file_path_weights)
-            biases_df: pd.DataFrame = feather.read_feather(file_path_biases)
-
-            self.weights.append(weights_df.to_numpy())
-            self.biases.append(biases_df.to_numpy())
+        #False when the brain directory holds no model yet
+        file_path = brainfile.modelPath(self.brain_path)
+
+        if file_path is not None:
+            #copy on write map, mutations never touch the stored model
+            model = brainfile.readModel(file_path, mmap_mode='c')
+        elif brainfile.hasLegacyModel(self.brain_path):
+            model = brainfile.readLegacyModel(self.brain_path)
+        else:
+            return False
+
+        self.hidden_nodes = model["hidden_nodes"]
+        self.weights = model["weights"]
+        self.biases = model["biases"]
+        return True
+
+    def getState(self, ref):
+        #ref(arr) registers an array with the checkpoint and returns its name, shared arrays are stored once
+        deltas = []
+        for delta in self.deltas:
+            if delta is None:
+                deltas.append(None)
+            else:
+                deltas.append({"shape": list(delta.shape), "index": ref(delta.index), "values": ref(delta.values)})
+
+        return {
+            "symbol": self.symbol,
+            "layers": self.layers,
+            "mutation_rate": self.mutation_rate,
+            "model_loaded": self.model_loaded,
+            "generator": self.generator.bit_generator.state,
+            "hidden": ref(self.hidden_nodes),
+            "weights": [ref(arr) for arr in self.weights],
+            "biases": [ref(arr) for arr in self.biases],
+            "deltas": deltas
+        }
+
+    @classmethod
+    def fromState(cls, state, arrays):
+        #rebuild without touching the disk or drawing new random numbers
+        brain = cls.__new__(cls)
+        brain.symbol = state["symbol"]
+        brain.layers = state["layers"]
+        brain.brain_path = os.path.join(main_path_data, 'neat_own', brain.symbol, f'{brain.layers}_layers')
+        brain.mutation_rate = state["mutation_rate"]
+        brain.model_loaded = state["model_loaded"]
+        brain.generator = np.random.default_rng()
+        brain.generator.bit_generator.state = state["generator"]
+        brain.hidden_nodes = arrays[state["hidden"]]
+        brain.weights = [arrays[name] for name in state["weights"]]
+        brain.biases = [arrays[name] for name in state["biases"]]
+        brain.deltas = [None if delta is None else SparseDelta(delta["shape"], arrays[delta["index"]], arrays[delta["values"]]) for delta in state["deltas"]]
+        brain.len_weights = len(brain.weights)
+        brain.activation = brain.loadActivation()
+
+        return brain
+
+    @classmethod
+    def fromFile(cls, file_path, symbol, mutation_rate=0):
+        #read only map of a stored model, processes evaluating the same file share its pages
+        model = brainfile.readModel(file_path, mmap_mode='r')
+
+        brain = cls.__new__(cls)
+        brain.symbol = symbol
+        brain.layers = len(model["weights"]) - 1
+        brain.brain_path = os.path.dirname(file_path)
+        brain.mutation_rate = mutation_rate
+        brain.model_loaded = True
+        brain.generator = np.random.default_rng()
+        brain.hidden_nodes = model["hidden_nodes"]
+        brain.weights = model["weights"]
+        brain.biases = model["biases"]
+        brain.deltas = [None] * len(brain.weights)
+        brain.len_weights = len(brain.weights)
+        brain.activation = brain.loadActivation()
+
+        return brain
         
 class Trader:
 
@@ -289,6 +459,10 @@ class Trader:
 
         self.fitness += self.profit
     
+    def clone(self, idx):
+        #same brain without mutation, e.g. to carry the elite into the next generation
+        return Trader(idx, self.mutation_rate, self.symbol, self.layers, brain=self.brain.clone())
+
     def clone_mutate(self, idx):
         brain = self.brain.clone()
         brain.mutate()
@@ -297,15 +471,32 @@ class Trader:
     def mutate(self):
         self.brain.mutate()
     
-    def store(self):
+    def store(self, generation=0):
         print(f'Storing trader {self.idx} with fitness: {self.fitness}')
-        self.brain.storeModel()
+        self.brain.storeModel(generation, self.fitness)
     
-    def tempStore(self):
-        self.brain.tempStore(self.idx)
+    def getState(self, ref):
+        state = {}
+        for key, value in vars(self).items():
+            if key != 'brain':
+                state[key] = value.item() if isinstance(value, np.generic) else value
+
+        state['brain'] = self.brain.getState(ref)
+        return state
+
+    @classmethod
+    def fromState(cls, state, arrays):
+        state = dict(state)
+        brain = BrainOwn.fromState(state.pop('brain'), arrays)
+        trader = cls(state['idx'], state['mutation_rate'], state['symbol'], state['layers'], brain=brain)
+        vars(trader).update(state)
+        return trader
+
+    def tempStore(self, pool=None):
+        self.brain.tempStore(self.idx, pool)
     
-    def tempLoad(self):
-        self.brain.tempLoad(self.idx)
+    def tempLoad(self, pool=None):
+        self.brain.tempLoad(self.idx, pool)
 
     def buy(self, value):
         if not self.bought:
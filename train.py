@@ -2,15 +2,20 @@ from numpy.testing._private.utils import tempdir
 from binanceUpdate import update_candles, get_all_intervals
 from binance.lib.enums import CandlestickInterval
 from trader import Trader
+from featurestore import FeatureStore
+from checkpoint import saveCheckpoint, loadCheckpoint
+from fitnesscache import FitnessCache
+from evaluation import evaluateTraders
 import pyarrow.feather as feather
 import pandas as pd
-import numpy as np
 import os
 import random
-from sklearn import preprocessing
+import argparse
+import time
 
 SYMBOL = "BNBBTC"
 INPUTROWS = 50
+CHUNK_ROWS = 65536
 AMOUNTOFGENS = float('inf')
 main_path_data = os.path.join("E:\\", "Binance", "data2")
 
@@ -22,6 +27,13 @@ HIDDEN_LAYERS = [6 for i in range(20)]
 UPDATE = False
 IDX = 0
 
+CHECKPOINT_EVERY = 1
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--resume', action='store_true', help='continue from the last checkpoint')
+parser.add_argument('--checkpoint', default=os.path.join(main_path_data, 'checkpoint', f'{SYMBOL}.ckpt'))
+args = parser.parse_args()
+
 CLS = lambda: os.system("cls")
 
 def pickOne(lst:list[Trader]):
@@ -67,49 +79,54 @@ def get_all_dataframes() -> dict[CandlestickInterval, pd.DataFrame]:
 
 CLS()
 
-data_path = os.path.join(main_path_data, 'data', f'{SYMBOL}.feather')
-if not os.path.exists(os.path.dirname(data_path)):
-    os.makedirs(os.path.dirname(data_path))
-
 intervals = get_all_intervals()
 
+#1m is the base, every other interval is aligned onto it
+names = [CandlestickInterval.minutes1.name] + [interval.name for interval in intervals if interval != CandlestickInterval.minutes1]
+store = FeatureStore(os.path.join(main_path_data, 'features', SYMBOL), names)
+
 CLS()
 
-if UPDATE or not os.path.isfile(data_path):
+if UPDATE or len(store) == 0:
     update_candles(SYMBOL)
     dfs = get_all_dataframes()
 
-    base_data: pd.DataFrame = dfs[CandlestickInterval.minutes1][["CloseTime", "OpenPrice", "HighPrice", "LowPrice", "ClosePrice","Volume","NumberTrades"]].iloc[45000:]
-    data = base_data.copy()
+    frames = {interval.name: dfs[interval] for interval in intervals}
+    frames[CandlestickInterval.minutes1.name] = frames[CandlestickInterval.minutes1.name].iloc[45000:]
+    del dfs
 
-    for interval in intervals:
-        print(interval.name)
-        if interval == CandlestickInterval.minutes1:
-            del dfs[interval]
-            continue
-        else:
-            temp_df = dfs[interval][["CloseTime", "OpenPrice", "HighPrice", "LowPrice", "ClosePrice","Volume","NumberTrades"]]
-            data = pd.merge_asof(data.sort_values("CloseTime"), temp_df.sort_values("CloseTime"), on="CloseTime", suffixes=(None, f'_{interval.name}'))
-            del dfs[interval]
-            del temp_df
-    
-    data = pd.DataFrame(preprocessing.MinMaxScaler().fit_transform(data.values))
+    print(f"Added {store.update(frames)} rows")
+    del frames
 
-    feather.write_feather(data, data_path)
 idx = 0
 first = True
-data: pd.DataFrame = feather.read_feather(data_path).iloc[:-45000]
+#memory mapped, evaluation streams it in chunks of CHUNK_ROWS
+data = store.matrix()
+data_stop = len(data) - 45000
+data_version = f"{store.version}:{data_stop}"
+cache = FitnessCache()
 highestFit = float('-inf') #[float('-inf') for i in range(len(HIDDEN_LAYERS))]
 generationCount = 0 #[0 for i in range(len(HIDDEN_LAYERS))]
 print("Generating traders")
 bestTrader = None #[None for i in range(len(HIDDEN_LAYERS))]
 previousTraders: list[Trader] = []
 
+if args.resume and os.path.isfile(args.checkpoint):
+    state, groups = loadCheckpoint(args.checkpoint)
+    previousTraders = groups['previous']
+    bestTrader = groups['best'][0] if groups['best'] else None
+    highestFit = state['highestFit']
+    generationCount = state['generationCount']
+    idx = state['idx']
+    first = state['first']
+    print(f"Resumed at generation {generationCount}")
+
 while generationCount <= AMOUNTOFGENS:
 
     totalFitness = 0
     new = False
     allTraders: list[Trader] = []
+    elite = None
     if first:
         base_trader = Trader(idx, MUTATION_RATE, SYMBOL, HIDDEN_LAYERS[0])
 
@@ -126,6 +143,10 @@ while generationCount <= AMOUNTOFGENS:
                         traders.append(base_trader.clone_mutate(idx))
                     else:
                         traders.append(Trader(idx, MUTATION_RATE, SYMBOL, layer))
+            elif i == 0 and j == 0 and bestTrader is not None:
+                #the elite goes in unmutated, its result comes from the fitness cache
+                elite = bestTrader.clone(idx)
+                traders.append(elite)
             else:
                 traders.append(pickOne(previousTraders).clone_mutate(idx))
             
@@ -141,34 +162,25 @@ while generationCount <= AMOUNTOFGENS:
 
         died_traders = []
 
-        for p in range(0, len(data)):
-            inputs: np.ndarray = np.delete(data.iloc[INPUTROWS + p:p:-1].to_numpy(), 0, 1).flatten()
-            for k in reversed(range(len(traders))):
-                traders[k].think(inputs)
+        #brains that were already scored on this data get their result from the cache
+        for k in reversed(range(len(traders))):
+            if cache.lookup(traders[k], data_version):
+                died_traders.append(traders.pop(k))
 
-                if traders[k].profit < 0 or (traders[k].counter % 120 == 0 and (traders[k].lastCounter == traders[k].tradesCounter)):
-                    traders[k].profit = 0
-                    died_traders.append(traders.pop(k))
-                    continue
-            
-                if traders[k].counter % 120 == 0:
-                    print(f"id: {traders[k].idx}\tcounter: {traders[k].counter}\tfit: {traders[k].fitness:.4f}\tprof: {traders[k].profit:.4f}\ttrades: {traders[k].tradesCounter}\tpt: {traders[k].tradesProfit}")
-
-                if traders[k].counter % 120 == 0:
-                    traders[k].lastCounter = traders[k].tradesCounter
+        evaluating = traders[:]
+        start = time.perf_counter()
 
-            if len(traders) == 0:
-                break
+        traders, new_died = evaluateTraders(traders, data, 0, data_stop, INPUTROWS, CHUNK_ROWS)
+        died_traders.extend(new_died)
         
         print("All died!")
 
-        tempTraders: list[Trader] = []
-        
-        if len(traders) > 0:
-            tempTraders.extend(traders)
-        
-        if len(died_traders) > 0:
-            tempTraders.extend(died_traders)
+        for trader in evaluating:
+            cache.store(trader, data_version)
+        cache.addEvaluationTime(len(evaluating), time.perf_counter() - start)
+
+        #in trader order, whether a result came from the cache (which a resumed run starts without) must not change the selection
+        tempTraders: list[Trader] = sorted(traders + died_traders, key=lambda trader: trader.idx)
         
         for trader in tempTraders:
             if trader.profit < 0:
@@ -208,12 +220,12 @@ while generationCount <= AMOUNTOFGENS:
             bestTrader = trader
             new = True
 
-    if not new:
+    if not new and elite not in allTraders:
         totalFitness += bestTrader.fitness
         allTraders.append(bestTrader)
 
     if new and totalFitness > 0:
-        bestTrader.store()
+        bestTrader.store(generationCount)
 
     for trader in allTraders:
         if totalFitness > 0:
@@ -222,6 +234,8 @@ while generationCount <= AMOUNTOFGENS:
             trader.prob = 0
     
     print("Summary:")
+    stats = cache.stats()
+    print(f"Fitness cache - hits: {stats['hits']}, misses: {stats['misses']}, saved: {stats['seconds_saved']:.1f}s")
     line = f"\nGeneration {generationCount}\n"
 
     for trader in allTraders:
@@ -256,6 +270,13 @@ while generationCount <= AMOUNTOFGENS:
         
     generationCount += 1
 
+    if generationCount % CHECKPOINT_EVERY == 0:
+        if not os.path.exists(os.path.dirname(args.checkpoint)):
+            os.makedirs(os.path.dirname(args.checkpoint))
+
+        state = {'generationCount': generationCount, 'highestFit': highestFit, 'idx': idx, 'first': first}
+        saveCheckpoint(args.checkpoint, state, previous=previousTraders, best=[bestTrader] if bestTrader is not None else [])
+
 
 
         
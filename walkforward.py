@@ -0,0 +1,91 @@
+import pandas as pd
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from featurestore import FeatureStore
+from evaluation import evaluateTraders, INPUTROWS, CHUNK_ROWS
+
+# Walk forward evaluation of stored brains over several symbols.
+#
+# Every symbol has its own FeatureStore under root/{symbol}. Its rows are cut into rolling
+# (train, test) windows and each (symbol, window, segment, model) combination is one task
+# for a process pool. Workers only get paths: the feature matrix and the model are memory
+# mapped read only, so all workers share one copy of the data through the page cache.
+
+def walkForwardWindows(rows, train_rows, test_rows, step_rows=None, start=0):
+    """Rolling windows over rows
+    :returns: lst -> [((train_start, train_stop), (test_start, test_stop))]
+    """
+    if step_rows is None:
+        step_rows = test_rows
+
+    windows = []
+    window_start = start
+
+    while window_start + train_rows + test_rows <= rows:
+        train_stop = window_start + train_rows
+        windows.append(((window_start, train_stop), (train_stop, train_stop + test_rows)))
+        window_start += step_rows
+
+    return windows
+
+def _evaluate(task):
+    #runs in a worker process, trader pulls in tensorflow so it is imported here
+    from trader import Trader, BrainOwn
+
+    symbol, window, segment, start, stop, store_path, names, model_path = task
+
+    store = FeatureStore(store_path, names)
+    matrix = store.matrix()
+    close_times = store.closeTimes()
+
+    brain = BrainOwn.fromFile(model_path, symbol)
+    trader = Trader(0, 0, symbol, brain.layers, brain=brain)
+
+    alive, _ = evaluateTraders([trader], matrix, start, stop, INPUTROWS, CHUNK_ROWS, verbose=False)
+
+    return {
+        "symbol": symbol,
+        "window": window,
+        "segment": segment,
+        "model": model_path,
+        "start": int(close_times[start]),
+        "stop": int(close_times[stop - 1]),
+        "steps": trader.counter,
+        "survived": len(alive) > 0,
+        "profit": trader.profit,
+        "trades": trader.tradesCounter,
+        "profitTrades": trader.tradesProfit,
+        "lossTrades": trader.tradesLoss,
+        "fitness": trader.fitness
+    }
+
+def walkForward(symbols, models, root, names, train_rows, test_rows, step_rows=None, segments=("train", "test"), workers=None):
+    """Evaluate every model on rolling windows of every symbol
+    :params: symbols -> lst of symbols, each with a FeatureStore in root/{symbol}
+             models -> lst of brain file paths (see brainfile.writeModel)
+             names -> interval names of the feature stores
+             workers -> size of the process pool, None uses every core
+    :returns: DataFrame -> one row per (symbol, window, segment, model)
+    """
+    tasks = []
+
+    for symbol in symbols:
+        store_path = os.path.join(root, symbol)
+        rows = len(FeatureStore(store_path, names))
+
+        for window, (train, test) in enumerate(walkForwardWindows(rows, train_rows, test_rows, step_rows)):
+            bounds = {"train": train, "test": test}
+
+            for segment in segments:
+                start, stop = bounds[segment]
+                for model_path in models:
+                    tasks.append((symbol, window, segment, start, stop, store_path, names, model_path))
+
+    if len(tasks) == 0:
+        return pd.DataFrame()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(_evaluate, tasks, chunksize=max(1, len(tasks) // (4 * (workers or os.cpu_count() or 1)))))
+
+    return pd.DataFrame(results)